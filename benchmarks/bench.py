@@ -0,0 +1,474 @@
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import pandas as pd
+
+from data_generator import PRESETS, generate
+
+# Times the hot paths of the data pipeline on generated fixtures at 1x, 10x
+# and 100x the demo dataset. Every case runs in a fresh process so peak RSS
+# belongs to that case alone. Results go to benchmarks/results/*.json and are
+# compared against benchmarks/baseline.json. Timings only mean something on
+# the machine they were taken on, so the baseline is not committed: record it
+# on the machine that runs the comparison with
+#
+#     python benchmarks/bench.py --save-baseline
+#
+# A baseline from another host, CPU count, Python/pandas/numpy version or
+# --format is not compared against, nor is a missing one (--require-baseline
+# makes that exit 2, for CI).
+BENCH_DIR = os.path.join(REPO_ROOT, "benchmarks")
+FIXTURE_DIR = os.path.join(BENCH_DIR, ".fixtures")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+XGBOOST_DIR = os.path.join(REPO_ROOT, "Xgboost")
+
+# environment() entries a baseline has to share with the run it is compared to
+COMPARABLE_ENV = ["storage_format", "host", "machine", "cpu_count", "python", "pandas", "numpy"]
+
+# =========================
+# Fixtures
+# =========================
+# Scale s multiplies every table of the "demo" preset (50k transactions).
+# Shards are fixed per scale so a fixture only depends on scale and seed.
+SCALES = [1, 10, 100]
+SHARDS_BY_SCALE = {1: 1, 10: 4, 100: 16}
+SEED = 42
+
+
+def fixture_sizes(scale):
+    base = PRESETS["demo"]
+    return {
+        "customers": base["customers"] * scale,
+        "products": base["products"] * scale,
+        "stores": base["stores"] * scale,
+        "transactions": base["transactions"] * scale,
+        "shards": SHARDS_BY_SCALE.get(scale, 1),
+    }
+
+
+def ensure_fixture(scale, fmt):
+    """Generate the fixture for a scale once; reused while its parameters match."""
+    root = os.path.join(FIXTURE_DIR, f"{fmt}-{scale}x")
+    data_dir = os.path.join(root, "synthetic_retail")
+    params = {"scale": scale, "format": fmt, "seed": SEED, **fixture_sizes(scale)}
+    meta_path = os.path.join(root, "fixture.json")
+
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == params:
+                return root
+
+    shutil.rmtree(root, ignore_errors=True)
+    sizes = fixture_sizes(scale)
+    generate(
+        sizes["customers"], sizes["products"], sizes["stores"], sizes["transactions"],
+        out_dir=data_dir, fmt=fmt, seed=SEED, shards=sizes["shards"],
+    )
+    with open(meta_path, "w") as f:
+        json.dump(params, f, indent=2)
+    return root
+
+
+# =========================
+# Cases
+# =========================
+# Each case does its setup (untimed) and returns the function to time. They
+# run with the fixture root as working directory, so io_utils reads the
+# fixture's synthetic_retail/.
+def _case_dq_customers():
+    from io_utils import read_table
+    from dq_customers import dq_customers
+
+    df = read_table("customers")
+    return lambda: dq_customers(df, None)
+
+
+def _case_dq_stores():
+    from io_utils import read_table
+    from dq_stores import dq_stores
+
+    df = read_table("stores")
+    return lambda: dq_stores(df, None)
+
+
+def _case_dq_products():
+    from io_utils import read_table
+    from dq_products import dq_products
+
+    df = read_table("products")
+    return lambda: dq_products(df, None)
+
+
+def _case_dq_transactions():
+    # The whole table validated as one upload against the dimension indexes
+    from io_utils import read_table, load_table, load_key_index
+    from dq_transactions import dq_transactions
+
+    df = read_table("transactions")
+    customers = load_key_index("customers", "customer_id")
+    stores = load_table("stores")
+    products = load_key_index("products", "product_id")
+    return lambda: dq_transactions(df, None, customers, stores, products)
+
+
+def _case_dq_transactions_faulty():
+    # Rejection-heavy upload: 30% of the rows break one rule each
+    from io_utils import read_table, load_table, load_key_index
+    from dq_transactions import dq_transactions
+    from fault_injection import inject_faults
+
+    df, _ = inject_faults(read_table("transactions"), "transactions", 0.3, seed=SEED)
+    customers = load_key_index("customers", "customer_id")
+    stores = load_table("stores")
+    products = load_key_index("products", "product_id")
+    return lambda: dq_transactions(df, None, customers, stores, products)
+
+
+def _case_append_table():
+    # One nightly batch (the 1x transaction count) appended to the table,
+    # including the key index and spend cube updates; runs on a copy
+    scratch = os.path.join(os.getcwd(), "scratch")
+    shutil.rmtree(scratch, ignore_errors=True)
+    shutil.copytree("synthetic_retail", os.path.join(scratch, "synthetic_retail"))
+    os.chdir(scratch)
+
+    from io_utils import append_table, load_table, load_key_index, load_derived
+
+    transactions = load_table("transactions")
+    load_key_index("transactions", "transaction_id")
+    load_derived("spend_cube")
+
+    batch = transactions.tail(PRESETS["demo"]["transactions"]).reset_index(drop=True)
+    runs = []
+
+    def run():
+        runs.append(len(runs))
+        b = batch.copy()
+        b["transaction_id"] = [f"B{len(runs)}-{i}" for i in range(len(b))]
+        append_table("transactions", b)
+
+    return run
+
+
+def _case_rebuild_merged():
+    from io_utils import load_table, rebuild_merged
+
+    tables = [load_table(n) for n in ["customers", "stores", "products", "transactions"]]
+    return lambda: rebuild_merged(*tables)
+
+
+def _case_update_loyalty_tiers():
+    from io_utils import load_table
+    from loyalty_update import update_loyalty_tiers
+
+    customers, transactions, products = (load_table(n) for n in ["customers", "transactions", "products"])
+    return lambda: update_loyalty_tiers(customers, transactions, products)
+
+
+def _case_refresh_loyalty_tiers():
+    # The ingest path: tiers from the maintained spend cube
+    from io_utils import load_table, load_derived
+    from loyalty_update import refresh_loyalty_tiers
+
+    customers = load_table("customers")
+    load_derived("spend_cube")
+    return lambda: refresh_loyalty_tiers(customers)
+
+
+# Same SQL as the Quick Queries buttons in streamlit_query_csvs.py
+QUICK_QUERIES = [
+    """
+    SELECT customer_id, SUM(spend) AS total_spend
+    FROM spend_cube
+    GROUP BY customer_id
+    ORDER BY total_spend DESC
+    LIMIT 10;
+    """,
+    """
+    SELECT store_id, SUM(tx_count) AS tx_count
+    FROM spend_cube
+    GROUP BY store_id
+    ORDER BY tx_count DESC;
+    """,
+    """
+    SELECT category, SUM(spend) AS sales
+    FROM spend_cube
+    GROUP BY category
+    ORDER BY sales DESC;
+    """,
+    # The example query shown above the SQL box
+    """
+    SELECT customer_id, COUNT(*) AS tx_count
+    FROM transactions
+    GROUP BY customer_id
+    ORDER BY tx_count DESC
+    LIMIT 10;
+    """,
+]
+
+
+def _case_duckdb_queries():
+    # A click in streamlit_query_csvs.py: source check, then the query
+    from query_db import QueryDB
+
+    db = QueryDB()
+    db.refresh()
+
+    def run():
+        db.refresh()
+        return [db.query(q) for q in QUICK_QUERIES]
+    return run
+
+
+def _case_xgboost_score():
+    # Xgboost/app.py's prediction for the latest day of every customer
+    import joblib
+    from io_utils import load_table, read_table, table_exists, rebuild_merged
+    from spend_agg import daily_spend_features
+
+    model = joblib.load(os.path.join(XGBOOST_DIR, "xgboost_spend_model.pkl"))
+    scaler = joblib.load(os.path.join(XGBOOST_DIR, "feature_scaler.pkl"))
+    with open(os.path.join(XGBOOST_DIR, "feature_columns.json")) as f:
+        feature_cols = json.load(f)
+
+    if table_exists("merged_transactions"):
+        merged = read_table("merged_transactions")
+    else:
+        merged = rebuild_merged(*(load_table(n) for n in ["customers", "stores", "products", "transactions"]))
+    features = daily_spend_features(merged)
+    latest = features.sort_values("transaction_date").groupby("customer_id", observed=True).tail(1)
+    raw = latest.drop(columns=["customer_id", "transaction_date", "next_30d_spend"])
+    num_cols = ["daily_spend", "total_qty", "avg_price", "transactions", "avg_discount"]
+
+    def run():
+        X = pd.get_dummies(raw).reindex(columns=feature_cols, fill_value=0)
+        X[num_cols] = scaler.transform(X[num_cols])
+        return model.predict(X)
+
+    return run
+
+
+CASES = {
+    "dq_customers": _case_dq_customers,
+    "dq_stores": _case_dq_stores,
+    "dq_products": _case_dq_products,
+    "dq_transactions": _case_dq_transactions,
+    "dq_transactions_faulty": _case_dq_transactions_faulty,
+    "append_table": _case_append_table,
+    "rebuild_merged": _case_rebuild_merged,
+    "update_loyalty_tiers": _case_update_loyalty_tiers,
+    "refresh_loyalty_tiers": _case_refresh_loyalty_tiers,
+    "duckdb_queries": _case_duckdb_queries,
+    "xgboost_score": _case_xgboost_score,
+}
+
+
+# =========================
+# Measurement
+# =========================
+def peak_rss_mb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _run_case(name, root, repeat):
+    # Runs in a spawned worker, so ru_maxrss starts from a bare interpreter
+    os.chdir(root)
+    try:
+        run = CASES[name]()
+    except ImportError as e:
+        return {"skipped": f"missing dependency: {e.name}"}
+
+    setup_rss = peak_rss_mb()
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - t0)
+
+    # The best run is compared: the slower ones mostly measure other load
+    return {
+        "wall_s": min(times),
+        "wall_s_median": statistics.median(times),
+        "wall_s_runs": times,
+        "setup_rss_mb": setup_rss,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_case(name, root, repeat):
+    with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+        return pool.submit(_run_case, name, root, repeat).result()
+
+
+def run_suite(scales, cases, fmt, repeat, on_result=None):
+    results = {}
+    for scale in scales:
+        root = ensure_fixture(scale, fmt)
+        # Derived files (indexes, cube, merged) from an earlier run would make
+        # the first case of this run cheaper than the next; start clean
+        for f in os.listdir(os.path.join(root, "synthetic_retail")):
+            if f.startswith(("merged_transactions", "spend_cube")) or ".idx." in f:
+                path = os.path.join(root, "synthetic_retail", f)
+                shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+        results[f"{scale}x"] = {}
+        for name in cases:
+            res = run_case(name, root, repeat)
+            results[f"{scale}x"][name] = res
+            if on_result is not None:
+                on_result(scale, name, res)
+        shutil.rmtree(os.path.join(root, "scratch"), ignore_errors=True)
+    return results
+
+
+def environment(fmt):
+    import numpy as np
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "commit": commit,
+        "storage_format": fmt,
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+# =========================
+# Baseline comparison
+# =========================
+def environment_mismatch(env, baseline_env):
+    """COMPARABLE_ENV entries that differ, as "key: baseline != current"."""
+    return [
+        f"{key}: {baseline_env.get(key)} != {env.get(key)}"
+        for key in COMPARABLE_ENV if baseline_env.get(key) != env.get(key)
+    ]
+
+
+def compare(results, baseline, threshold=0.2, min_seconds=0.25):
+    """
+    Rows of (scale, case, metric, baseline, current, ratio, regressed). A
+    metric regresses when it grew by more than threshold; a wall time also
+    has to have grown by min_seconds, below which sub-second cases jitter.
+    """
+    rows = []
+    for scale, cases in results.items():
+        for name, cur in cases.items():
+            base = baseline.get(scale, {}).get(name)
+            if base is None or "skipped" in cur or "skipped" in base:
+                continue
+            for metric in ["wall_s", "peak_rss_mb"]:
+                b, c = base.get(metric), cur.get(metric)
+                if not b or c is None:
+                    continue
+                ratio = c / b
+                noise = metric == "wall_s" and c - b < min_seconds
+                rows.append((scale, name, metric, b, c, ratio, ratio > 1 + threshold and not noise))
+    return rows
+
+
+def print_result(scale, name, res):
+    if "skipped" in res:
+        print(f"{scale:>4}x {name:<22} skipped ({res['skipped']})")
+        return
+    rss = f"{res['peak_rss_mb']:9.1f} MB" if res["peak_rss_mb"] is not None else ""
+    print(f"{scale:>4}x {name:<22} {res['wall_s']:9.3f}s {rss}")
+
+
+def print_comparison(rows):
+    for scale, name, metric, b, c, ratio, regressed in rows:
+        flag = "REGRESSION" if regressed else ""
+        print(f"{scale:>5} {name:<22} {metric:<12} {b:10.3f} -> {c:10.3f}  x{ratio:5.2f}  {flag}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Time the pipeline hot paths at several data scales")
+    parser.add_argument("--scales", type=int, nargs="+", default=SCALES, help="multiples of the demo dataset")
+    parser.add_argument("--cases", nargs="+", choices=list(CASES), default=list(CASES))
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case (the best one is compared)")
+    parser.add_argument("--format", choices=["csv", "parquet"],
+                        default=os.environ.get("RETAIL_STORAGE_FORMAT", "csv").lower())
+    parser.add_argument("--output", help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="results file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--require-baseline", action="store_true", help="exit 2 when nothing was compared")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed growth before flagging, e.g. 0.2 = 20%%")
+    parser.add_argument("--min-seconds", type=float, default=0.25,
+                        help="a wall time is only flagged once it grew by this much as well")
+    args = parser.parse_args()
+
+    # Workers read the storage format when they import io_utils
+    os.environ["RETAIL_STORAGE_FORMAT"] = args.format
+
+    report = {
+        "environment": environment(args.format),
+        "results": run_suite(args.scales, args.cases, args.format, args.repeat, on_result=print_result),
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, datetime.now().strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Saved results to:", output)
+
+    if args.save_baseline:
+        shutil.copyfile(output, args.baseline)
+        print("Saved baseline to:", args.baseline)
+        raise SystemExit
+
+    rows = []
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, nothing compared. Record one with --save-baseline.")
+    else:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        mismatch = environment_mismatch(report["environment"], baseline["environment"])
+        if mismatch:
+            print(f"Baseline was recorded elsewhere ({'; '.join(mismatch)}); nothing compared. "
+                  "Record one here with --save-baseline.")
+        else:
+            rows = compare(report["results"], baseline["results"], args.threshold, args.min_seconds)
+            if not rows:
+                print("Baseline has none of these scales/cases; nothing compared")
+            print_comparison(rows)
+
+    regressions = [r for r in rows if r[-1]]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        raise SystemExit(1)
+    if not rows and args.require_baseline:
+        raise SystemExit(2)
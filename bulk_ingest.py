@@ -0,0 +1,221 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from io_utils import (
+    REJ_CUSTOMERS_CSV, REJ_STORES_CSV, REJ_PRODUCTS_CSV, REJ_TRANSACTIONS_CSV,
+    INDEXED_KEYS,
+    load_table,
+    load_key_index,
+    append_table,
+    append_rejections,
+    data_lock,
+)
+from key_index import PendingKeys
+from dq_codes import rule_bit
+from dq_customers import dq_customers
+from dq_stores import dq_stores
+from dq_products import dq_products
+from dq_transactions import dq_transactions
+from loyalty_update import apply_loyalty_after_ingest
+
+DIMENSIONS = ["customers", "stores", "products"]
+
+DQ_FUNCS = {
+    "customers": dq_customers,
+    "stores": dq_stores,
+    "products": dq_products,
+}
+
+REJECTIONS = {
+    "customers": REJ_CUSTOMERS_CSV,
+    "stores": REJ_STORES_CSV,
+    "products": REJ_PRODUCTS_CSV,
+    "transactions": REJ_TRANSACTIONS_CSV,
+}
+
+
+# =========================
+# Sources
+# =========================
+def table_for_file(filename):
+    """Map a file name like 'customers_2025-12.csv' to its table (None if unknown)."""
+    stem = os.path.basename(filename).lower()
+    # transactions first: 'transactions' never contains another table name
+    for table in ["transactions"] + DIMENSIONS:
+        if table in stem:
+            return table
+    return None
+
+
+def collect_sources(files):
+    """
+    files: paths, or (name, bytes) pairs as uploaded. Zips are expanded.
+    Returns {table: [(name, bytes_or_path), ...]}.
+    """
+    sources = {}
+
+    def add(name, data):
+        table = table_for_file(name)
+        if table is not None and name.lower().endswith(".csv"):
+            sources.setdefault(table, []).append((name, data))
+
+    for f in files:
+        name, data = (f, f) if isinstance(f, str) else f
+
+        if name.lower().endswith(".zip"):
+            zf = zipfile.ZipFile(data if isinstance(data, str) else io.BytesIO(data))
+            with zf:
+                for member in sorted(zf.namelist()):
+                    if not member.endswith("/"):
+                        add(member, zf.read(member))
+        else:
+            add(name, data)
+
+    return sources
+
+
+def _read_source(data):
+    return pd.read_csv(io.BytesIO(data) if isinstance(data, bytes) else data)
+
+
+# =========================
+# Validation
+# =========================
+def _validate_dimension_file(table, name, data, existing_keys):
+    # Runs in a worker process; the key index comes from the parent, which
+    # holds the data lock, so workers never touch DATA_DIR
+    df_new = _read_source(data)
+    accepted, rejected = DQ_FUNCS[table](df_new, existing_keys)
+    return table, name, accepted, rejected
+
+
+def _reject_cross_file_duplicates(table, accepted, rejected):
+    # Each file was checked alone; the same key in two files keeps the first
+    pk = INDEXED_KEYS[table][0]
+    dup = accepted[pk].astype(str).duplicated(keep="first")
+    if not dup.any():
+        return accepted, rejected
+
+    moved = accepted.loc[dup].copy()
+    moved["rejection_code"] = np.int64(rule_bit(table, f"duplicate_{pk}"))
+    return accepted.loc[~dup], pd.concat([rejected, moved], ignore_index=True)
+
+
+def bulk_ingest(files, max_workers=None, commit=True, on_progress=None):
+    """
+    Validate a drop of several tables in one pass.
+
+    Dimension files are validated in parallel worker processes. Transactions
+    are then validated against existing keys plus the dimension rows accepted
+    in this drop. Nothing is written until every table has been validated.
+    Returns {table: {"accepted": n, "rejected": n}} plus the accepted/rejected
+    frames under "frames".
+    """
+    sources = collect_sources(files)
+
+    # Validation reads the indexes and commit appends to the same tables:
+    # hold the write lock across both so no other writer slips in between
+    with data_lock():
+        return _bulk_ingest(sources, max_workers, commit, on_progress)
+
+
+def _bulk_ingest(sources, max_workers, commit, on_progress):
+    accepted = {t: [] for t in DIMENSIONS + ["transactions"]}
+    rejected = {t: [] for t in DIMENSIONS + ["transactions"]}
+
+    def progress(msg):
+        if on_progress is not None:
+            on_progress(msg)
+
+    # 1) Dimension tables in parallel
+    existing = {t: load_key_index(t, INDEXED_KEYS[t][0]).in_memory() for t in DIMENSIONS}
+    tasks = [(t, name, data, existing[t]) for t in DIMENSIONS for name, data in sources.get(t, [])]
+    if tasks:
+        workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_validate_dimension_file, *task) for task in tasks]
+            for fut in futures:
+                table, name, acc, rej = fut.result()
+                accepted[table].append(acc)
+                rejected[table].append(rej)
+                progress(f"{name}: accepted {len(acc)}, rejected {len(rej)}")
+
+    frames = {}
+    for t in DIMENSIONS:
+        acc = pd.concat(accepted[t], ignore_index=True) if accepted[t] else pd.DataFrame()
+        rej = pd.concat(rejected[t], ignore_index=True) if rejected[t] else pd.DataFrame()
+        if len(acc):
+            acc, rej = _reject_cross_file_duplicates(t, acc, rej)
+        frames[t] = (acc, rej)
+
+    # 2) Transactions against existing + newly accepted dimension keys
+    dim_keys = {}
+    for t in DIMENSIONS:
+        pk = INDEXED_KEYS[t][0]
+        keys = PendingKeys(existing[t])
+        if len(frames[t][0]):
+            keys.add(frames[t][0][pk])
+        dim_keys[t] = keys
+
+    stores_all = load_table("stores")
+    if len(frames["stores"][0]):
+        stores_all = pd.concat([stores_all, frames["stores"][0]], ignore_index=True)
+
+    tx_keys = PendingKeys(load_key_index("transactions", "transaction_id"))
+    for name, data in sources.get("transactions", []):
+        df_new = _read_source(data)
+        acc, rej = dq_transactions(df_new, tx_keys, dim_keys["customers"], stores_all, dim_keys["products"])
+        tx_keys.add(df_new["transaction_id"] if "transaction_id" in df_new.columns else [])
+        accepted["transactions"].append(acc)
+        rejected["transactions"].append(rej)
+        progress(f"{name}: accepted {len(acc)}, rejected {len(rej)}")
+
+    frames["transactions"] = (
+        pd.concat(accepted["transactions"], ignore_index=True) if accepted["transactions"] else pd.DataFrame(),
+        pd.concat(rejected["transactions"], ignore_index=True) if rejected["transactions"] else pd.DataFrame(),
+    )
+
+    summary = {t: {"accepted": len(a), "rejected": len(r)} for t, (a, r) in frames.items()}
+
+    # 3) Commit: dimensions first so the FK targets exist before transactions
+    if commit:
+        for t in DIMENSIONS + ["transactions"]:
+            acc, rej = frames[t]
+            append_table(t, acc)
+            append_rejections(REJECTIONS[t], rej)
+        progress("Committed accepted rows")
+
+        if len(frames["transactions"][0]):
+            summary["loyalty"] = update_after_transactions(frames["transactions"][0])
+            progress("Loyalty tiers and merged table updated")
+
+    summary["frames"] = frames
+    return summary
+
+
+def update_after_transactions(accepted_tx):
+    """Recalculate loyalty tiers and bring merged_transactions up to date."""
+    _, info = apply_loyalty_after_ingest(
+        load_table("customers"), load_table("stores"), load_table("products"), accepted_tx
+    )
+    return info
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Validate and load a multi-table drop (CSV files and/or zips)")
+    parser.add_argument("files", nargs="+", help="CSV or zip files; table is taken from each file name")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes for dimension tables")
+    parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+    args = parser.parse_args()
+
+    result = bulk_ingest(args.files, max_workers=args.workers, commit=not args.dry_run, on_progress=print)
+    result.pop("frames")
+    for table, counts in result.items():
+        print(f"{table}: {counts}")
@@ -1,29 +1,28 @@
 import numpy as np
 import pandas as pd
-import os, math, random
+import os, random, shutil, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-np.random.seed(42)
-random.seed(42)
+from fault_injection import inject_faults
 
 # =========================
 # Parameters
 # =========================
-N_CUSTOMERS = 250
-N_TRANSACTIONS = 50000
-N_PRODUCTS = 250
-N_STORES = 50
+# Scale presets for the CLI; "demo" is the original 250-customer dataset.
+# Shard counts are fixed per preset so output does not depend on core count.
+PRESETS = {
+    "demo": {"customers": 250, "products": 250, "stores": 50, "transactions": 50_000, "shards": 1},
+    "small": {"customers": 2_000, "products": 500, "stores": 100, "transactions": 1_000_000, "shards": 4},
+    "medium": {"customers": 20_000, "products": 2_000, "stores": 300, "transactions": 10_000_000, "shards": 16},
+    "large": {"customers": 100_000, "products": 5_000, "stores": 1_000, "transactions": 50_000_000, "shards": 64},
+}
+
+# Transactions are generated and written this many rows at a time
+DEFAULT_CHUNKSIZE = 1_000_000
 
 start_date = pd.Timestamp("2025-08-01")
 end_date = pd.Timestamp("2025-12-31")  # 5 months
 
-out_dir = "synthetic_retail"
-os.makedirs(out_dir, exist_ok=True)
-
-# =========================
-# 1) CUSTOMERS TABLE
-# =========================
-customer_ids = [f"C{str(i).zfill(5)}" for i in range(1, N_CUSTOMERS + 1)]
-
 regions = ["North", "South", "East", "West", "Central"]
 cities_by_region = {
     "North": ["Northville", "Winterton", "Frostford"],
@@ -39,14 +38,6 @@ tier_probs = [0.45, 0.30, 0.18, 0.07]
 gender = ["F", "M", "O"]
 gender_probs = [0.49, 0.49, 0.02]
 
-ages = np.clip(np.random.normal(35, 12, N_CUSTOMERS).round().astype(int), 18, 75)
-join_dates = start_date - pd.to_timedelta(np.random.randint(30, 730, N_CUSTOMERS), unit="D")
-
-cust_regions = np.random.choice(regions, size=N_CUSTOMERS, p=[0.22, 0.20, 0.20, 0.18, 0.20])
-cust_cities = [np.random.choice(cities_by_region[r]) for r in cust_regions]
-cust_tiers = np.random.choice(loyalty_tiers, size=N_CUSTOMERS, p=tier_probs)
-cust_gender = np.random.choice(gender, size=N_CUSTOMERS, p=gender_probs)
-
 channels = ["InStore", "Online", "Mobile"]
 channel_probs_by_tier = {
     "Bronze": [0.62, 0.25, 0.13],
@@ -54,46 +45,12 @@ channel_probs_by_tier = {
     "Gold": [0.52, 0.32, 0.16],
     "Platinum": [0.45, 0.38, 0.17],
 }
-pref_channel = [np.random.choice(channels, p=channel_probs_by_tier[t]) for t in cust_tiers]
-
-customers = pd.DataFrame({
-    "customer_id": customer_ids,
-    "gender": cust_gender,
-    "age": ages,
-    "join_date": join_dates,
-    "loyalty_tier": cust_tiers,
-    "region": cust_regions,
-    "city": cust_cities,
-    "preferred_channel": pref_channel,
-})
 
 tier_freq_mult = {"Bronze": 0.85, "Silver": 1.00, "Gold": 1.15, "Platinum": 1.30}
 
-# =========================
-# 2) STORES TABLE
-# =========================
-store_ids = [f"S{str(i).zfill(3)}" for i in range(1, N_STORES + 1)]
-
 store_types = ["Mall", "Street", "Outlet", "OnlineHub"]
 store_type_probs = [0.38, 0.32, 0.20, 0.10]
 
-store_regions = np.random.choice(regions, size=N_STORES, p=[0.22, 0.20, 0.20, 0.18, 0.20])
-store_cities = [np.random.choice(cities_by_region[r]) for r in store_regions]
-opening_dates = start_date - pd.to_timedelta(np.random.randint(180, 3650, N_STORES), unit="D")
-
-stores = pd.DataFrame({
-    "store_id": store_ids,
-    "store_type": np.random.choice(store_types, size=N_STORES, p=store_type_probs),
-    "region": store_regions,
-    "city": store_cities,
-    "opening_date": opening_dates,
-})
-
-# =========================
-# 3) PRODUCTS TABLE
-# =========================
-product_ids = [f"P{str(i).zfill(4)}" for i in range(1, N_PRODUCTS + 1)]
-
 categories = ["Grocery", "Electronics", "Clothing", "Home", "Beauty", "Sports"]
 subcats = {
     "Grocery": ["Snacks", "Beverages", "Pantry", "Fresh"],
@@ -114,153 +71,526 @@ cat_price = {
     "Electronics": (15, 900),
 }
 
-prod_cat = np.random.choice(categories, size=N_PRODUCTS,
-                           p=[0.30, 0.12, 0.20, 0.16, 0.12, 0.10])
-prod_subcat = [np.random.choice(subcats[c]) for c in prod_cat]
-prod_brand = np.random.choice(brands, size=N_PRODUCTS)
-
-prices, costs, discountable = [], [], []
-for c in prod_cat:
-    low, high = cat_price[c]
-    base = np.exp(np.random.normal(np.log((low + high) / 2), 0.55))
-    unit_price = float(np.clip(base, low, high))
-    cost = unit_price * np.random.uniform(0.45, 0.75)
-
-    prices.append(round(unit_price, 2))
-    costs.append(round(cost, 2))
-    discountable.append(np.random.choice([0, 1], p=[0.25, 0.75]))
-
-products = pd.DataFrame({
-    "product_id": product_ids,
-    "category": prod_cat,
-    "subcategory": prod_subcat,
-    "brand": prod_brand,
-    "unit_price": prices,
-    "unit_cost": costs,
-    "is_discountable": discountable,
-})
+
+# =========================
+# 1) CUSTOMERS TABLE
+# =========================
+def generate_customers(n_customers):
+    customer_ids = [f"C{str(i).zfill(5)}" for i in range(1, n_customers + 1)]
+
+    ages = np.clip(np.random.normal(35, 12, n_customers).round().astype(int), 18, 75)
+    join_dates = start_date - pd.to_timedelta(np.random.randint(30, 730, n_customers), unit="D")
+
+    cust_regions = np.random.choice(regions, size=n_customers, p=[0.22, 0.20, 0.20, 0.18, 0.20])
+    cust_cities = [np.random.choice(cities_by_region[r]) for r in cust_regions]
+    cust_tiers = np.random.choice(loyalty_tiers, size=n_customers, p=tier_probs)
+    cust_gender = np.random.choice(gender, size=n_customers, p=gender_probs)
+
+    pref_channel = [np.random.choice(channels, p=channel_probs_by_tier[t]) for t in cust_tiers]
+
+    return pd.DataFrame({
+        "customer_id": customer_ids,
+        "gender": cust_gender,
+        "age": ages,
+        "join_date": join_dates,
+        "loyalty_tier": cust_tiers,
+        "region": cust_regions,
+        "city": cust_cities,
+        "preferred_channel": pref_channel,
+    })
+
+
+# =========================
+# 2) STORES TABLE
+# =========================
+def generate_stores(n_stores):
+    store_ids = [f"S{str(i).zfill(3)}" for i in range(1, n_stores + 1)]
+
+    store_regions = np.random.choice(regions, size=n_stores, p=[0.22, 0.20, 0.20, 0.18, 0.20])
+    store_cities = [np.random.choice(cities_by_region[r]) for r in store_regions]
+    opening_dates = start_date - pd.to_timedelta(np.random.randint(180, 3650, n_stores), unit="D")
+
+    return pd.DataFrame({
+        "store_id": store_ids,
+        "store_type": np.random.choice(store_types, size=n_stores, p=store_type_probs),
+        "region": store_regions,
+        "city": store_cities,
+        "opening_date": opening_dates,
+    })
+
+
+# =========================
+# 3) PRODUCTS TABLE
+# =========================
+def generate_products(n_products):
+    product_ids = [f"P{str(i).zfill(4)}" for i in range(1, n_products + 1)]
+
+    prod_cat = np.random.choice(categories, size=n_products,
+                               p=[0.30, 0.12, 0.20, 0.16, 0.12, 0.10])
+    prod_subcat = [np.random.choice(subcats[c]) for c in prod_cat]
+    prod_brand = np.random.choice(brands, size=n_products)
+
+    prices, costs, discountable = [], [], []
+    for c in prod_cat:
+        low, high = cat_price[c]
+        base = np.exp(np.random.normal(np.log((low + high) / 2), 0.55))
+        unit_price = float(np.clip(base, low, high))
+        cost = unit_price * np.random.uniform(0.45, 0.75)
+
+        prices.append(round(unit_price, 2))
+        costs.append(round(cost, 2))
+        discountable.append(np.random.choice([0, 1], p=[0.25, 0.75]))
+
+    return pd.DataFrame({
+        "product_id": product_ids,
+        "category": prod_cat,
+        "subcategory": prod_subcat,
+        "brand": prod_brand,
+        "unit_price": prices,
+        "unit_cost": costs,
+        "is_discountable": discountable,
+    })
+
 
 # =========================
 # 4) TRANSACTIONS TABLE (NO unit_price, NO total_amount)
 # =========================
-date_range = pd.date_range(start_date, end_date, freq="D")
+def build_sampler(customers, stores, products):
+    """Per-customer/store/product lookups shared by every transaction chunk."""
+    customer_ids = customers["customer_id"].tolist()
+
+    date_range = pd.date_range(start_date, end_date, freq="D")
+
+    dow = date_range.dayofweek.values
+    is_weekend = (dow >= 5).astype(int)
+    month_day = date_range.day.values
+    month_end = (month_day >= 25).astype(int)
+
+    daily_intensity = 1.0 + 0.15 * is_weekend + 0.10 * month_end
+    daily_intensity = daily_intensity / daily_intensity.mean()
+    date_probs = daily_intensity / daily_intensity.sum()
+
+    cust_propensity = pd.Series(
+        np.random.lognormal(mean=0.0, sigma=0.35, size=len(customers)),
+        index=customers["customer_id"]
+    )
+
+    cust_tier = customers.set_index("customer_id")["loyalty_tier"]
+
+    fav_cats = {}
+    for cid in customer_ids:
+        t = cust_tier[cid]
+        base_probs = np.array([0.30, 0.12, 0.20, 0.16, 0.12, 0.10])
+        if t in ["Gold", "Platinum"]:
+            base_probs = base_probs + np.array([-0.03, 0.02, 0.00, 0.02, -0.01, 0.00])
+        base_probs = base_probs / base_probs.sum()
+        fav_cats[cid] = np.random.choice(categories, size=2, replace=False, p=base_probs).tolist()
+
+    freq_weights = np.array([cust_propensity[cid] * tier_freq_mult[cust_tier[cid]]
+                             for cid in customer_ids])
+    freq_weights = freq_weights / freq_weights.sum()
+
+    # ---- Integer codes so every attribute is drawn for all rows at once ----
+    region_code = {r: i for i, r in enumerate(regions)}
+    cat_code = {c: i for i, c in enumerate(categories)}
+    channel_code = {c: i for i, c in enumerate(channels)}
+
+    # Stores / products ordered by group: each group is one contiguous slice
+    store_region_code = stores["region"].map(region_code).to_numpy()
+    store_count = np.bincount(store_region_code, minlength=len(regions))
+
+    prod_cat_code = products["category"].map(cat_code).to_numpy()
+    prod_count = np.bincount(prod_cat_code, minlength=len(categories))
+
+    # pick_in_group needs items in every group it draws from. Any category
+    # can be drawn; a region without stores falls back to all stores.
+    empty = [c for c, n in zip(categories, prod_count) if n == 0]
+    if empty:
+        raise ValueError(f"No products in categor{'y' if len(empty) == 1 else 'ies'} {', '.join(empty)}")
+    if len(stores) == 0:
+        raise ValueError("No stores to sell from")
+
+    # Channel by preferred channel (rows 0-2); last row: OnlineHub stores
+    channel_probs = []
+    for pref in channels:
+        base = {"InStore": 0.62, "Online": 0.25, "Mobile": 0.13}
+        base[pref] += 0.18
+        channel_probs.append([base[c] for c in channels])
+    channel_probs.append([0.0, 0.65, 0.35])
+
+    date_month_code, month_labels = pd.factorize(date_range.to_period("M").astype(str))
+
+    return {
+        "customer_ids": customer_ids,
+        "store_ids": stores["store_id"].tolist(),
+        "product_ids": products["product_id"].tolist(),
+        "date_range": date_range,
+        "date_probs": date_probs,
+        "date_month_code": date_month_code,
+        "month_labels": list(month_labels),
+        "freq_weights": freq_weights,
+        "cust_region_code": customers["region"].map(region_code).to_numpy(),
+        "cust_pref_code": customers["preferred_channel"].map(channel_code).to_numpy(),
+        "fav_cat_codes": np.array([[cat_code[c] for c in fav_cats[cid]] for cid in customer_ids]),
+        "store_order": np.argsort(store_region_code, kind="stable"),
+        "store_count": store_count,
+        "store_start": np.concatenate([[0], np.cumsum(store_count)[:-1]]),
+        "store_is_hub": (stores["store_type"] == "OnlineHub").to_numpy(),
+        "store_is_outlet": (stores["store_type"] == "Outlet").to_numpy(),
+        "prod_order": np.argsort(prod_cat_code, kind="stable"),
+        "prod_count": prod_count,
+        "prod_start": np.concatenate([[0], np.cumsum(prod_count)[:-1]]),
+        "prod_is_discountable": products["is_discountable"].to_numpy() == 1,
+        "channel_probs": np.array(channel_probs),
+        "grocery_code": cat_code["Grocery"],
+        "instore_code": channel_code["InStore"],
+    }
+
+
+# Quantity 1..5: Grocery (row 0), other categories (row 1)
+qty_probs = np.array([
+    [0.45, 0.25, 0.15, 0.10, 0.05],
+    [0.75, 0.20, 0.05, 0.00, 0.00],
+])
+
+disc_values = np.array([0.05, 0.10, 0.15, 0.20, 0.25, 0.30])
+disc_probs = np.array([[0.25, 0.28, 0.18, 0.15, 0.09, 0.05]])
+
+
+def choice_by_group(groups, probs):
+    """One draw per row from probs[group]; one pass per group, not per row."""
+    cdf = np.cumsum(probs, axis=1)
+    cdf = cdf / cdf[:, -1:]
+    u = np.random.rand(len(groups))
+    out = np.empty(len(groups), dtype=np.int64)
+    for g in range(len(probs)):
+        rows = groups == g
+        out[rows] = np.searchsorted(cdf[g], u[rows], side="right")
+    return out
+
+
+def pick_in_group(groups, start, count):
+    """Uniform pick among the count[g] items of group g's slice (count[g] > 0)."""
+    return start[groups] + (np.random.rand(len(groups)) * count[groups]).astype(np.int64)
+
+
+def transactions_for_days(s, di, first_id=1, id_prefix="T"):
+    """One transaction per entry of di (sorted day indices into s["date_range"])."""
+    n = len(di)
+    ci = np.random.choice(len(s["customer_ids"]), size=n, p=s["freq_weights"])
+
+    # Store: 85% from the customer's region (if it has stores), else any store
+    region = s["cust_region_code"][ci]
+    local = (np.random.rand(n) < 0.85) & (s["store_count"][region] > 0)
+    si = np.random.randint(0, len(s["store_ids"]), size=n)
+    si[local] = s["store_order"][pick_in_group(region[local], s["store_start"], s["store_count"])]
+
+    # Channel: OnlineHub stores sell Online/Mobile only, else tilted to preference
+    channel_group = np.where(s["store_is_hub"][si], len(channels), s["cust_pref_code"][ci])
+    ch = choice_by_group(channel_group, s["channel_probs"])
+
+    # Category: 70% one of the customer's two favourites, else uniform
+    fav = np.random.rand(n) < 0.70
+    cat = np.random.randint(0, len(categories), size=n)
+    cat[fav] = s["fav_cat_codes"][ci[fav], np.random.randint(0, 2, size=int(fav.sum()))]
+    pi = s["prod_order"][pick_in_group(cat, s["prod_start"], s["prod_count"])]
+
+    qty = choice_by_group((cat != s["grocery_code"]).astype(np.int64), qty_probs) + 1
+
+    # Discount only on discountable products; likelier at outlets and online
+    prob_disc = 0.18 + 0.18 * s["store_is_outlet"][si] + 0.06 * (ch != s["instore_code"])
+    disc_on = s["prod_is_discountable"][pi] & (np.random.rand(n) < prob_disc)
+    disc = np.zeros(n)
+    disc[disc_on] = disc_values[choice_by_group(np.zeros(int(disc_on.sum()), dtype=np.int64), disc_probs)]
+
+    # Keys stay categorical codes (no per-row string objects)
+    ids = np.arange(first_id, first_id + n).astype(str)
+    return pd.DataFrame({
+        "transaction_id": np.char.add(id_prefix, np.char.zfill(ids, 7)),
+        "customer_id": pd.Categorical.from_codes(ci, s["customer_ids"]),
+        "store_id": pd.Categorical.from_codes(si, s["store_ids"]),
+        "product_id": pd.Categorical.from_codes(pi, s["product_ids"]),
+        "transaction_date": s["date_range"].values[di],
+        "channel": pd.Categorical.from_codes(ch, channels),
+        "quantity": qty,
+        "discount_pct": disc.round(2),
+        "year_month": pd.Categorical.from_codes(s["date_month_code"][di], s["month_labels"]),
+    })
 
-dow = date_range.dayofweek.values
-is_weekend = (dow >= 5).astype(int)
-month_day = date_range.day.values
-month_end = (month_day >= 25).astype(int)
 
-daily_intensity = 1.0 + 0.15 * is_weekend + 0.10 * month_end
-daily_intensity = daily_intensity / daily_intensity.mean()
-date_probs = daily_intensity / daily_intensity.sum()
+# =========================
+# Shards
+# =========================
+# The day-sorted row sequence is cut into contiguous shards, and each shard
+# into blocks of BLOCK_ROWS rows. Every block draws from its own seed (base
+# seed, shard id, block index) and the blocks are re-cut into --chunksize
+# rows for writing, so the output depends only on --seed and --shards: not
+# on the chunk size, nor on how many workers ran the shards or in what order.
+BLOCK_ROWS = 100_000
 
-cust_propensity = pd.Series(
-    np.random.lognormal(mean=0.0, sigma=0.35, size=N_CUSTOMERS),
-    index=customers["customer_id"]
-)
 
-cust_tier = customers.set_index("customer_id")["loyalty_tier"]
-cust_region = customers.set_index("customer_id")["region"]
-cust_pref_channel = customers.set_index("customer_id")["preferred_channel"]
+def block_seed(seed, shard, block):
+    return int(np.random.SeedSequence([seed, shard, block]).generate_state(1)[0])
 
-store_type_map = stores.set_index("store_id")["store_type"]
-stores_by_region = {r: stores.loc[stores["region"] == r, "store_id"].tolist() for r in regions}
-all_store_ids = stores["store_id"].tolist()
 
-prod_df = products.set_index("product_id")
-prod_discountable = prod_df["is_discountable"].to_dict()
+def shard_bounds(n_transactions, shards):
+    edges = [n_transactions * k // shards for k in range(shards + 1)]
+    return list(zip(edges[:-1], edges[1:]))
 
-fav_cats = {}
-for cid in customer_ids:
-    t = cust_tier[cid]
-    base_probs = np.array([0.30, 0.12, 0.20, 0.16, 0.12, 0.10])
-    if t in ["Gold", "Platinum"]:
-        base_probs = base_probs + np.array([-0.03, 0.02, 0.00, 0.02, -0.01, 0.00])
-    base_probs = base_probs / base_probs.sum()
-    fav_cats[cid] = np.random.choice(categories, size=2, replace=False, p=base_probs).tolist()
 
-products_by_cat = {c: products.loc[products["category"] == c, "product_id"].tolist()
-                   for c in categories}
+def _shard_csv_path(out_dir, shard):
+    return os.path.join(out_dir, f"transactions.shard-{shard:05d}.csv.tmp")
 
-freq_weights = np.array([cust_propensity[cid] * tier_freq_mult[cust_tier[cid]]
-                         for cid in customer_ids])
-freq_weights = freq_weights / freq_weights.sum()
 
-tx_customer = np.random.choice(customer_ids, size=N_TRANSACTIONS, p=freq_weights)
-tx_dates = np.random.choice(date_range, size=N_TRANSACTIONS, p=date_probs)
-tx_ids = [f"T{str(i).zfill(7)}" for i in range(1, N_TRANSACTIONS + 1)]
+def _shard_blocks(sampler, day_end, seed, shard, a, b):
+    for j, start in enumerate(range(a, b, BLOCK_ROWS)):
+        stop = min(start + BLOCK_ROWS, b)
+        np.random.seed(block_seed(seed, shard, j))
+        di = np.searchsorted(day_end, np.arange(start, stop), side="right")
+        yield transactions_for_days(sampler, di, first_id=start + 1)
 
-tx_store, tx_channel, tx_product = [], [], []
-tx_qty, tx_discount_pct = [], []
 
-for cid, dt in zip(tx_customer, tx_dates):
+def _rechunk(blocks, chunksize):
+    """The rows of blocks, chunksize at a time."""
+    parts, rows = [], 0
+    for block in blocks:
+        while len(block):
+            part, block = block.iloc[:chunksize - rows], block.iloc[chunksize - rows:]
+            parts.append(part)
+            rows += len(part)
+            if rows == chunksize:
+                yield pd.concat(parts, ignore_index=True)
+                parts, rows = [], 0
+    if parts:
+        yield pd.concat(parts, ignore_index=True)
 
-    r = cust_region[cid]
-    if np.random.rand() < 0.85 and len(stores_by_region[r]) > 0:
-        sid = np.random.choice(stores_by_region[r])
-    else:
-        sid = np.random.choice(all_store_ids)
 
-    pref = cust_pref_channel[cid]
-    if store_type_map[sid] == "OnlineHub":
-        channel = np.random.choice(["Online", "Mobile"], p=[0.65, 0.35])
-    else:
-        base = {"InStore": 0.62, "Online": 0.25, "Mobile": 0.13}
-        base[pref] += 0.18
-        p = np.array([base["InStore"], base["Online"], base["Mobile"]])
-        p = p / p.sum()
-        channel = np.random.choice(["InStore", "Online", "Mobile"], p=p)
+def generate_shard(sampler, day_end, seed, shard, a, b, out_dir, fmt, chunksize=DEFAULT_CHUNKSIZE):
+    """Write rows [a, b) of the day-sorted sequence, chunksize rows at a time."""
+    blocks = _shard_blocks(sampler, day_end, seed, shard, a, b)
+    for i, chunk in enumerate(_rechunk(blocks, chunksize)):
+        if fmt == "parquet":
+            # Ordered file names: partitions read back in date order
+            _parquet_types(chunk).to_parquet(
+                os.path.join(out_dir, "transactions.parquet"), partition_cols=["year_month"], index=False,
+                basename_template=f"part-{shard:05d}-{i:05d}-{{i}}.parquet",
+            )
+        else:
+            chunk.to_csv(_shard_csv_path(out_dir, shard), mode="w" if i == 0 else "a", header=False, index=False)
 
-    if np.random.rand() < 0.70:
-        cat = np.random.choice(fav_cats[cid])
-    else:
-        cat = np.random.choice(categories)
+    return shard, b - a
 
-    pid = np.random.choice(products_by_cat[cat])
 
-    if cat == "Grocery":
-        qty = np.random.choice([1, 2, 3, 4, 5], p=[0.45, 0.25, 0.15, 0.10, 0.05])
+# =========================
+# Save
+# =========================
+TRANSACTION_COLUMNS = [
+    "transaction_id", "customer_id", "store_id", "product_id", "transaction_date",
+    "channel", "quantity", "discount_pct", "year_month",
+]
+
+
+def _parquet_types(df):
+    # Same column types io_utils writes, so the Parquet layout reads back as-is
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype) or df[col].dtype == object:
+            df[col] = df[col].astype("string")
+    return df
+
+
+def save_table(df, out_dir, name, fmt):
+    if fmt == "parquet":
+        _parquet_types(df).to_parquet(os.path.join(out_dir, f"{name}.parquet"), index=False)
     else:
-        qty = np.random.choice([1, 2, 3], p=[0.75, 0.20, 0.05])
-
-    disc = 0.0
-    if prod_discountable[pid] == 1:
-        prob_disc = 0.18
-        if store_type_map[sid] == "Outlet":
-            prob_disc += 0.18
-        if channel in ["Online", "Mobile"]:
-            prob_disc += 0.06
-        if np.random.rand() < prob_disc:
-            disc = np.random.choice([0.05, 0.10, 0.15, 0.20, 0.25, 0.30],
-                                    p=[0.25, 0.28, 0.18, 0.15, 0.09, 0.05])
-
-    tx_store.append(sid)
-    tx_channel.append(channel)
-    tx_product.append(pid)
-    tx_qty.append(qty)
-    tx_discount_pct.append(round(disc, 2))
-
-transactions = pd.DataFrame({
-    "transaction_id": tx_ids,
-    "customer_id": tx_customer,
-    "store_id": tx_store,
-    "product_id": tx_product,
-    "transaction_date": pd.to_datetime(tx_dates),
-    "channel": tx_channel,
-    "quantity": tx_qty,
-    "discount_pct": tx_discount_pct,
-})
-
-transactions["year_month"] = transactions["transaction_date"].dt.to_period("M").astype(str)
-transactions = transactions.sort_values("transaction_date").reset_index(drop=True)
+        df.to_csv(os.path.join(out_dir, f"{name}.csv"), index=False)
+
+
+def _merge_csv_shards(out_dir, shards):
+    # Shard files are headerless; concatenated in shard order they are the
+    # date-ordered table
+    path = os.path.join(out_dir, "transactions.csv")
+    with open(path, "wb") as out:
+        out.write((",".join(TRANSACTION_COLUMNS) + "\n").encode())
+        for shard in range(shards):
+            part = _shard_csv_path(out_dir, shard)
+            if os.path.exists(part):
+                with open(part, "rb") as f:
+                    shutil.copyfileobj(f, out, 16 * 1024 ** 2)
+                os.remove(part)
+
+
+def write_transactions(sampler, n_transactions, out_dir, fmt, seed, shards=1, workers=None,
+                       chunksize=DEFAULT_CHUNKSIZE, on_shard=None):
+    """
+    Generate and write transactions in date order. Shards run in worker
+    processes; each holds one chunk in memory at a time.
+    """
+    # Rows per day are drawn up front (multinomial over the daily weights)
+    day_end = np.cumsum(np.random.multinomial(n_transactions, sampler["date_probs"]))
+
+    if fmt == "parquet":
+        path = os.path.join(out_dir, "transactions.parquet")
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+
+    tasks = [
+        (sampler, day_end, seed, shard, a, b, out_dir, fmt, chunksize)
+        for shard, (a, b) in enumerate(shard_bounds(n_transactions, shards))
+    ]
+    workers = workers or min(shards, os.cpu_count() or 1)
+
+    rows = 0
+    if workers == 1:
+        for task in tasks:
+            shard, n = generate_shard(*task)
+            rows += n
+            if on_shard is not None:
+                on_shard(shard, rows)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(generate_shard, *task) for task in tasks]
+            for fut in as_completed(futures):
+                shard, n = fut.result()
+                rows += n
+                if on_shard is not None:
+                    on_shard(shard, rows)
+
+    if fmt != "parquet":
+        _merge_csv_shards(out_dir, shards)
+    return rows
+
+
+def generate(n_customers, n_products, n_stores, n_transactions, out_dir="synthetic_retail", fmt="csv",
+             chunksize=DEFAULT_CHUNKSIZE, seed=42, shards=1, workers=None, on_shard=None):
+    np.random.seed(seed)
+    random.seed(seed)
+    os.makedirs(out_dir, exist_ok=True)
+
+    customers = generate_customers(n_customers)
+    stores = generate_stores(n_stores)
+    products = generate_products(n_products)
+
+    for name, df in [("customers", customers), ("stores", stores), ("products", products)]:
+        save_table(df, out_dir, name, fmt)
+
+    sampler = build_sampler(customers, stores, products)
+    rows = write_transactions(sampler, n_transactions, out_dir, fmt, seed, shards, workers, chunksize, on_shard)
+
+    return {"customers": len(customers), "stores": len(stores), "products": len(products), "transactions": rows}
+
 
 # =========================
-# Save CSVs
+# Live feed
 # =========================
-customers.to_csv(os.path.join(out_dir, "customers.csv"), index=False)
-stores.to_csv(os.path.join(out_dir, "stores.csv"), index=False)
-products.to_csv(os.path.join(out_dir, "products.csv"), index=False)
-transactions.to_csv(os.path.join(out_dir, "transactions.csv"), index=False)
-
-print("Saved datasets to:", out_dir)
-print(customers.shape, stores.shape, products.shape, transactions.shape)
+# Emits transactions for today at a fixed rate, drawn from the stored
+# customer / store / product tables with the same behaviour as above.
+# Bad rows get one of these DQ faults (see fault_injection.py).
+FEED_VIOLATIONS = ["bad_quantity", "bad_discount_pct", "bad_channel", "unknown_customer_id", "missing_required"]
+
+
+def load_dimensions(out_dir="synthetic_retail", fmt="csv"):
+    def read(name):
+        if fmt == "parquet":
+            return pd.read_parquet(os.path.join(out_dir, f"{name}.parquet"))
+        return pd.read_csv(os.path.join(out_dir, f"{name}.csv"))
+    return read("customers"), read("stores"), read("products")
+
+
+def feed_batches(sampler, rate, batch_size=1_000, max_rows=None, violation_rate=0.0, id_prefix=None):
+    """
+    Yield (emitted_at, batch, injected) at about rate rows per second.
+    The schedule is absolute, so a slow consumer shows up as latency rather
+    than a lower send rate. Ids carry a per-run prefix to avoid collisions.
+    """
+    id_prefix = id_prefix or f"TL{int(time.time())}-"
+    interval = batch_size / rate
+    start = time.time()
+    sent, k = 0, 0
+
+    while max_rows is None or sent < max_rows:
+        n = batch_size if max_rows is None else min(batch_size, max_rows - sent)
+        delay = start + k * interval - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+        batch = transactions_for_days(sampler, np.zeros(n, dtype=np.int64), first_id=sent + 1, id_prefix=id_prefix)
+        today = pd.Timestamp.today().normalize()
+        batch["transaction_date"] = today
+        batch["year_month"] = today.strftime("%Y-%m")
+
+        injected = np.zeros(n, dtype=bool)
+        if violation_rate:
+            rates = {name: violation_rate / len(FEED_VIOLATIONS) for name in FEED_VIOLATIONS}
+            batch, fault_code = inject_faults(batch, "transactions", rates, seed=np.random.randint(2**31))
+            injected = fault_code != 0
+
+        yield time.time(), batch, injected
+        sent += n
+        k += 1
+
+
+def write_drop(drop_dir, seq, emitted_at, batch, injected):
+    # feed-<seq>-<emitted us>-inj<n>.csv, renamed into place once complete
+    name = f"feed-{seq:08d}-{int(emitted_at * 1e6)}-inj{int(injected.sum())}.csv"
+    tmp = os.path.join(drop_dir, f".{name}.tmp")
+    batch.to_csv(tmp, index=False)
+    os.replace(tmp, os.path.join(drop_dir, name))
+
+
+def run_feed(drop_dir, rate, batch_size=1_000, max_rows=None, violation_rate=0.0,
+             out_dir="synthetic_retail", fmt="csv", seed=42):
+    np.random.seed(seed)
+    os.makedirs(drop_dir, exist_ok=True)
+    sampler = build_sampler(*load_dimensions(out_dir, fmt))
+
+    for seq, (emitted_at, batch, injected) in enumerate(
+            feed_batches(sampler, rate, batch_size, max_rows, violation_rate)):
+        write_drop(drop_dir, seq, emitted_at, batch, injected)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Generate the synthetic retail dataset")
+    parser.add_argument("--preset", choices=list(PRESETS), default="demo", help="scale preset (default: demo)")
+    parser.add_argument("--customers", type=int, help="override the preset's customer count")
+    parser.add_argument("--products", type=int, help="override the preset's product count")
+    parser.add_argument("--stores", type=int, help="override the preset's store count")
+    parser.add_argument("--transactions", type=int, help="override the preset's transaction count")
+    parser.add_argument("--shards", type=int,
+                        help="override the preset's shard count (output is fixed by --seed and --shards)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: one per core, up to --shards)")
+    parser.add_argument("--chunksize", type=int, default=DEFAULT_CHUNKSIZE,
+                        help="transactions written per chunk (bounds memory; does not change the data)")
+    parser.add_argument("--format", choices=["csv", "parquet"],
+                        default=os.environ.get("RETAIL_STORAGE_FORMAT", "csv").lower(), help="output format")
+    parser.add_argument("--out-dir", default="synthetic_retail")
+    parser.add_argument("--seed", type=int, default=42)
+    feed = parser.add_argument_group("live feed (uses the tables already in --out-dir)")
+    feed.add_argument("--feed", metavar="DROP_DIR", help="emit transactions into DROP_DIR instead of generating a dataset")
+    feed.add_argument("--rate", type=float, default=1_000, help="rows per second")
+    feed.add_argument("--batch-size", type=int, default=1_000, help="rows per dropped file")
+    feed.add_argument("--max-rows", type=int, default=None, help="stop after this many rows (default: run until killed)")
+    feed.add_argument("--violation-rate", type=float, default=0.0, help="fraction of rows given one DQ violation")
+    args = parser.parse_args()
+
+    if args.feed:
+        run_feed(args.feed, args.rate, args.batch_size, args.max_rows, args.violation_rate,
+                 out_dir=args.out_dir, fmt=args.format, seed=args.seed)
+        raise SystemExit
+
+    sizes = dict(PRESETS[args.preset])
+    for key in sizes:
+        if getattr(args, key) is not None:
+            sizes[key] = getattr(args, key)
+
+    counts = generate(
+        sizes["customers"], sizes["products"], sizes["stores"], sizes["transactions"],
+        out_dir=args.out_dir, fmt=args.format, chunksize=args.chunksize, seed=args.seed,
+        shards=sizes["shards"], workers=args.workers,
+        on_shard=lambda shard, rows: print(f"  shard {shard} done, transactions written: {rows:,}"),
+    )
+
+    print("Saved datasets to:", args.out_dir)
+    print(counts)
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+from schema import DQ_RULES
+from io_utils import REJ_CUSTOMERS_CSV, REJ_STORES_CSV, REJ_PRODUCTS_CSV, REJ_TRANSACTIONS_CSV
+
+
+# =========================
+# Rule registry
+# =========================
+# Each rule owns one bit of rejection_code: bit i = 1 << i (position in
+# schema.DQ_RULES). Codes are stored in rejected_*.csv.
+RULES = {
+    table: [(rule["name"], rule["message"]) for rule in rules]
+    for table, rules in DQ_RULES.items()
+}
+
+REJECTIONS_CSV = {
+    "customers": REJ_CUSTOMERS_CSV,
+    "stores": REJ_STORES_CSV,
+    "products": REJ_PRODUCTS_CSV,
+    "transactions": REJ_TRANSACTIONS_CSV,
+}
+
+
+def rule_bit(table, rule):
+    names = [name for name, _ in RULES[table]]
+    return 1 << names.index(rule)
+
+
+# =========================
+# Decoding (display / export only)
+# =========================
+def decode_codes(table, codes) -> pd.Series:
+    codes = pd.Series(codes)
+    valid = codes.notna()
+
+    # Build text once per distinct code, not per row
+    text = {}
+    for code in pd.unique(codes[valid].astype(np.int64)):
+        msgs = [msg for i, (_, msg) in enumerate(RULES[table]) if code & (1 << i)]
+        text[code] = "; ".join(msgs) + ";" if msgs else ""
+
+    out = pd.Series("", index=codes.index, dtype="object")
+    out[valid] = codes[valid].astype(np.int64).map(text)
+    return out
+
+
+def with_reason_text(rejected: pd.DataFrame, table):
+    """Add a readable rejection_reason column decoded from rejection_code."""
+    if "rejection_code" not in rejected.columns:
+        return rejected
+
+    out = rejected.copy()
+    text = decode_codes(table, out["rejection_code"])
+    if "rejection_reason" in out.columns:
+        # Rows logged before codes existed keep their stored text
+        text = text.where(out["rejection_code"].notna(), out["rejection_reason"])
+    out["rejection_reason"] = text
+    return out
+
+
+def filter_by_rule(rejected: pd.DataFrame, table, rule):
+    codes = pd.to_numeric(rejected["rejection_code"], errors="coerce").fillna(0).astype(np.int64)
+    return rejected.loc[(codes & rule_bit(table, rule)) != 0]
+
+
+def load_rejections(table, rule=None, with_text=True):
+    path = REJECTIONS_CSV[table]
+    rejected = pd.read_csv(path)
+    if rule is not None:
+        rejected = filter_by_rule(rejected, table, rule)
+    if with_text:
+        rejected = with_reason_text(rejected, table)
+    return rejected
@@ -0,0 +1,167 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from schema import SCHEMA, DQ_RULES
+from key_index import key_lookup
+
+
+# =========================
+# Compilation
+# =========================
+def _key_columns(table):
+    meta = SCHEMA[f"{table}.csv"]
+    return set(meta.get("pk", [])) | set(meta.get("fk", {}))
+
+
+def _mask_required(rule, raw, arrays, refs):
+    return raw[rule["columns"]].isna().any(axis=1).to_numpy()
+
+
+def _mask_range(rule, raw, arrays, refs):
+    x = arrays[rule["column"]].to_numpy(dtype="float64", na_value=np.nan)
+    low = x < rule["min"] if rule.get("min_inclusive", True) else x <= rule["min"]
+    return np.isnan(x) | low | (x > rule["max"])
+
+
+def _mask_not_future(rule, raw, arrays, refs):
+    d = arrays[rule["column"]]
+    today = pd.Timestamp.today().normalize()
+    return (d.isna() | (d > today)).to_numpy()
+
+
+def _mask_unique(rule, raw, arrays, refs):
+    col = rule["column"]
+    keys = arrays[col]
+    existing = key_lookup(refs.get("self"), col)
+    return existing.contains(keys) | keys.duplicated(keep="first").to_numpy()
+
+
+def _mask_in_set(rule, raw, arrays, refs):
+    return (~arrays[rule["column"]].isin(rule["values"])).to_numpy()
+
+
+def _mask_fk(rule, raw, arrays, refs):
+    col = rule["column"]
+    return ~key_lookup(refs.get(rule["ref"]), col).contains(arrays[col])
+
+
+def _mask_not_before(rule, raw, arrays, refs):
+    ref = refs.get(rule["ref"])
+    key, ref_col = rule["key"], rule["ref_column"]
+
+    by_key = pd.Series(dtype="datetime64[ns]")
+    if ref is not None and len(ref):
+        ref = ref.drop_duplicates(key)
+        by_key = pd.Series(
+            pd.to_datetime(ref[ref_col], errors="coerce").values,
+            index=ref[key].astype(str),
+        )
+
+    ref_date = arrays[key].map(by_key)
+    return (ref_date.isna() | (arrays[rule["column"]] < ref_date)).to_numpy()
+
+
+MASKS = {
+    "required": _mask_required,
+    "range": _mask_range,
+    "not_future": _mask_not_future,
+    "unique": _mask_unique,
+    "in_set": _mask_in_set,
+    "fk": _mask_fk,
+    "not_before": _mask_not_before,
+}
+
+_COMPILED = {}
+
+
+def compile_rules(table):
+    """
+    Resolve a table's declared rules once: the mask function and bit of
+    every rule, plus how each referenced column is converted.
+    """
+    if table in _COMPILED:
+        return _COMPILED[table]
+
+    types = SCHEMA[f"{table}.csv"]["columns"]
+    rules, columns, required = [], {}, []
+
+    for i, rule in enumerate(DQ_RULES[table]):
+        rules.append((rule, MASKS[rule["kind"]], np.int64(1) << i))
+        if rule["kind"] == "required":
+            required.extend(rule["columns"])
+        for c in [rule.get("column"), rule.get("key")]:
+            if c is not None:
+                columns[c] = types.get(c, "string")
+
+    compiled = {
+        "rules": rules,
+        "columns": columns,
+        "required": list(dict.fromkeys(required)),
+        "write_back": [
+            c for c, kind in columns.items()
+            if kind in ("int", "float", "date") or c in _key_columns(table)
+        ],
+    }
+    _COMPILED[table] = compiled
+    return compiled
+
+
+def _convert(series: pd.Series, kind):
+    if kind in ("int", "float"):
+        return pd.to_numeric(series, errors="coerce")
+    if kind == "date":
+        return pd.to_datetime(series, errors="coerce")
+    return series.astype(str)
+
+
+# =========================
+# Evaluation
+# =========================
+def run_rules(table, df_new: pd.DataFrame, refs: dict, stats=None):
+    """
+    Validate a batch against the table's declared rules in one pass.
+
+    refs maps "self" and referenced table names to an existing DataFrame or
+    key index. Each column is converted once; every rule then runs on the
+    typed arrays and ORs its bit into rejection_code.
+    If stats is a list, one {"rule", "hits", "ms"} entry per rule is appended.
+    """
+    compiled = compile_rules(table)
+    df = df_new.copy()
+
+    for c in compiled["required"]:
+        if c not in df.columns:
+            df[c] = None
+
+    t0 = time.perf_counter()
+    arrays = {c: _convert(df[c], kind) for c, kind in compiled["columns"].items()}
+    if stats is not None:
+        stats.append({"rule": "convert", "hits": len(df), "ms": (time.perf_counter() - t0) * 1000})
+
+    codes = np.zeros(len(df), dtype=np.int64)
+    for rule, mask_fn, bit in compiled["rules"]:
+        t0 = time.perf_counter()
+        mask = np.asarray(mask_fn(rule, df, arrays, refs), dtype=bool)
+        codes |= mask * bit
+        if stats is not None:
+            stats.append({
+                "rule": rule["name"],
+                "hits": int(mask.sum()),
+                "ms": (time.perf_counter() - t0) * 1000,
+            })
+
+    # Typed values replace the raw ones (numbers, dates, string keys)
+    for c in compiled["write_back"]:
+        df[c] = arrays[c]
+
+    reject_mask = codes != 0
+    accepted = df.loc[~reject_mask].copy()
+    rejected = df.loc[reject_mask].copy()
+    rejected["rejection_code"] = codes[reject_mask]
+    return accepted, rejected
+
+
+def stats_frame(stats):
+    return pd.DataFrame(stats, columns=["rule", "hits", "ms"])
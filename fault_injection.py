@@ -0,0 +1,282 @@
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
+
+from schema import DQ_RULES
+from dq_codes import rule_bit
+from dq_engine import run_rules
+
+# =========================
+# Faults
+# =========================
+# Every DQ rule of a table has a matching fault that breaks it (null, out of
+# range, bad enum, orphan FK, duplicate PK, future or too-early date), plus
+# "noise": numeric values moved within their valid range, which the rules
+# should let through. Each corrupted row gets exactly one fault, and its
+# ground truth is the bit of the targeted rule in the same layout as
+# rejection_code (0 for clean and noise rows).
+NOISE = "noise"
+
+FUTURE_DAYS = 365
+TOO_EARLY = pd.Timestamp("1900-01-01")
+
+
+def _as_object(df, col):
+    # Categorical / typed columns can't take the foreign values faults write
+    if not is_numeric_dtype(df[col]) and not is_datetime64_any_dtype(df[col]):
+        df[col] = df[col].astype("object")
+
+
+def _put(df, col, sel, values):
+    values = pd.Series(values, index=df.index[sel]) if np.ndim(values) else values
+    df.loc[sel, col] = values
+
+
+def _date(df, col, ts):
+    return ts if is_datetime64_any_dtype(df[col]) else ts.strftime("%Y-%m-%d")
+
+
+def _fault_required(df, rule, sel, rng):
+    # One of the required columns per row goes missing
+    pick = rng.integers(0, len(rule["columns"]), size=len(df))
+    for i, col in enumerate(rule["columns"]):
+        if col in df.columns:
+            df[col] = df[col].mask(sel & (pick == i))
+
+
+def _fault_range(df, rule, sel, rng):
+    col = rule["column"]
+    low = rule["min"] - 1
+    high = rule["max"] * 2 + 1
+    bad = np.where(rng.random(int(sel.sum())) < 0.5, low, high)
+    df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    _put(df, col, sel, bad)
+
+
+def _fault_not_future(df, rule, sel, rng):
+    col = rule["column"]
+    _as_object(df, col)
+    _put(df, col, sel, _date(df, col, pd.Timestamp.today().normalize() + pd.Timedelta(days=FUTURE_DAYS)))
+
+
+def _fault_not_before(df, rule, sel, rng):
+    col = rule["column"]
+    _as_object(df, col)
+    _put(df, col, sel, _date(df, col, TOO_EARLY))
+
+
+def _fault_in_set(df, rule, sel, rng):
+    col = rule["column"]
+    values = rule["values"]
+    if all(isinstance(v, (int, float)) for v in values):
+        bad = max(values) + 7
+    else:
+        bad = "INVALID"
+        _as_object(df, col)
+    _put(df, col, sel, bad)
+
+
+def _fault_fk(df, rule, sel, rng):
+    col = rule["column"]
+    _as_object(df, col)
+    _put(df, col, sel, [f"{col}-ORPHAN-{i}" for i in np.flatnonzero(sel)])
+
+
+def _fault_unique(df, rule, sel, clean):
+    # Copy the key of the nearest earlier clean row; rows with none stay clean
+    col = rule["column"]
+    src = np.maximum.accumulate(np.where(clean, np.arange(len(df)), -1))
+    sel &= src >= 0
+    _as_object(df, col)
+    _put(df, col, sel, df[col].to_numpy()[src[sel]])
+    return sel
+
+
+def _fault_noise(df, rules, sel, rng, noise_std):
+    # Relative gaussian noise on the range-checked columns, clipped to range
+    for rule in rules:
+        if rule["kind"] != "range" or rule["column"] not in df.columns:
+            continue
+        col = rule["column"]
+        x = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+        noisy = x * (1 + rng.normal(0, noise_std, size=len(x)))
+        low = rule["min"] if rule.get("min_inclusive", True) else np.nextafter(rule["min"], np.inf)
+        noisy = np.clip(noisy, low, rule["max"])
+        if df[col].dtype.kind in "iu":
+            noisy = np.clip(np.round(noisy), np.ceil(low), np.floor(rule["max"]))
+            df[col] = df[col].where(~sel, noisy.astype(df[col].dtype))
+        else:
+            df[col] = np.where(sel, noisy, x)
+
+
+FAULTS = {
+    "required": _fault_required,
+    "range": _fault_range,
+    "not_future": _fault_not_future,
+    "not_before": _fault_not_before,
+    "in_set": _fault_in_set,
+    "fk": _fault_fk,
+}
+
+
+def fault_names(table):
+    """Faults available for a table: its rule names plus "noise"."""
+    return [rule["name"] for rule in DQ_RULES[table]] + [NOISE]
+
+
+def inject_faults(df: pd.DataFrame, table, rates, seed=None, noise_std=0.1):
+    """
+    Corrupt a clean batch of `table` rows.
+
+    rates: {fault name: fraction of rows}, or one fraction spread evenly over
+    the table's rules (no noise). Returns (corrupted copy with a fresh
+    RangeIndex, fault_code array with the targeted rule's bit per row).
+    """
+    rng = np.random.default_rng(seed)
+    rules = DQ_RULES[table]
+    names = fault_names(table)
+
+    if not isinstance(rates, dict):
+        rates = {rule["name"]: rates / len(rules) for rule in rules}
+    unknown = set(rates) - set(names)
+    if unknown:
+        raise ValueError(f"Unknown fault(s) for {table}: {sorted(unknown)}")
+    if sum(rates.values()) > 1:
+        raise ValueError("Fault rates add up to more than 1")
+
+    # One draw per row picks its fault (or none) by cumulative rate
+    order = [n for n in names if rates.get(n, 0) > 0]
+    bounds = np.cumsum([rates[n] for n in order])
+    assigned = np.searchsorted(bounds, rng.random(len(df)), side="right")
+
+    df = df.reset_index(drop=True)
+    fault_code = np.zeros(len(df), dtype=np.int64)
+    clean = assigned == len(order)
+
+    for i, name in enumerate(order):
+        sel = assigned == i
+        if not sel.any():
+            continue
+        if name == NOISE:
+            _fault_noise(df, rules, sel, rng, noise_std)
+            continue
+
+        rule = next(r for r in rules if r["name"] == name)
+        if rule["kind"] == "unique":
+            sel = _fault_unique(df, rule, sel, clean)
+        else:
+            FAULTS[rule["kind"]](df, rule, sel, rng)
+        fault_code[sel] = rule_bit(table, name)
+
+    return df, fault_code
+
+
+def corrupt_dataframe(df, noise_ratio=0.05, missing_ratio=0.05, noise_std=0.1, seed=None):
+    """
+    Vectorized version of corrupt_dataframe in models/GRU + Demo.ipynb:
+    gaussian noise on noise_ratio of each numeric column, then missing_ratio
+    of all cells set to NaN.
+    """
+    rng = np.random.default_rng(seed)
+    df = df.copy()
+
+    for col in df.select_dtypes(include=[np.number]).columns:
+        noise_mask = rng.random(len(df)) < noise_ratio
+        noise = rng.normal(0, noise_std * df[col].std(), size=len(df))
+        df[col] = df[col].astype("float64").where(~noise_mask, df[col] + noise)
+
+    return df.mask(rng.random(df.shape) < missing_ratio)
+
+
+# =========================
+# Scoring
+# =========================
+def row_codes(df, rejected):
+    """rejection_code per input row (0 = accepted); df must have a unique index."""
+    codes = pd.Series(0, index=df.index, dtype=np.int64)
+    codes.loc[rejected.index] = rejected["rejection_code"].to_numpy()
+    return codes.to_numpy()
+
+
+def evaluate(table, fault_code, rejection_code):
+    """
+    Precision / recall of every rule against the injected faults, plus an
+    "any" row for rejected vs corrupted rows overall. A fault can trip more
+    than the rule it targets (a missing channel also fails bad_channel),
+    which shows up as lower precision on the other rule.
+    """
+    fault_code = np.asarray(fault_code)
+    rejection_code = np.asarray(rejection_code)
+
+    rows = []
+    checks = [(rule["name"], rule_bit(table, rule["name"])) for rule in DQ_RULES[table]]
+    for name, bit in checks + [("any", None)]:
+        truth = fault_code != 0 if bit is None else (fault_code & bit) != 0
+        flagged = rejection_code != 0 if bit is None else (rejection_code & bit) != 0
+        hits = int((truth & flagged).sum())
+        rows.append({
+            "rule": name,
+            "injected": int(truth.sum()),
+            "flagged": int(flagged.sum()),
+            "hits": hits,
+            "precision": hits / flagged.sum() if flagged.any() else np.nan,
+            "recall": hits / truth.sum() if truth.any() else np.nan,
+        })
+    return pd.DataFrame(rows)
+
+
+def stress_test(table, df, refs, rates, seed=None, stats=None):
+    """
+    Inject faults into df, validate it with the table's rules and score them.
+    Returns (evaluation frame, validation seconds).
+    """
+    corrupted, fault_code = inject_faults(df, table, rates, seed)
+    t0 = time.perf_counter()
+    _, rejected = run_rules(table, corrupted, refs, stats)
+    seconds = time.perf_counter() - t0
+    return evaluate(table, fault_code, row_codes(corrupted, rejected)), seconds
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from io_utils import INDEXED_KEYS, read_table, load_table, load_key_index
+    from dq_engine import stats_frame
+
+    parser = argparse.ArgumentParser(description="Score the DQ rules on a stored table with injected faults")
+    parser.add_argument("table", choices=list(DQ_RULES))
+    parser.add_argument("--rate", type=float, default=0.2, help="fraction of rows corrupted, spread over the rules")
+    parser.add_argument("--noise", type=float, default=0.0, help="extra fraction of rows given in-range noise")
+    parser.add_argument("--rows", type=int, default=None, help="tile or cut the table to this many rows")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    df = read_table(args.table)
+    if args.rows is not None:
+        # Tiled copies get a suffix on the key so the batch stays unique
+        n = len(df)
+        df = df.iloc[np.arange(args.rows) % n].reset_index(drop=True)
+        pk = INDEXED_KEYS[args.table][0]
+        copy = np.arange(len(df)) // n
+        df[pk] = df[pk].astype(str).where(copy == 0, df[pk].astype(str) + "-" + copy.astype(str))
+
+    # The table is validated as a new batch against the dimension tables
+    refs = {
+        "customers": load_key_index("customers", "customer_id"),
+        "stores": load_table("stores"),
+        "products": load_key_index("products", "product_id"),
+    }
+    rules = [r["name"] for r in DQ_RULES[args.table]]
+    rates = {name: args.rate / len(rules) for name in rules}
+    if args.noise:
+        rates[NOISE] = args.noise
+
+    stats = []
+    result, seconds = stress_test(args.table, df, refs, rates, args.seed, stats)
+
+    print(result.to_string(index=False, float_format=lambda x: f"{x:.3f}"))
+    print()
+    print(stats_frame(stats).to_string(index=False, float_format=lambda x: f"{x:.1f}"))
+    print(f"\nvalidated {len(df):,} rows in {seconds:.2f}s ({len(df) / seconds:,.0f} rows/s)")
@@ -0,0 +1,167 @@
+import glob
+import os
+import queue
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from io_utils import (
+    REJ_TRANSACTIONS_CSV,
+    load_table,
+    load_key_index,
+    append_table,
+    append_rejections,
+    data_lock,
+)
+from dq_transactions import dq_transactions
+from loyalty_update import apply_loyalty_after_ingest
+from data_generator import build_sampler, feed_batches
+
+# Load-test driver: pushes a live feed through validation, append and the
+# loyalty/merged update, then reports throughput and latency. It appends to
+# DATA_DIR, so run it against a copy of the dataset.
+
+
+# =========================
+# Sources
+# =========================
+def queue_source(rate, batch_size, max_rows, violation_rate, seed=42):
+    """Run the feed in a thread; yield (emitted_at, batch, injected count)."""
+    np.random.seed(seed)
+    sampler = build_sampler(load_table("customers"), load_table("stores"), load_table("products"))
+    q = queue.Queue()
+
+    def produce():
+        for emitted_at, batch, injected in feed_batches(sampler, rate, batch_size, max_rows, violation_rate):
+            q.put((emitted_at, batch, int(injected.sum())))
+        q.put(None)
+
+    threading.Thread(target=produce, daemon=True).start()
+    while True:
+        item = q.get()
+        if item is None:
+            return
+        yield item
+
+
+def dir_source(drop_dir, idle_timeout=5.0, poll=0.05):
+    """Consume files written by `data_generator.py --feed DROP_DIR` in order."""
+    last_seen = time.time()
+    while time.time() - last_seen < idle_timeout:
+        files = sorted(glob.glob(os.path.join(drop_dir, "feed-*.csv")))
+        if not files:
+            time.sleep(poll)
+            continue
+        for path in files:
+            _, _, emitted_us, inj = os.path.basename(path)[:-len(".csv")].split("-")
+            batch = pd.read_csv(path)
+            os.remove(path)
+            yield int(emitted_us) / 1e6, batch, int(inj[len("inj"):])
+        last_seen = time.time()
+
+
+# =========================
+# Driver
+# =========================
+def drive(source, loyalty_every=1, on_batch=None):
+    """
+    Validate + append every batch from source (as the upload paths do) and
+    refresh tiers / merged every loyalty_every batches (0 = never).
+    Returns the summary from summarize().
+    """
+    stores = load_table("stores")
+    customers = products = None
+    if loyalty_every:
+        customers, products = load_table("customers"), load_table("products")
+
+    log = []
+    pending = []
+    start = time.time()
+
+    for k, (emitted_at, batch, injected) in enumerate(source):
+        t0 = time.perf_counter()
+        with data_lock():
+            accepted, rejected = dq_transactions(
+                batch,
+                load_key_index("transactions", "transaction_id"),
+                load_key_index("customers", "customer_id"),
+                stores,
+                load_key_index("products", "product_id"),
+            )
+            t1 = time.perf_counter()
+            append_table("transactions", accepted)
+            append_rejections(REJ_TRANSACTIONS_CSV, rejected)
+        t2 = time.perf_counter()
+
+        pending.append(accepted)
+        if loyalty_every and (k + 1) % loyalty_every == 0:
+            customers, _ = apply_loyalty_after_ingest(customers, stores, products, pd.concat(pending, ignore_index=True))
+            pending = []
+        t3 = time.perf_counter()
+
+        row = {
+            "rows": len(batch),
+            "accepted": len(accepted),
+            "rejected": len(rejected),
+            "injected": injected,
+            "dq_ms": (t1 - t0) * 1000,
+            "append_ms": (t2 - t1) * 1000,
+            "loyalty_ms": (t3 - t2) * 1000,
+            "latency_ms": (time.time() - emitted_at) * 1000,
+        }
+        log.append(row)
+        if on_batch is not None:
+            on_batch(row)
+
+    return summarize(pd.DataFrame(log), time.time() - start)
+
+
+def summarize(log, seconds):
+    if len(log) == 0:
+        return {"batches": 0, "rows": 0, "seconds": seconds}
+
+    latency = log["latency_ms"]
+    return {
+        "batches": len(log),
+        "rows": int(log["rows"].sum()),
+        "seconds": seconds,
+        "rows_per_s": log["rows"].sum() / seconds if seconds else 0.0,
+        "accepted": int(log["accepted"].sum()),
+        "rejected": int(log["rejected"].sum()),
+        "injected": int(log["injected"].sum()),
+        "latency_ms": {f"p{q}": float(np.percentile(latency, q)) for q in (50, 95, 99)} | {"max": float(latency.max())},
+        "stage_ms_mean": {c[:-3]: float(log[c].mean()) for c in ["dq_ms", "append_ms", "loyalty_ms"]},
+    }
+
+
+def print_summary(summary):
+    print(f"batches: {summary['batches']}  rows: {summary['rows']:,}  in {summary['seconds']:.1f}s")
+    if not summary["batches"]:
+        return
+    print(f"sustained: {summary['rows_per_s']:,.0f} rows/s")
+    print(f"accepted: {summary['accepted']:,}  rejected: {summary['rejected']:,}  injected: {summary['injected']:,}")
+    print("latency ms: " + "  ".join(f"{k}={v:.1f}" for k, v in summary["latency_ms"].items()))
+    print("mean stage ms: " + "  ".join(f"{k}={v:.1f}" for k, v in summary["stage_ms_mean"].items()))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Push a live transaction feed through DQ + append and report latency")
+    parser.add_argument("--drop-dir", help="consume files from `data_generator.py --feed DIR` (default: in-process feed)")
+    parser.add_argument("--rate", type=float, default=1_000, help="in-process feed: rows per second")
+    parser.add_argument("--batch-size", type=int, default=1_000, help="in-process feed: rows per batch")
+    parser.add_argument("--max-rows", type=int, default=50_000, help="in-process feed: rows to send")
+    parser.add_argument("--violation-rate", type=float, default=0.0, help="in-process feed: fraction of bad rows")
+    parser.add_argument("--idle-timeout", type=float, default=5.0, help="drop dir: stop after this many idle seconds")
+    parser.add_argument("--loyalty-every", type=int, default=1, help="refresh tiers/merged every N batches (0 = off)")
+    args = parser.parse_args()
+
+    if args.drop_dir:
+        source = dir_source(args.drop_dir, args.idle_timeout)
+    else:
+        source = queue_source(args.rate, args.batch_size, args.max_rows, args.violation_rate)
+
+    print_summary(drive(source, args.loyalty_every))
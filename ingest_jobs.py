@@ -0,0 +1,402 @@
+import json
+import os
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+from io_utils import (
+    DATA_DIR,
+    INDEXED_KEYS,
+    load_table,
+    load_key_index,
+    append_table,
+    append_rejections,
+    replace_atomically,
+    data_lock,
+)
+from dq_transactions import dq_transactions
+from bulk_ingest import DQ_FUNCS, REJECTIONS, bulk_ingest
+from stream_ingest import stream_validate_transactions, DEFAULT_CHUNKSIZE
+from loyalty_update import apply_loyalty_after_ingest
+
+# Uploads are queued as jobs under DATA_DIR/jobs/<id>/ (job.json + the
+# uploaded files) and run one at a time by a background worker, so the UI
+# only submits and polls. Jobs survive reruns and restarts.
+JOBS_DIR = os.path.join(DATA_DIR, "jobs")
+
+REJECTED_SAMPLE_ROWS = 50
+
+# While a job runs, its worker touches jobs/<id>/heartbeat every
+# HEARTBEAT_EVERY seconds; after HEARTBEAT_TIMEOUT without one the job is
+# requeued
+HEARTBEAT_EVERY = 5.0
+HEARTBEAT_TIMEOUT = 60.0
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+# =========================
+# Job files
+# =========================
+def _job_dir(job_id):
+    return os.path.join(JOBS_DIR, job_id)
+
+
+def _job_path(job_id):
+    return os.path.join(_job_dir(job_id), "job.json")
+
+
+def _heartbeat_path(job_id):
+    return os.path.join(_job_dir(job_id), "heartbeat")
+
+
+def _beat(job_id):
+    with open(_heartbeat_path(job_id), "a"):
+        os.utime(_heartbeat_path(job_id))
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def save_job(job):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            # numpy scalars from the stats -> plain numbers
+            json.dump(job, f, indent=2, default=lambda o: o.item() if hasattr(o, "item") else str(o))
+    replace_atomically(_job_path(job["id"]), write)
+
+
+def load_job(job_id):
+    with open(_job_path(job_id)) as f:
+        return json.load(f)
+
+
+def list_jobs(limit=None):
+    """Jobs, newest first."""
+    if not os.path.isdir(JOBS_DIR):
+        return []
+    ids = sorted((d for d in os.listdir(JOBS_DIR) if os.path.exists(_job_path(d))), reverse=True)
+    return [load_job(job_id) for job_id in ids[:limit]]
+
+
+def job_stages(kind, table=None, options=None):
+    if kind == "bulk":
+        return ["ingest"]
+    if table != "transactions":
+        return ["validate", "append"]
+    if (options or {}).get("stream"):
+        return ["stream", "loyalty"]
+    return ["validate", "append", "loyalty"]
+
+
+def submit_job(kind, files, table=None, options=None):
+    """
+    Queue an upload. kind "append": one CSV for `table`; kind "bulk": CSVs /
+    zips as for bulk_ingest. files are (name, bytes) pairs. Returns the job id.
+    """
+    job_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}-{uuid.uuid4().hex[:6]}"
+    files_dir = os.path.join(_job_dir(job_id), "files")
+    os.makedirs(files_dir)
+
+    names = []
+    for name, data in files:
+        name = os.path.basename(name)
+        with open(os.path.join(files_dir, name), "wb") as f:
+            f.write(data)
+        names.append(name)
+
+    save_job({
+        "id": job_id,
+        "kind": kind,
+        "table": table,
+        "files": names,
+        "options": options or {},
+        "status": QUEUED,
+        "stages": [{"name": s, "status": QUEUED, "progress": 0.0, "info": {}} for s in job_stages(kind, table, options)],
+        "result": {},
+        "error": None,
+        "pid": None,
+        "worker": None,
+        "submitted_at": _now(),
+        "started_at": None,
+        "finished_at": None,
+    })
+    return job_id
+
+
+def rejected_sample(job_id):
+    path = os.path.join(_job_dir(job_id), "rejected.csv")
+    return pd.read_csv(path) if os.path.exists(path) else pd.DataFrame()
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except OSError:
+        return False
+    return True
+
+
+def _worker_gone(job):
+    # Its process exited, its thread in this process is gone, or it stopped beating
+    if not _pid_alive(job["pid"]):
+        return True
+    worker = job.get("worker")
+    if job["pid"] == os.getpid() and worker is not None and worker not in {t.name for t in threading.enumerate()}:
+        return True
+    try:
+        return time.time() - os.path.getmtime(_heartbeat_path(job["id"])) > HEARTBEAT_TIMEOUT
+    except FileNotFoundError:
+        return False
+
+
+def _requeue_stale(jobs):
+    for job in jobs:
+        if job["status"] == RUNNING and _worker_gone(job):
+            job.update(status=QUEUED, pid=None, worker=None, error="requeued after the worker stopped")
+            save_job(job)
+
+
+def claim_next_job():
+    """
+    Mark the oldest queued job (or one whose worker stopped) as running by
+    the calling thread and return it (None if the queue is empty).
+    """
+    # The data lock makes the claim atomic across worker processes
+    with data_lock():
+        jobs = list_jobs()
+        _requeue_stale(jobs)
+        for job in reversed(jobs):
+            if job["status"] == QUEUED:
+                job.update(status=RUNNING, pid=os.getpid(), worker=threading.current_thread().name,
+                           started_at=_now())
+                _beat(job["id"])
+                save_job(job)
+                return job
+    return None
+
+
+def recover_jobs():
+    """Requeue jobs left running by a worker process or thread that is gone."""
+    with data_lock():
+        _requeue_stale(list_jobs())
+
+
+# =========================
+# Running a job
+# =========================
+class _Progress:
+    def __init__(self, job):
+        self.job = job
+
+    def stage(self, name, status=None, progress=None, **info):
+        for s in self.job["stages"]:
+            if s["name"] == name:
+                if status is not None:
+                    s["status"] = status
+                if progress is not None:
+                    s["progress"] = progress
+                s["info"].update(info)
+        save_job(self.job)
+
+
+def _save_rejected(job, rejected):
+    if len(rejected):
+        rejected.head(REJECTED_SAMPLE_ROWS).to_csv(os.path.join(_job_dir(job["id"]), "rejected.csv"), index=False)
+
+
+def _run_append(job, progress, tables):
+    table = job["table"]
+    path = os.path.join(_job_dir(job["id"]), "files", job["files"][0])
+    append = tables.append_table if tables is not None else append_table
+
+    if table == "transactions" and job["options"].get("stream"):
+        progress.stage("stream", RUNNING)
+
+        def on_chunk(fraction, stats):
+            progress.stage("stream", progress=fraction or 0.0, **stats)
+
+        stats, rejected = stream_validate_transactions(
+            path, int(job["options"].get("chunksize", DEFAULT_CHUNKSIZE)), on_chunk, sample_rejected=REJECTED_SAMPLE_ROWS
+        )
+        progress.stage("stream", DONE, 1.0)
+        _save_rejected(job, rejected)
+        job["result"].update(accepted=stats["accepted"], rejected=stats["rejected"])
+        _run_loyalty(job, progress, tables, None)
+        return
+
+    df_new = pd.read_csv(path)
+    rule_stats = []
+
+    # Validate + append as one step so no other writer can accept the same key
+    with data_lock():
+        progress.stage("validate", RUNNING)
+        if table == "transactions":
+            accepted, rejected = dq_transactions(
+                df_new,
+                load_key_index("transactions", "transaction_id"),
+                load_key_index("customers", "customer_id"),
+                tables.get("stores") if tables is not None else load_table("stores"),
+                load_key_index("products", "product_id"),
+                stats=rule_stats,
+            )
+        else:
+            accepted, rejected = DQ_FUNCS[table](
+                df_new, load_key_index(table, INDEXED_KEYS[table][0]), stats=rule_stats
+            )
+        progress.stage("validate", DONE, 1.0, rows=len(df_new), accepted=len(accepted), rejected=len(rejected))
+
+        progress.stage("append", RUNNING)
+        append(table, accepted)
+        append_rejections(REJECTIONS[table], rejected)
+        progress.stage("append", DONE, 1.0)
+
+    _save_rejected(job, rejected)
+    job["result"].update(accepted=len(accepted), rejected=len(rejected), rule_stats=rule_stats)
+
+    if table == "transactions" and len(accepted):
+        _run_loyalty(job, progress, tables, accepted)
+    elif table == "transactions":
+        progress.stage("loyalty", DONE, 1.0, skipped="no accepted rows")
+
+
+def _run_loyalty(job, progress, tables, accepted):
+    progress.stage("loyalty", RUNNING)
+    with data_lock():
+        if tables is not None:
+            customers, info = apply_loyalty_after_ingest(
+                tables.get("customers"), tables.get("stores"), tables.get("products"), accepted
+            )
+            tables.put("customers", customers)
+        else:
+            _, info = apply_loyalty_after_ingest(
+                load_table("customers"), load_table("stores"), load_table("products"), accepted
+            )
+    progress.stage("loyalty", DONE, 1.0, **info)
+    job["result"]["loyalty"] = info
+
+
+def _run_bulk(job, progress, tables):
+    progress.stage("ingest", RUNNING)
+    files_dir = os.path.join(_job_dir(job["id"]), "files")
+    messages = []
+
+    def on_message(msg):
+        messages.append(msg)
+        progress.stage("ingest", message=msg)
+
+    result = bulk_ingest([os.path.join(files_dir, name) for name in job["files"]], on_progress=on_message)
+    frames = result.pop("frames")
+    progress.stage("ingest", DONE, 1.0)
+
+    rejected = [rej.assign(table=t) for t, (_, rej) in frames.items() if len(rej)]
+    if rejected:
+        _save_rejected(job, pd.concat(rejected, ignore_index=True))
+    job["result"].update(result, log=messages)
+
+
+def run_job(job, tables=None):
+    """Run a claimed job; tables is an optional io_utils.TableCache kept current by the writes."""
+    progress = _Progress(job)
+    worker = threading.current_thread()
+    finished = threading.Event()
+
+    def heartbeat():
+        # Only while the thread running the job is alive
+        while not finished.wait(HEARTBEAT_EVERY) and worker.is_alive():
+            _beat(job["id"])
+
+    threading.Thread(target=heartbeat, name=f"heartbeat-{job['id']}", daemon=True).start()
+    try:
+        if job["kind"] == "bulk":
+            _run_bulk(job, progress, tables)
+        else:
+            _run_append(job, progress, tables)
+        job["status"] = DONE
+    except Exception as e:
+        job["status"] = FAILED
+        job["error"] = f"{type(e).__name__}: {e}"
+        job["traceback"] = traceback.format_exc()
+        for s in job["stages"]:
+            if s["status"] == RUNNING:
+                s["status"] = FAILED
+    finally:
+        finished.set()
+    job["finished_at"] = _now()
+    save_job(job)
+    return job
+
+
+# =========================
+# Worker
+# =========================
+class IngestWorker:
+    """Background thread that runs queued jobs one at a time."""
+
+    def __init__(self, tables=None, poll=1.0):
+        self.tables = tables
+        self.poll = poll
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        recover_jobs()
+        # The thread name is the worker token claimed jobs record
+        self._thread = threading.Thread(target=self._loop, name=f"ingest-worker-{uuid.uuid4().hex[:8]}",
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def is_alive(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            job = claim_next_job()
+            if job is None:
+                self._wake.wait(self.poll)
+                self._wake.clear()
+                continue
+            run_job(job, self.tables)
+
+
+def drain(on_job=None):
+    """Run queued jobs in this process until the queue is empty."""
+    recover_jobs()
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return
+        job = run_job(job)
+        if on_job is not None:
+            on_job(job)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Run queued ingestion jobs outside the Streamlit app")
+    parser.add_argument("--watch", action="store_true", help="keep polling for new jobs")
+    parser.add_argument("--poll", type=float, default=2.0, help="seconds between polls with --watch")
+    args = parser.parse_args()
+
+    def report(job):
+        print(f"{job['id']} {job['kind']}/{job['table'] or '-'} {job['status']} {job['result'] or job['error']}")
+
+    drain(report)
+    while args.watch:
+        time.sleep(args.poll)
+        drain(report)
@@ -0,0 +1,492 @@
+import io
+import json
+import queue
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+import pandas as pd
+
+from io_utils import (
+    INDEXED_KEYS,
+    table_path,
+    load_key_index,
+    save_key_index,
+    append_rejections,
+    data_lock,
+    TableCache,
+)
+from key_index import source_signature
+from bulk_ingest import DIMENSIONS, DQ_FUNCS, REJECTIONS
+from dq_codes import RULES
+from dq_transactions import dq_transactions
+from loyalty_update import apply_loyalty_after_ingest
+
+# Local HTTP ingest: POST /ingest/<table> with a CSV or NDJSON body.
+# Requests for a table are micro-batched (one validation + one append per
+# batch) against key indexes held in memory; GET /metrics reports throughput
+# and latency.
+TABLES = DIMENSIONS + ["transactions"]
+
+DEFAULT_MAX_BATCH_ROWS = 50_000
+DEFAULT_MAX_WAIT_MS = 20
+DEFAULT_MAX_INFLIGHT = 32
+DEFAULT_MAX_BODY_MB = 64
+DEFAULT_LOYALTY_EVERY = 30.0
+
+# Rejected rows listed per response; by_rule always counts all of them
+MAX_REJECTED_ROWS = 1_000
+
+NDJSON_TYPES = ("application/x-ndjson", "application/jsonl", "application/json-lines", "application/json")
+
+
+class RequestError(Exception):
+    """The rows of a request could not be validated (answered with 400)."""
+
+
+# =========================
+# Warm key indexes
+# =========================
+class WarmKeys:
+    """
+    PK indexes held in memory. An index is reloaded only when its table file
+    changed outside this process; our own appends extend it in place.
+    """
+
+    def __init__(self):
+        self._keys = {}
+
+    def get(self, table):
+        sig = source_signature(table_path(table))
+        hit = self._keys.get(table)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+
+        index = load_key_index(table, INDEXED_KEYS[table][0]).in_memory()
+        self._keys[table] = (sig, index)
+        return index
+
+    def extend(self, table, sig_before, values):
+        hit = self._keys.get(table)
+        if hit is None or hit[0] != sig_before:
+            self._keys.pop(table, None)
+            return
+        self._keys[table] = (source_signature(table_path(table)), hit[1].merged_with(values))
+
+
+# =========================
+# Metrics
+# =========================
+class Metrics:
+    def __init__(self, window=10_000):
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._window = window
+
+    def _entry(self, table):
+        return self._tables.setdefault(table, {
+            "requests": 0, "rows": 0, "accepted": 0, "rejected": 0, "batches": 0,
+            "batch_rows": 0, "validate_ms": 0.0, "append_ms": 0.0,
+            "latency_ms": deque(maxlen=self._window), "recent": deque(),
+        })
+
+    def record_batch(self, table, rows, validate_ms, append_ms):
+        with self._lock:
+            m = self._entry(table)
+            m["batches"] += 1
+            m["batch_rows"] += rows
+            m["validate_ms"] += validate_ms
+            m["append_ms"] += append_ms
+
+    def record_request(self, table, rows, accepted, rejected, latency_ms):
+        now = time.time()
+        with self._lock:
+            m = self._entry(table)
+            m["requests"] += 1
+            m["rows"] += rows
+            m["accepted"] += accepted
+            m["rejected"] += rejected
+            m["latency_ms"].append(latency_ms)
+            # (time, rows) over the last minute for the current rate
+            m["recent"].append((now, rows))
+            while m["recent"] and m["recent"][0][0] < now - 60:
+                m["recent"].popleft()
+
+    def snapshot(self, queues=None):
+        now = time.time()
+        out = {"uptime_s": now - self.started, "tables": {}}
+        with self._lock:
+            for table, m in self._tables.items():
+                lat = np.asarray(m["latency_ms"], dtype=float)
+                recent = [r for t, r in m["recent"] if t >= now - 60]
+                out["tables"][table] = {
+                    "requests": m["requests"],
+                    "rows": m["rows"],
+                    "accepted": m["accepted"],
+                    "rejected": m["rejected"],
+                    "batches": m["batches"],
+                    "mean_batch_rows": m["batch_rows"] / m["batches"] if m["batches"] else 0.0,
+                    "rows_per_s_total": m["rows"] / (now - self.started),
+                    "rows_per_s_last_60s": sum(recent) / min(60.0, now - self.started),
+                    "latency_ms": {
+                        f"p{q}": float(np.percentile(lat, q)) if len(lat) else None for q in (50, 95, 99)
+                    } | {"max": float(lat.max()) if len(lat) else None},
+                    "mean_validate_ms": m["validate_ms"] / m["batches"] if m["batches"] else 0.0,
+                    "mean_append_ms": m["append_ms"] / m["batches"] if m["batches"] else 0.0,
+                }
+        if queues is not None:
+            out["queued_requests"] = {t: q.qsize() for t, q in queues.items()}
+        return out
+
+
+# =========================
+# Validation
+# =========================
+def _rule_names(table, code):
+    return [name for i, (name, _) in enumerate(RULES[table]) if code & (1 << i)]
+
+
+def rejection_summary(table, codes):
+    """by_rule counts and the first MAX_REJECTED_ROWS {"row", "rejection_code", "rules"}."""
+    by_rule = {name: int(((codes & (1 << i)) != 0).sum()) for i, (name, _) in enumerate(RULES[table])}
+    rows = np.flatnonzero(codes)
+    names = {int(c): _rule_names(table, int(c)) for c in np.unique(codes[rows])}
+    return {
+        "by_rule": {k: v for k, v in by_rule.items() if v},
+        "rejected_rows": [
+            {"row": int(r), "rejection_code": int(codes[r]), "rules": names[int(codes[r])]}
+            for r in rows[:MAX_REJECTED_ROWS]
+        ],
+    }
+
+
+class IngestService:
+    """Micro-batching validator/appender, one batcher thread per table."""
+
+    def __init__(self, max_batch_rows=DEFAULT_MAX_BATCH_ROWS, max_wait_ms=DEFAULT_MAX_WAIT_MS,
+                 loyalty_every=DEFAULT_LOYALTY_EVERY):
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.loyalty_every = loyalty_every
+        self.keys = WarmKeys()
+        self.tables = TableCache()
+        self.metrics = Metrics()
+        self.queues = {t: queue.Queue() for t in TABLES}
+        self._pending_tx = []
+        self._pending_lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def start(self):
+        # Load the indexes before the first request arrives
+        with data_lock():
+            for t in TABLES:
+                self.keys.get(t)
+            self.tables.get("stores")
+
+        for t in TABLES:
+            threading.Thread(target=self._batcher, args=(t,), name=f"batch-{t}", daemon=True).start()
+        if self.loyalty_every:
+            threading.Thread(target=self._loyalty_loop, name="loyalty", daemon=True).start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._flush_loyalty()
+
+    def submit(self, table, df, timeout=60.0):
+        """
+        Queue a parsed request and wait for its batch; returns the
+        rejection_code per row. A request still queued after timeout is
+        cancelled (never written) and TimeoutError is raised; one whose batch
+        already started is waited for.
+        """
+        item = {"df": df, "done": threading.Event(), "codes": None, "error": None, "state": "queued"}
+        self.queues[table].put(item)
+        if not item["done"].wait(timeout):
+            with self._claim_lock:
+                if item["state"] == "queued":
+                    item["state"] = "cancelled"
+                    raise TimeoutError("batch not processed in time; no rows were written")
+            item["done"].wait()
+        if item["error"] is not None:
+            raise item["error"]
+        return item["codes"]
+
+    def validate(self, table, df_new):
+        """
+        Run the table's dq_* function against the warm indexes (caller holds
+        the lock). Errors raised on the rows themselves become RequestError.
+        """
+        if table == "transactions":
+            refs = (
+                self.keys.get("transactions"),
+                self.keys.get("customers"),
+                self.tables.get("stores"),
+                self.keys.get("products"),
+            )
+            func = dq_transactions
+        else:
+            refs = (self.keys.get(table),)
+            func = DQ_FUNCS[table]
+        try:
+            return func(df_new, *refs)
+        except Exception as e:
+            raise RequestError(f"could not validate rows: {type(e).__name__}: {e}") from e
+
+    def _collect(self, table):
+        q = self.queues[table]
+        items = [q.get()]
+        rows = len(items[0]["df"])
+        deadline = time.monotonic() + self.max_wait
+        while rows < self.max_batch_rows:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = q.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            rows += len(item["df"])
+        return items
+
+    def _batcher(self, table):
+        while not self._stop.is_set():
+            self._run(table, self._collect(table))
+
+    def _run(self, table, items):
+        try:
+            self._process(table, items)
+        except Exception as e:
+            for item in items:
+                item["error"] = e
+                item["done"].set()
+
+    def _claim(self, items):
+        # Requests their client gave up on are dropped; the rest can no
+        # longer be cancelled
+        with self._claim_lock:
+            items = [item for item in items if item["state"] != "cancelled"]
+            for item in items:
+                item["state"] = "running"
+        return items
+
+    def _process(self, table, items):
+        pk = INDEXED_KEYS[table][0]
+
+        with data_lock():
+            items = self._claim(items)
+            if not items:
+                return
+            # One frame per batch; request i owns rows offsets[i]:offsets[i+1]
+            batch = pd.concat([item["df"] for item in items], ignore_index=True)
+            offsets = np.cumsum([0] + [len(item["df"]) for item in items])
+
+            t0 = time.perf_counter()
+            try:
+                accepted, rejected = self.validate(table, batch)
+            except RequestError:
+                if len(items) == 1:
+                    raise
+                # Nothing is written yet: run each request on its own so
+                # only the one the validators choke on fails
+                for item in items:
+                    self._run(table, [item])
+                return
+            t1 = time.perf_counter()
+
+            sig_before = source_signature(table_path(table))
+            if len(accepted):
+                # The warm index is extended and saved here instead of
+                # append_table re-reading the one on disk
+                self.tables.append_table(table, accepted, update_indexes=False)
+                self.keys.extend(table, sig_before, accepted[pk])
+                save_key_index(table, pk, self.keys.get(table))
+            append_rejections(REJECTIONS[table], rejected)
+            t2 = time.perf_counter()
+
+        self.metrics.record_batch(table, len(batch), (t1 - t0) * 1000, (t2 - t1) * 1000)
+
+        if table == "transactions" and len(accepted):
+            with self._pending_lock:
+                self._pending_tx.append(accepted)
+
+        codes = np.zeros(len(batch), dtype=np.int64)
+        codes[rejected.index.to_numpy()] = rejected["rejection_code"].to_numpy()
+        for i, item in enumerate(items):
+            item["codes"] = codes[offsets[i]:offsets[i + 1]]
+            item["done"].set()
+
+    # Loyalty tiers / merged table follow the accepted transactions in the
+    # background, not per request
+    def _flush_loyalty(self):
+        with self._pending_lock:
+            pending, self._pending_tx = self._pending_tx, []
+        if not pending:
+            return
+        with data_lock():
+            customers, _ = apply_loyalty_after_ingest(
+                self.tables.get("customers"), self.tables.get("stores"), self.tables.get("products"),
+                pd.concat(pending, ignore_index=True),
+            )
+            self.tables.put("customers", customers)
+
+    def _loyalty_loop(self):
+        while not self._stop.wait(self.loyalty_every):
+            self._flush_loyalty()
+
+
+# =========================
+# HTTP
+# =========================
+def parse_body(body, content_type):
+    if content_type.split(";")[0].strip().lower() in NDJSON_TYPES:
+        return pd.read_json(io.BytesIO(body), lines=True, dtype=False)
+    return pd.read_csv(io.BytesIO(body))
+
+
+def make_handler(service, max_inflight=DEFAULT_MAX_INFLIGHT, max_body_mb=DEFAULT_MAX_BODY_MB):
+    inflight = threading.BoundedSemaphore(max_inflight)
+    max_body = int(max_body_mb * 1024 ** 2)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status, payload, headers=None):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            # send_header("Connection", "close") also sets close_connection
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path = urlparse(self.path).path
+            if path == "/health":
+                self._send(200, {"status": "ok"})
+            elif path == "/metrics":
+                self._send(200, service.metrics.snapshot(service.queues))
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            t0 = time.perf_counter()
+            url = urlparse(self.path)
+            parts = url.path.strip("/").split("/")
+            # Early replies leave the body unread: close the connection so
+            # keep-alive does not parse it as the next request
+            if len(parts) != 2 or parts[0] != "ingest" or parts[1] not in TABLES:
+                self._send(404, {"error": f"use POST /ingest/<{'|'.join(TABLES)}>"}, {"Connection": "close"})
+                return
+            table = parts[1]
+
+            length = (self.headers.get("Content-Length") or "0").strip()
+            if not length.isdigit():
+                self._send(400, {"error": "bad Content-Length"}, {"Connection": "close"})
+                return
+            length = int(length)
+            if length > max_body:
+                self._send(413, {"error": f"body over {max_body_mb} MB"}, {"Connection": "close"})
+                return
+            body = self.rfile.read(length)
+
+            # Bounded concurrency: shed load instead of queueing without limit
+            if not inflight.acquire(blocking=False):
+                self._send(503, {"error": "too many requests in flight"}, {"Retry-After": "1"})
+                return
+            try:
+                try:
+                    df = parse_body(body, self.headers.get("Content-Type", "text/csv"))
+                except ValueError as e:
+                    self._send(400, {"error": f"could not parse body: {e}"})
+                    return
+                if len(df) == 0:
+                    self._send(400, {"error": "no rows"})
+                    return
+
+                dry_run = parse_qs(url.query).get("dry_run", ["0"])[0] in ("1", "true")
+                if dry_run:
+                    # Exclusive: a stale index is rebuilt and saved on the way
+                    with data_lock():
+                        _, rejected = service.validate(table, df)
+                    codes = np.zeros(len(df), dtype=np.int64)
+                    codes[rejected.index.to_numpy()] = rejected["rejection_code"].to_numpy()
+                else:
+                    codes = service.submit(table, df)
+            except RequestError as e:
+                self._send(400, {"error": str(e)})
+                return
+            except TimeoutError as e:
+                self._send(504, {"error": str(e)})
+                return
+            except Exception as e:
+                self._send(500, {"error": f"{type(e).__name__}: {e}"})
+                return
+            finally:
+                inflight.release()
+
+            rejected_n = int((codes != 0).sum())
+            latency_ms = (time.perf_counter() - t0) * 1000
+            if not dry_run:
+                service.metrics.record_request(table, len(df), len(df) - rejected_n, rejected_n, latency_ms)
+
+            self._send(200, {
+                "table": table,
+                "rows": len(df),
+                "accepted": len(df) - rejected_n,
+                "rejected": rejected_n,
+                "dry_run": dry_run,
+                **rejection_summary(table, codes),
+                "latency_ms": latency_ms,
+            })
+
+    return Handler
+
+
+def serve(host="127.0.0.1", port=8765, max_inflight=DEFAULT_MAX_INFLIGHT, max_body_mb=DEFAULT_MAX_BODY_MB, **kwargs):
+    service = IngestService(**kwargs).start()
+    server = ThreadingHTTPServer((host, port), make_handler(service, max_inflight, max_body_mb))
+    server.daemon_threads = True
+    return service, server
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="HTTP batch ingest for the retail tables (localhost)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--max-batch-rows", type=int, default=DEFAULT_MAX_BATCH_ROWS,
+                        help="rows validated/appended together per table")
+    parser.add_argument("--max-wait-ms", type=float, default=DEFAULT_MAX_WAIT_MS,
+                        help="how long a batch waits for more requests")
+    parser.add_argument("--max-inflight", type=int, default=DEFAULT_MAX_INFLIGHT,
+                        help="requests processed at once; more get 503")
+    parser.add_argument("--max-body-mb", type=float, default=DEFAULT_MAX_BODY_MB)
+    parser.add_argument("--loyalty-every", type=float, default=DEFAULT_LOYALTY_EVERY,
+                        help="seconds between loyalty/merged updates for accepted transactions (0 = off)")
+    args = parser.parse_args()
+
+    service, server = serve(
+        args.host, args.port, args.max_inflight, args.max_body_mb,
+        max_batch_rows=args.max_batch_rows, max_wait_ms=args.max_wait_ms, loyalty_every=args.loyalty_every,
+    )
+    print(f"Listening on http://{args.host}:{args.port} (POST /ingest/<table>, GET /metrics)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.stop()
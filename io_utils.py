@@ -1,7 +1,24 @@
+import io
+import json
 import os
+import shutil
+import threading
+import time
+import numpy as np
 import pandas as pd
+from contextlib import contextmanager
 from datetime import datetime
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from schema import SCHEMA, CATEGORICAL_COLUMNS
+from key_index import KeyIndex, save_index, load_index, source_signature
+from spend_agg import FEATURE_COLUMNS, CUBE_KEYS, CUBE_MEASURES, spend_cube, add_to_cube
+
 DATA_DIR = "synthetic_retail"
 
 CUSTOMERS_CSV = os.path.join(DATA_DIR, "customers.csv")
@@ -9,34 +26,168 @@ STORES_CSV = os.path.join(DATA_DIR, "stores.csv")
 PRODUCTS_CSV = os.path.join(DATA_DIR, "products.csv")
 TRANSACTIONS_CSV = os.path.join(DATA_DIR, "transactions.csv")
 MERGED_CSV = os.path.join(DATA_DIR, "merged_transactions.csv")
+SPEND_CUBE_CSV = os.path.join(DATA_DIR, "spend_cube.csv")
+SPEND_FEATURES_CSV = os.path.join(DATA_DIR, "spend_features.csv")
 
 REJ_CUSTOMERS_CSV = os.path.join(DATA_DIR, "rejected_customers.csv")
 REJ_STORES_CSV = os.path.join(DATA_DIR, "rejected_stores.csv")
 REJ_PRODUCTS_CSV = os.path.join(DATA_DIR, "rejected_products.csv")
 REJ_TRANSACTIONS_CSV = os.path.join(DATA_DIR, "rejected_transactions.csv")
 
+LOCK_PATH = os.path.join(DATA_DIR, ".write.lock")
+
+# =========================
+# Storage backend
+# =========================
+# "csv" (default) or "parquet". Parquet keeps transactions partitioned by
+# year_month and each dimension table as a single file.
+STORAGE_FORMAT = os.environ.get("RETAIL_STORAGE_FORMAT", "csv").lower()
+
+# pandas CSV parser: "c" (default) or "pyarrow" (multi-threaded)
+CSV_ENGINE = os.environ.get("RETAIL_CSV_ENGINE", "c").lower()
+
+TABLE_CSV = {
+    "customers": CUSTOMERS_CSV,
+    "stores": STORES_CSV,
+    "products": PRODUCTS_CSV,
+    "transactions": TRANSACTIONS_CSV,
+    "merged_transactions": MERGED_CSV,
+    "spend_cube": SPEND_CUBE_CSV,
+    "spend_features": SPEND_FEATURES_CSV,
+}
+
+TABLE_PARQUET = {
+    name: os.path.join(DATA_DIR, f"{name}.parquet") for name in TABLE_CSV
+}
+
+PARTITION_COL = "year_month"
+PARTITIONED_TABLES = {"transactions", "merged_transactions"}
+
+MERGED_COLUMNS = [
+    "product_id", "category", "unit_price", "is_discountable",
+    "store_id", "store_type", "region", "city",
+    "customer_id", "gender", "age", "loyalty_tier", "preferred_channel",
+    "transaction_id", "transaction_date", "channel",
+    "quantity", "discount_pct"
+]
+
 
 def ensure_dir():
     os.makedirs(DATA_DIR, exist_ok=True)
 
 
-def load_or_empty(path, columns):
-    if os.path.exists(path):
-        return pd.read_csv(path)
-    return pd.DataFrame(columns=columns)
+# =========================
+# Write coordination
+# =========================
+# One lock file guards DATA_DIR across processes and Streamlit sessions.
+# Writers hold it exclusively, readers shared. Full rewrites go to a temp
+# path and are swapped in with os.replace, so a reader sees either the old
+# or the new file, never a half-written one.
+_held = threading.local()
 
 
-def append_rows(path, df_new: pd.DataFrame):
-    if df_new is None or len(df_new) == 0:
+def _acquire(f, shared, blocking=True):
+    # Raises BlockingIOError when blocking=False and another holder has it
+    if fcntl is not None:
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        fcntl.flock(f.fileno(), flags if blocking else flags | fcntl.LOCK_NB)
         return
+    # msvcrt only has exclusive byte-range locks
+    while True:
+        try:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            return
+        except OSError:
+            if not blocking:
+                raise BlockingIOError("data lock is held")
+            time.sleep(0.05)
+
 
-    if os.path.exists(path):
-        df_old = pd.read_csv(path)
-        df_out = pd.concat([df_old, df_new], ignore_index=True)
+def _release(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
     else:
-        df_out = df_new.copy()
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def data_lock(shared=False, blocking=True):
+    """
+    Hold the DATA_DIR lock. Re-entrant within a thread, so a multi-step
+    ingest can wrap several writes in one exclusive section. With
+    blocking=False, BlockingIOError is raised instead of waiting.
+    """
+    mode = getattr(_held, "mode", None)
+    if mode is not None:
+        if mode == "shared" and not shared:
+            raise RuntimeError("cannot upgrade a shared data lock to exclusive")
+        _held.depth += 1
+        try:
+            yield
+        finally:
+            _held.depth -= 1
+        return
+
+    ensure_dir()
+    f = open(LOCK_PATH, "a+")
+    try:
+        _acquire(f, shared, blocking)
+        _held.mode, _held.depth = ("shared" if shared else "exclusive"), 1
+        try:
+            yield
+        finally:
+            _held.mode, _held.depth = None, 0
+            _release(f)
+    finally:
+        f.close()
+
+
+def _tmp_path(path):
+    return f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+
+
+def replace_atomically(path, write):
+    """write(tmp_path) then swap it in place of path (file or directory)."""
+    tmp = _tmp_path(path)
+    write(tmp)
+
+    if os.path.isdir(path):
+        old = tmp + ".old"
+        os.replace(path, old)
+        os.replace(tmp, path)
+        shutil.rmtree(old)
+    else:
+        os.replace(tmp, path)
+
+
+def _append_csv(path, df_new: pd.DataFrame):
+    # New file: write header + rows
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        df_new.to_csv(path, index=False)
+        return
+
+    header = pd.read_csv(path, nrows=0).columns.tolist()
+
+    # Batch brings columns the file doesn't have yet: widen the file once
+    extra = [c for c in df_new.columns if c not in header]
+    if extra:
+        df_out = pd.concat([pd.read_csv(path), df_new], ignore_index=True)
+        replace_atomically(path, lambda tmp: df_out.to_csv(tmp, index=False))
+        return
 
-    df_out.to_csv(path, index=False)
+    # Align to the existing column order (missing columns written empty)
+    df_new = df_new.reindex(columns=header)
+
+    with open(path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        needs_newline = f.read(1) not in (b"\n", b"\r")
+
+    with open(path, "a", newline="", encoding="utf-8") as f:
+        if needs_newline:
+            f.write("\n")
+        df_new.to_csv(f, header=False, index=False)
 
 
 def append_rejections(path, df_rej: pd.DataFrame):
@@ -46,16 +197,710 @@ def append_rejections(path, df_rej: pd.DataFrame):
     df_rej = df_rej.copy()
     df_rej["rejected_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-    if os.path.exists(path):
-        old = pd.read_csv(path)
-        out = pd.concat([old, df_rej], ignore_index=True)
+    with data_lock():
+        _append_csv(path, df_rej)
+
+
+# =========================
+# Table readers / writers
+# =========================
+def table_columns(name):
+    if name == "merged_transactions":
+        return list(MERGED_COLUMNS)
+    if name == "spend_features":
+        return list(FEATURE_COLUMNS)
+    if name in DERIVED_TABLES:
+        return list(DERIVED_TABLES[name]["columns"])
+    return list(SCHEMA[f"{name}.csv"]["columns"])
+
+
+def column_types(name):
+    types = {}
+    for meta in SCHEMA.values():
+        types.update(meta["columns"])
+    if name in DERIVED_TABLES:
+        types.update(DERIVED_TABLES[name]["columns"])
+    return {c: types[c] for c in table_columns(name) if c in types}
+
+
+def _csv_read_args(name, columns=None):
+    # Explicit dtypes from SCHEMA; dates parsed in the same pass
+    dtype, parse_dates = {}, []
+    for col, kind in column_types(name).items():
+        if columns is not None and col not in columns:
+            continue
+        if kind == "date":
+            parse_dates.append(col)
+        elif col in CATEGORICAL_COLUMNS:
+            dtype[col] = "category"
+        elif kind == "string":
+            dtype[col] = "string"
+        elif kind == "int":
+            dtype[col] = "Int32"
+        elif kind == "float":
+            dtype[col] = "float64"
+    return dtype, parse_dates
+
+
+def read_csv_typed(name, path=None, columns=None, engine=None):
+    """Read a table CSV with SCHEMA-driven dtypes and categoricals."""
+    path = path or TABLE_CSV[name]
+    engine = engine or CSV_ENGINE
+
+    header = pd.read_csv(path, nrows=0).columns
+    if columns is not None:
+        header = [c for c in header if c in columns]
+    dtype, parse_dates = _csv_read_args(name, list(header))
+
+    return pd.read_csv(
+        path,
+        usecols=columns,
+        dtype=dtype,
+        parse_dates=parse_dates,
+        date_format="ISO8601",
+        engine=engine,
+    )
+
+
+def memory_report(tables: dict):
+    """Rows and in-memory size (MB) per loaded table."""
+    rows = []
+    for name, df in tables.items():
+        rows.append({
+            "table": name,
+            "rows": len(df),
+            "memory_mb": round(df.memory_usage(deep=True).sum() / 1024 ** 2, 2),
+        })
+    return pd.DataFrame(rows)
+
+
+def table_path(name, fmt=None):
+    fmt = fmt or STORAGE_FORMAT
+    return TABLE_PARQUET[name] if fmt == "parquet" else TABLE_CSV[name]
+
+
+def table_exists(name, fmt=None):
+    return os.path.exists(table_path(name, fmt))
+
+
+def _to_parquet_types(name, df: pd.DataFrame):
+    # Fixed per-column types so every partition file shares one schema
+    df = df.copy()
+    for col, dtype in column_types(name).items():
+        if col not in df.columns:
+            continue
+        if dtype == "string":
+            df[col] = df[col].astype("string")
+        elif dtype == "int":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+        elif dtype == "float":
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+        elif dtype == "date":
+            df[col] = pd.to_datetime(df[col], errors="coerce")
+
+    if name in PARTITIONED_TABLES:
+        if PARTITION_COL not in df.columns:
+            df[PARTITION_COL] = pd.to_datetime(df["transaction_date"], errors="coerce").dt.strftime("%Y-%m")
+        df[PARTITION_COL] = df[PARTITION_COL].astype("string").fillna("unknown")
+    return df
+
+
+def _write_parquet(name, df: pd.DataFrame, path):
+    df = _to_parquet_types(name, df)
+    if name in PARTITIONED_TABLES:
+        # One new file per partition; existing files are left untouched
+        df.to_parquet(path, partition_cols=[PARTITION_COL], index=False)
     else:
-        out = df_rej
+        df.to_parquet(path, index=False)
 
-    out.to_csv(path, index=False)
 
+def read_table(name, columns=None, year_months=None):
+    """
+    Read a table from the active storage backend.
+    year_months prunes partitions (parquet) or filters rows (csv).
+    """
+    with data_lock(shared=True):
+        if name == "merged_transactions":
+            return _read_merged(columns, year_months)
+        return _read_table(name, columns, year_months)
 
-def rebuild_merged(customers, stores, products, transactions):
+
+def _read_table(name, columns, year_months):
+    path = table_path(name)
+
+    if STORAGE_FORMAT == "parquet":
+        filters = None
+        if year_months is not None and name in PARTITIONED_TABLES:
+            filters = [(PARTITION_COL, "in", list(year_months))]
+        df = pd.read_parquet(path, columns=columns, filters=filters)
+        if PARTITION_COL in df.columns:
+            df[PARTITION_COL] = df[PARTITION_COL].astype(str)
+        if name == "merged_transactions" and columns is None:
+            df = df[[c for c in MERGED_COLUMNS if c in df.columns]]
+        return df
+
+    df = read_csv_typed(name, path, columns=columns)
+    if year_months is not None and name in PARTITIONED_TABLES:
+        months = pd.to_datetime(df["transaction_date"], errors="coerce").dt.strftime("%Y-%m")
+        df = df.loc[months.isin(list(year_months))].reset_index(drop=True)
+    return df
+
+
+def load_table(name):
+    if table_exists(name):
+        return read_table(name)
+    return pd.DataFrame(columns=table_columns(name))
+
+
+def write_table(name, df: pd.DataFrame):
+    path = table_path(name)
+
+    with data_lock():
+        if STORAGE_FORMAT == "parquet":
+            replace_atomically(path, lambda tmp: _write_parquet(name, df, tmp))
+        else:
+            replace_atomically(path, lambda tmp: df.to_csv(tmp, index=False))
+
+        for col in INDEXED_KEYS.get(name, []):
+            save_index(KeyIndex.from_values(df[col]), key_index_path(name, col), path)
+        _save_row_count(name, len(df))
+
+        # A full rewrite carries the current customer attributes
+        if name == "merged_transactions":
+            _drop_merged_overrides()
+
+
+def append_table(name, df_new: pd.DataFrame, update_indexes=True):
+    """
+    Append rows to a table. With update_indexes=False the key indexes go
+    stale; callers appending many batches save them once via save_key_index.
+    """
+    if df_new is None or len(df_new) == 0:
+        return
+
+    path = table_path(name)
+
+    with data_lock():
+        # Only extend indexes that were in sync with the table before this write
+        indexes = {}
+        if update_indexes:
+            indexes = {col: load_index(key_index_path(name, col), path) for col in INDEXED_KEYS.get(name, [])}
+
+        rows_before = _saved_row_count(name)
+
+        # Same for aggregates derived from this table
+        derived = [d for d, meta in DERIVED_TABLES.items() if meta["sources"][0] == name and derived_is_fresh(d)]
+
+        if STORAGE_FORMAT == "parquet":
+            if name in PARTITIONED_TABLES or not os.path.exists(path):
+                # New partition files only; readers never see them half-written
+                # because reads take the shared lock
+                _write_parquet(name, df_new, path)
+            else:
+                # Dimension tables are small single files
+                df_out = pd.concat([pd.read_parquet(path), df_new], ignore_index=True)
+                replace_atomically(path, lambda tmp: _write_parquet(name, df_out, tmp))
+        else:
+            _append_csv(path, df_new)
+
+        for col, index in indexes.items():
+            if index is not None:
+                save_index(index.merged_with(df_new[col]), key_index_path(name, col), path)
+
+        for d in derived:
+            _append_delta(d, DERIVED_TABLES[d]["delta"](df_new))
+
+        if rows_before is not None:
+            _save_row_count(name, rows_before + len(df_new))
+
+
+# =========================
+# Row counts and tail reads
+# =========================
+# Row counts are kept in <table path>.rows.json, tagged with the table's
+# signature like the key indexes; writers update them, anything else makes
+# the next reader count once. Tails are read from the end of the file, so
+# neither depends on the table size.
+def _row_count_path(name):
+    return table_path(name) + ".rows.json"
+
+
+def _saved_row_count(name):
+    path = _row_count_path(name)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        meta = json.load(f)
+    if meta.get("source") != source_signature(table_path(name)):
+        return None
+    return meta["rows"]
+
+
+def _save_row_count(name, rows):
+    meta = {"source": source_signature(table_path(name)), "rows": int(rows)}
+
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(meta, f)
+    replace_atomically(_row_count_path(name), write)
+
+
+def _parquet_files(path):
+    # Oldest first: appends add new files, so the newest rows are at the end
+    if not os.path.isdir(path):
+        return [path]
+    files = [
+        os.path.join(root, f) for root, _, names in os.walk(path)
+        for f in names if f.endswith(".parquet")
+    ]
+    return sorted(files, key=lambda f: (os.stat(f).st_mtime_ns, f))
+
+
+def _count_rows(name):
+    path = table_path(name)
+    if STORAGE_FORMAT == "parquet":
+        import pyarrow.parquet as pq
+        return sum(pq.ParquetFile(f).metadata.num_rows for f in _parquet_files(path))
+
+    lines, last = 0, b"\n"
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            lines += block.count(b"\n")
+            last = block[-1:]
+    if last != b"\n":
+        lines += 1
+    return max(lines - 1, 0)
+
+
+def table_row_count(name):
+    """Rows in a table, from the saved count when the table is unchanged."""
+    if not table_exists(name):
+        return 0
+    rows = _saved_row_count(name)
+    if rows is not None:
+        return rows
+
+    with data_lock(shared=True):
+        rows = _count_rows(name)
+        _save_row_count(name, rows)
+    return rows
+
+
+def _tail_csv(name, path, n, block_size=1 << 16):
+    with open(path, "rb") as f:
+        header = f.readline()
+        start = f.tell()
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+
+        # Step back until more than n line breaks are in view
+        data = b""
+        while pos > start and data.count(b"\n") <= n:
+            step = min(block_size, pos - start)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+
+    lines = [line for line in data.splitlines() if line.strip()]
+    body = b"\n".join(lines[-n:]) if n else b""
+
+    columns = header.decode("utf-8").strip().split(",")
+    dtype, parse_dates = _csv_read_args(name, columns)
+    return pd.read_csv(
+        io.BytesIO(header + body + b"\n"),
+        dtype=dtype,
+        parse_dates=parse_dates,
+        date_format="ISO8601",
+    )
+
+
+def _tail_parquet(name, path, n):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    pieces, rows = [], 0
+    for f in reversed(_parquet_files(path)):
+        pf = pq.ParquetFile(f)
+        for i in reversed(range(pf.num_row_groups)):
+            t = pf.read_row_group(i)
+            # Partition value lives in the directory name
+            part = os.path.basename(os.path.dirname(f))
+            if part.startswith(f"{PARTITION_COL}="):
+                t = t.append_column(PARTITION_COL, pa.array([part.split("=", 1)[1]] * t.num_rows))
+            pieces.append(t.to_pandas())
+            rows += t.num_rows
+            if rows >= n:
+                break
+        if rows >= n:
+            break
+
+    if not pieces:
+        return pd.DataFrame(columns=table_columns(name))
+    df = pd.concat(pieces[::-1], ignore_index=True).tail(n).reset_index(drop=True)
+    if name == "merged_transactions":
+        df = df[[c for c in MERGED_COLUMNS if c in df.columns]]
+    return df
+
+
+def read_tail(name, n=30):
+    """The last n rows of a table (the most recently appended ones)."""
+    if not table_exists(name):
+        return pd.DataFrame(columns=table_columns(name))
+
+    with data_lock(shared=True):
+        if STORAGE_FORMAT == "parquet":
+            df = _tail_parquet(name, table_path(name), n)
+        else:
+            df = _tail_csv(name, table_path(name), n)
+        return _apply_overrides(df, merged_overrides()) if name == "merged_transactions" else df
+
+
+# =========================
+# In-memory table cache
+# =========================
+def _cast_like(df: pd.DataFrame, df_new: pd.DataFrame):
+    # New rows in the dtypes of the loaded table (categoricals are unioned
+    # on concat); None if a column does not convert
+    new = df_new.reindex(columns=df.columns).reset_index(drop=True)
+    try:
+        for col in df.columns:
+            dtype = df[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                continue
+            if pd.api.types.is_datetime64_any_dtype(dtype):
+                new[col] = pd.to_datetime(new[col], errors="coerce").astype(dtype)
+            elif pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype):
+                new[col] = pd.to_numeric(new[col], errors="coerce").astype(dtype)
+            else:
+                new[col] = new[col].astype(dtype)
+    except (TypeError, ValueError):
+        return None
+    return new
+
+
+def _concat_like(df: pd.DataFrame, new: pd.DataFrame):
+    out = pd.concat([df, new], ignore_index=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            out[col] = pd.api.types.union_categoricals(
+                [df[col].astype("category"), new[col].astype("category")], ignore_order=True
+            )
+    return out
+
+
+class TableCache:
+    """
+    Process-wide store of loaded tables, shared by every caller (e.g. all
+    Streamlit sessions). Each table is held as one immutable snapshot with a
+    version number; readers get it without copying and writers publish a new
+    version by swapping the entry, so memory does not grow with the number
+    of sessions. A snapshot is reused while its file's size + mtime are
+    unchanged; writes made through the store extend it in memory instead of
+    re-reading the file.
+    """
+
+    def __init__(self):
+        self._tables = {}
+        self._versions = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _current(self, name):
+        with self._lock:
+            hit = self._tables.get(name)
+        if hit is not None and hit[0] == table_signature(name):
+            return hit
+        return None
+
+    def _publish(self, name, sig, df):
+        with self._lock:
+            version = self._versions.get(name, 0) + 1
+            self._versions[name] = version
+            self._tables[name] = (sig, df, version)
+
+    def snapshot(self, name, stale_ok=False):
+        """
+        (version, frame) for the table as on disk. The frame is a shallow
+        copy sharing the stored data: adding or dropping its columns never
+        affects other readers, and with pandas copy-on-write (the default
+        from pandas 3) neither does writing to it; on older pandas do not
+        modify values in place. With stale_ok, a table that changed while a
+        writer still holds the data lock is served from the old snapshot
+        instead of waiting (for display only).
+        """
+        hit = self._current(name) or self._load(name, stale_ok)
+        return hit[2], hit[1].copy(deep=False)
+
+    def _load(self, name, stale_ok):
+        with self._lock:
+            hit = self._tables.get(name)
+            loading = self._loading.setdefault(name, threading.Lock())
+        # Derived aggregates may be rebuilt on load, which needs the exclusive lock
+        derived = name in DERIVED_TABLES
+        try:
+            # data_lock first, then the per-table loading lock: writers call
+            # get() while holding data_lock, so the opposite order deadlocks
+            with data_lock(shared=not derived, blocking=not (stale_ok and hit is not None)):
+                with loading:
+                    # One loader per table; callers that waited reuse its result
+                    current = self._current(name)
+                    if current is not None:
+                        return current
+                    df = load_derived(name) if derived else load_table(name)
+                    self._publish(name, table_signature(name), df)
+        except BlockingIOError:
+            return hit
+        with self._lock:
+            return self._tables[name]
+
+    def get(self, name, stale_ok=False):
+        return self.snapshot(name, stale_ok)[1]
+
+    def put(self, name, df: pd.DataFrame):
+        """Publish df as the current content of a table we just wrote (hold data_lock)."""
+        self._publish(name, table_signature(name), df)
+
+    def drop(self, name):
+        with self._lock:
+            self._tables.pop(name, None)
+
+    def append_table(self, name, df_new: pd.DataFrame, update_indexes=True):
+        """append_table, then extend the snapshot if it was current before the write."""
+        if df_new is None or len(df_new) == 0:
+            return
+
+        with data_lock():
+            before = table_signature(name)
+            append_table(name, df_new, update_indexes)
+
+            with self._lock:
+                hit = self._tables.get(name)
+            new = _cast_like(hit[1], df_new) if hit is not None and hit[0] == before else None
+            if new is None:
+                self.drop(name)
+            else:
+                # A new frame: readers of the previous version keep theirs
+                self.put(name, _concat_like(hit[1], new))
+
+    def write_table(self, name, df: pd.DataFrame):
+        with data_lock():
+            write_table(name, df)
+            self.put(name, df)
+
+
+# =========================
+# Key indexes
+# =========================
+# PK columns get a persisted sorted index next to the table
+INDEXED_KEYS = {
+    name.replace(".csv", ""): meta["pk"] for name, meta in SCHEMA.items()
+}
+
+
+def key_index_path(name, column, fmt=None):
+    fmt = fmt or STORAGE_FORMAT
+    return os.path.join(DATA_DIR, f"{name}.{fmt}.{column}.idx.npy")
+
+
+def load_key_index(name, column):
+    """
+    Memory-mapped key index for a table column.
+    Rebuilt from the table when missing or out of date.
+    """
+    path = table_path(name)
+    index_path = key_index_path(name, column)
+
+    with data_lock(shared=True):
+        index = load_index(index_path, path)
+    if index is not None:
+        return index
+
+    with data_lock():
+        if not os.path.exists(path):
+            return KeyIndex.from_values([])
+
+        keys = read_table(name, columns=[column])[column]
+        index = KeyIndex.from_values(keys)
+        save_index(index, index_path, path)
+        return index
+
+
+def save_key_index(name, column, index: KeyIndex):
+    """Store an index as current for the table as it is on disk now."""
+    with data_lock():
+        save_index(index, key_index_path(name, column), table_path(name))
+
+
+# =========================
+# Derived aggregates
+# =========================
+# Tables maintained from a source table on every append. An append only
+# writes the aggregate of its own batch as a delta file under
+# <table path>.deltas/; readers fold the deltas into the compacted table,
+# and load_derived compacts once DERIVED_MAX_DELTAS of them have piled up.
+# A sidecar records the source files' signatures; if they no longer match
+# (the source was rewritten elsewhere) the aggregate is rebuilt on next load.
+DERIVED_MAX_DELTAS = 50
+
+# Products only change the cube through new ids; re-read them when the file changes
+_cube_products = {}
+
+
+def _products_for_cube():
+    sig = source_signature(table_path("products"))
+    if _cube_products.get("sig") != sig or "df" not in _cube_products:
+        _cube_products.update(sig=sig, df=load_table("products")[["product_id", "category", "unit_price"]])
+    return _cube_products["df"]
+
+
+def _build_spend_cube(transactions):
+    return spend_cube(transactions, _products_for_cube())
+
+
+DERIVED_TABLES = {
+    "spend_cube": {
+        # first source is the one appended to; the rest only invalidate
+        "sources": ["transactions", "products"],
+        "columns": {
+            "customer_id": "string", "category": "string", "store_id": "string", "year_month": "string",
+            "spend": "float", "quantity": "float", "tx_count": "int", "discount_sum": "float",
+        },
+        # Rows with equal keys are summed when deltas are folded in
+        "keys": CUBE_KEYS,
+        "measures": CUBE_MEASURES,
+        "build": _build_spend_cube,
+        "delta": _build_spend_cube,
+        "combine": add_to_cube,
+    },
+}
+
+
+def _derived_meta_path(name):
+    return table_path(name) + ".source.json"
+
+
+def _sources_signature(name):
+    return {src: source_signature(table_path(src)) for src in DERIVED_TABLES[name]["sources"]}
+
+
+def _write_derived_meta(name):
+    tmp = _tmp_path(_derived_meta_path(name))
+    with open(tmp, "w") as f:
+        json.dump(_sources_signature(name), f)
+    os.replace(tmp, _derived_meta_path(name))
+
+
+def delta_dir(name):
+    return table_path(name) + ".deltas"
+
+
+def delta_files(name):
+    """Delta files of a derived table, oldest first."""
+    path = delta_dir(name)
+    if not os.path.isdir(path):
+        return []
+    return [os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(f".{STORAGE_FORMAT}")]
+
+
+def table_signature(name):
+    """
+    source_signature of a table, including the pending deltas of a derived
+    table and the customer attribute overrides of merged_transactions.
+    """
+    sig = source_signature(table_path(name))
+    if name in DERIVED_TABLES:
+        return [sig, source_signature(delta_dir(name))]
+    if name == "merged_transactions":
+        return [sig, source_signature(merged_overrides_path())]
+    return sig
+
+
+def derived_is_fresh(name):
+    meta_path = _derived_meta_path(name)
+    if not (table_exists(name) and os.path.exists(meta_path)):
+        return False
+    with open(meta_path) as f:
+        return json.load(f) == _sources_signature(name)
+
+
+def _append_delta(name, df):
+    os.makedirs(delta_dir(name), exist_ok=True)
+    # Zero-padded ns timestamps sort in write order
+    path = os.path.join(delta_dir(name), f"{time.time_ns():020d}-{os.getpid()}.{STORAGE_FORMAT}")
+    if STORAGE_FORMAT == "parquet":
+        replace_atomically(path, lambda tmp: _write_parquet(name, df, tmp))
+    else:
+        replace_atomically(path, lambda tmp: df.to_csv(tmp, index=False))
+    _write_derived_meta(name)
+
+
+def _read_delta(name, path):
+    if STORAGE_FORMAT == "parquet":
+        return pd.read_parquet(path)
+    return read_csv_typed(name, path)
+
+
+def _fold_deltas(name, df, files):
+    if not files:
+        return df
+    deltas = pd.concat([_read_delta(name, path) for path in files], ignore_index=True)
+    return DERIVED_TABLES[name]["combine"](df, deltas)
+
+
+def _save_derived(name, df):
+    # Without the sidecar the table counts as stale, so a crash before the
+    # deltas are gone means a rebuild, never deltas counted twice
+    try:
+        os.remove(_derived_meta_path(name))
+    except FileNotFoundError:
+        pass
+    write_table(name, df)
+    shutil.rmtree(delta_dir(name), ignore_errors=True)
+    _write_derived_meta(name)
+
+
+def load_derived(name, rebuild=False):
+    """
+    Read a derived aggregate with its deltas folded in, compacting them
+    into the table when there are many, or rebuild it from its source
+    when stale.
+    """
+    with data_lock():
+        if not rebuild and derived_is_fresh(name):
+            files = delta_files(name)
+            df = _fold_deltas(name, read_table(name), files)
+            if len(files) >= DERIVED_MAX_DELTAS:
+                _save_derived(name, df)
+            return df
+
+        source = DERIVED_TABLES[name]["sources"][0]
+        df = DERIVED_TABLES[name]["build"](load_table(source))
+        _save_derived(name, df)
+        return df
+
+
+def compact_derived(name):
+    """Fold the pending deltas of a derived table into it (e.g. from a scheduled job)."""
+    with data_lock():
+        if derived_is_fresh(name) and delta_files(name):
+            _save_derived(name, _fold_deltas(name, read_table(name), delta_files(name)))
+
+
+def convert_csv_to_parquet(names=None):
+    """Copy the CSV tables into the Parquet layout (overwrites Parquet copies)."""
+    for name in names or TABLE_CSV:
+        src = TABLE_CSV[name]
+        if not os.path.exists(src):
+            continue
+        df = pd.read_csv(src)
+        with data_lock():
+            replace_atomically(TABLE_PARQUET[name], lambda tmp: _write_parquet(name, df, tmp))
+
+
+CUSTOMER_MERGED_COLS = ["gender", "age", "loyalty_tier", "preferred_channel"]
+
+
+def join_dimensions(customers, stores, products, transactions):
     # Ensure datetime
     transactions = transactions.copy()
     transactions["transaction_date"] = pd.to_datetime(transactions["transaction_date"], errors="coerce")
@@ -77,19 +922,141 @@ def rebuild_merged(customers, stores, products, transactions):
 
     # Join customers
     df = df.merge(
-        customers[["customer_id", "gender", "age", "loyalty_tier", "preferred_channel"]],
+        customers[["customer_id"] + CUSTOMER_MERGED_COLS],
         on="customer_id",
         how="left"
     )
 
-    final_cols = [
-        "product_id", "category", "unit_price", "is_discountable",
-        "store_id", "store_type", "region", "city",
-        "customer_id", "gender", "age", "loyalty_tier", "preferred_channel",
-        "transaction_id", "transaction_date", "channel",
-        "quantity", "discount_pct"
-    ]
+    return df[MERGED_COLUMNS]
+
 
-    df = df[final_cols]
-    df.to_csv(MERGED_CSV, index=False)
+def rebuild_merged(customers, stores, products, transactions):
+    df = join_dimensions(customers, stores, products, transactions)
+    write_table("merged_transactions", df)
+    return df
+
+
+def append_merged(customers, stores, products, transactions_new):
+    """Join only the newly accepted transactions and append them to the merged table."""
+    df = join_dimensions(customers, stores, products, transactions_new)
+    append_table("merged_transactions", df)
     return df
+
+
+# Customer attributes of merged rows are not rewritten in place when a
+# tier moves (that is most ingests). refresh_merged_customers records the
+# customers' current attributes in <merged path>.customers.csv and readers
+# of merged_transactions apply them; the table itself is rewritten only once
+# MERGED_MAX_STALE_CUSTOMERS have piled up, or by compact_merged.
+MERGED_MAX_STALE_CUSTOMERS = 10000
+
+
+def merged_overrides_path():
+    return table_path("merged_transactions") + ".customers.csv"
+
+
+def merged_overrides():
+    """customer_id-indexed attributes that supersede those stored in merged rows, or None."""
+    path = merged_overrides_path()
+    if not os.path.exists(path):
+        return None
+    df = read_csv_typed("customers", path)
+    return df.set_index(df["customer_id"].astype(str))[CUSTOMER_MERGED_COLS]
+
+
+def _drop_merged_overrides():
+    try:
+        os.remove(merged_overrides_path())
+    except FileNotFoundError:
+        pass
+
+
+def _apply_overrides(df, overrides):
+    if overrides is None or len(df) == 0 or "customer_id" not in df.columns:
+        return df
+    pos = overrides.index.get_indexer(df["customer_id"].astype(str))
+    rows = np.flatnonzero(pos >= 0)
+    if len(rows) == 0:
+        return df
+
+    for c in CUSTOMER_MERGED_COLS:
+        if c not in df.columns:
+            continue
+        dtype = df[c].dtype
+        values = overrides[c].take(pos[rows])
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtype = pd.CategoricalDtype(dtype.categories.union(pd.Index(values.dropna().unique())))
+        # Typed array writes; .loc with mixed values goes through object
+        out = df[c].astype(dtype).array.copy()
+        out[rows] = values.astype(dtype).array
+        df[c] = out
+    return df
+
+
+def _read_merged(columns, year_months):
+    overrides = merged_overrides()
+    extra = (
+        overrides is not None and columns is not None and "customer_id" not in columns
+        and any(c in columns for c in CUSTOMER_MERGED_COLS)
+    )
+    df = _read_table("merged_transactions", list(columns) + ["customer_id"] if extra else columns, year_months)
+    df = _apply_overrides(df, overrides)
+    return df.drop(columns="customer_id") if extra else df
+
+
+def refresh_merged_customers(customers, customer_ids):
+    """
+    Bring the customer attributes of merged rows for the given customers up
+    to date. Returns the number of customers whose merged attributes are
+    pending (0 after the table was rewritten).
+    """
+    if len(customer_ids) == 0 or not table_exists("merged_transactions"):
+        return 0
+
+    with data_lock():
+        ids = pd.Index(customer_ids).astype(str)
+        attrs = customers.loc[customers["customer_id"].astype(str).isin(ids), ["customer_id"] + CUSTOMER_MERGED_COLS]
+
+        pending = merged_overrides()
+        if pending is not None:
+            pending = pending[~pending.index.isin(ids)].reset_index(names="customer_id")
+            attrs = pd.concat([pending, attrs], ignore_index=True)
+
+        # Rewritten on every call, so the file signature tracks the content
+        replace_atomically(merged_overrides_path(), lambda tmp: attrs.to_csv(tmp, index=False))
+        if len(attrs) >= MERGED_MAX_STALE_CUSTOMERS:
+            _fold_merged_overrides()
+            return 0
+        return len(attrs)
+
+
+def _fold_merged_overrides():
+    # write_table drops the overrides file once the table is swapped in
+    write_table("merged_transactions", read_table("merged_transactions"))
+
+
+def compact_merged():
+    """Write pending customer attributes into merged_transactions (e.g. from a scheduled job)."""
+    with data_lock():
+        if table_exists("merged_transactions") and os.path.exists(merged_overrides_path()):
+            _fold_merged_overrides()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Retail table storage utilities")
+    parser.add_argument("--to-parquet", action="store_true",
+                        help="convert the CSV tables under DATA_DIR to Parquet")
+    parser.add_argument("--compact", action="store_true",
+                        help="fold pending deltas (spend_cube) and customer attributes (merged_transactions) into the tables")
+    args = parser.parse_args()
+
+    if args.to_parquet:
+        convert_csv_to_parquet()
+        print("Converted CSV tables to Parquet under:", DATA_DIR)
+    if args.compact:
+        for name in DERIVED_TABLES:
+            compact_derived(name)
+        compact_merged()
+        print("Compacted:", ", ".join([*DERIVED_TABLES, "merged_transactions"]))
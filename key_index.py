@@ -0,0 +1,217 @@
+import json
+import os
+import uuid
+
+import numpy as np
+import pandas as pd
+
+
+# =========================
+# Sorted key index
+# =========================
+# Appends add a small sorted segment instead of re-sorting the whole index.
+# Segments of similar size are merged as they pile up (so there are only
+# O(log n) of them), and all of them are folded into the main array once
+# they hold COMPACT_RATIO of its size, which keeps an append O(batch) on
+# average.
+COMPACT_RATIO = 0.25
+
+
+def _new_id():
+    return uuid.uuid4().hex[:12]
+
+
+def _as_keys(values):
+    # Missing values become "" so they simply miss. astype(str) alone turns
+    # them into "nan" / "None" on pandas 2, which would match stored keys.
+    values = pd.Series(values)
+    return values.astype(str).where(values.notna(), "").to_numpy(dtype=str)
+
+
+def _probe(keys, values):
+    if len(keys) == 0:
+        return np.zeros(len(values), dtype=bool)
+    pos = np.minimum(np.searchsorted(keys, values), len(keys) - 1)
+    return keys[pos] == values
+
+
+class KeyIndex:
+    """
+    Sorted array of unique string keys plus sorted delta segments (disjoint
+    from it and from each other). Membership is a binary search per array,
+    so checking a batch costs O(batch * log n) and never touches the table.
+    """
+
+    def __init__(self, keys: np.ndarray, segments=(), main_id=None):
+        self.keys = keys
+        # [(segment id, sorted keys)]; ids name the files the segments are saved in
+        self.segments = list(segments)
+        self.main_id = main_id
+
+    @classmethod
+    def from_values(cls, values):
+        values = pd.Series(values).dropna().astype(str).to_numpy(dtype=str)
+        if len(values) == 0:
+            return cls(np.array([], dtype="<U1"), main_id=_new_id())
+        return cls(np.unique(values), main_id=_new_id())
+
+    def __len__(self):
+        return len(self.keys) + sum(len(seg) for _, seg in self.segments)
+
+    def contains(self, values) -> np.ndarray:
+        values = _as_keys(values)
+        found = _probe(self.keys, values)
+        for _, seg in self.segments:
+            found |= _probe(seg, values)
+        return found
+
+    def merged_with(self, values):
+        new = KeyIndex.from_values(values).keys
+        new = new[~self.contains(new)]
+        if len(new) == 0:
+            return self
+
+        segments = self.segments + [(_new_id(), new)]
+        while len(segments) > 1 and len(segments[-2][1]) <= 2 * len(segments[-1][1]):
+            (_, a), (_, b) = segments[-2:]
+            segments[-2:] = [(_new_id(), np.sort(np.concatenate([a, b])))]
+
+        index = KeyIndex(self.keys, segments, self.main_id)
+        if sum(len(seg) for _, seg in segments) >= COMPACT_RATIO * len(self.keys):
+            return index.compacted()
+        return index
+
+    def compacted(self):
+        """All keys in one main array."""
+        if not self.segments:
+            return self
+        keys = np.sort(np.concatenate([np.asarray(self.keys)] + [seg for _, seg in self.segments]))
+        return KeyIndex(keys, main_id=_new_id())
+
+    def in_memory(self):
+        """The same index with the memory-mapped arrays read in (e.g. to send to worker processes)."""
+        return KeyIndex(np.asarray(self.keys), self.segments, self.main_id)
+
+
+class PendingKeys:
+    """
+    A KeyIndex plus keys seen in memory since it was loaded
+    (earlier chunks of an upload, rows accepted but not yet committed).
+    """
+
+    def __init__(self, index: KeyIndex):
+        self.index = index
+        self.pending = set()
+
+    def __len__(self):
+        return len(self.index) + len(self.pending)
+
+    def contains(self, values) -> np.ndarray:
+        values = _as_keys(values)
+        return self.index.contains(values) | pd.Series(values).isin(self.pending).to_numpy()
+
+    def add(self, values):
+        # Keys the index already has need not be held again
+        values = pd.Series(values).dropna().astype(str)
+        self.pending.update(values[~self.index.contains(values)])
+
+
+def key_lookup(existing, column):
+    """Accept a KeyIndex / PendingKeys or a DataFrame holding the key column."""
+    if isinstance(existing, (KeyIndex, PendingKeys)):
+        return existing
+    if existing is None or len(existing) == 0 or column not in existing.columns:
+        return KeyIndex.from_values([])
+    return KeyIndex.from_values(existing[column])
+
+
+# =========================
+# Persistence
+# =========================
+def source_signature(path):
+    # Size + mtime of the table file (or every file under a Parquet dataset dir)
+    if not os.path.exists(path):
+        return None
+    if os.path.isdir(path):
+        size, mtime = 0, 0
+        for root, _, files in os.walk(path):
+            for f in files:
+                st = os.stat(os.path.join(root, f))
+                size += st.st_size
+                mtime = max(mtime, st.st_mtime_ns)
+        return [size, mtime]
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _segment_path(index_path, seg_id):
+    return f"{index_path}.seg-{seg_id}.npy"
+
+
+def _save_array(path, keys):
+    # Write beside the target and swap in; np.save keeps a trailing .npy as is
+    tmp = path + ".tmp.npy"
+    np.save(tmp, np.asarray(keys), allow_pickle=False)
+    os.replace(tmp, path)
+
+
+def _read_meta(index_path):
+    meta_path = index_path + ".json"
+    if not os.path.exists(meta_path):
+        return None
+    with open(meta_path) as f:
+        return json.load(f)
+
+
+def save_index(index: KeyIndex, index_path, source_path):
+    """
+    Persist an index. Arrays already on disk (same main id / segment id)
+    are not written again, so saving after an append only writes the new
+    segment and the metadata.
+    """
+    old = _read_meta(index_path) or {}
+    if index.main_id is None:
+        index.main_id = _new_id()
+    if old.get("main_id") != index.main_id or not os.path.exists(index_path):
+        _save_array(index_path, index.keys)
+
+    for seg_id, seg in index.segments:
+        if not os.path.exists(_segment_path(index_path, seg_id)):
+            _save_array(_segment_path(index_path, seg_id), seg)
+
+    tmp = index_path + ".json.tmp"
+    with open(tmp, "w") as f:
+        json.dump({
+            "source": source_signature(source_path),
+            "n_keys": len(index),
+            "main_id": index.main_id,
+            "segments": [seg_id for seg_id, _ in index.segments],
+        }, f)
+    os.replace(tmp, index_path + ".json")
+
+    # Segments merged away since the last save
+    for seg_id in set(old.get("segments", [])) - {seg_id for seg_id, _ in index.segments}:
+        try:
+            os.remove(_segment_path(index_path, seg_id))
+        except FileNotFoundError:
+            pass
+
+
+def load_index(index_path, source_path):
+    """Memory-map a saved index (main array and segments); None if missing or the table changed since it was written."""
+    meta = _read_meta(index_path)
+    if meta is None or not os.path.exists(index_path):
+        return None
+    if meta.get("source") != source_signature(source_path):
+        return None
+    if meta.get("n_keys", 0) == 0:
+        return KeyIndex.from_values([])
+
+    try:
+        segments = [
+            (seg_id, np.load(_segment_path(index_path, seg_id), mmap_mode="r", allow_pickle=False))
+            for seg_id in meta.get("segments", [])
+        ]
+    except FileNotFoundError:
+        return None
+    return KeyIndex(np.load(index_path, mmap_mode="r", allow_pickle=False), segments, meta.get("main_id"))
@@ -1,79 +1,102 @@
+import numpy as np
 import pandas as pd
 
+from spend_agg import monthly_spend, cube_monthly_spend
+from io_utils import (
+    load_derived,
+    read_table,
+    write_table,
+    table_exists,
+    append_merged,
+    rebuild_merged,
+    refresh_merged_customers,
+)
 
-def update_loyalty_tiers(customers: pd.DataFrame,
-                         transactions: pd.DataFrame,
-                         products: pd.DataFrame) -> pd.DataFrame:
+TIERS_BY_QUARTER = ["Platinum", "Gold", "Silver", "Bronze"]
+
+
+def assign_tiers(customers: pd.DataFrame, monthly: pd.DataFrame) -> pd.DataFrame:
     """
     Rule:
-    - Monthly spend per customer = sum(quantity * unit_price * (1-discount))
-    - Avg monthly spend per customer = mean(monthly spend)
-    - Sort customers by avg monthly spend desc
+    - Avg monthly spend per customer = mean(monthly spend) over months with spend
+    - Rank customers by avg monthly spend desc
     - Top 25% Platinum, next 25% Gold, next 25% Silver, last 25% Bronze
-    """
 
+    monthly: customer_id, year_month, monthly_spend (see spend_agg).
+    Row order of customers is kept.
+    """
     customers = customers.copy()
-    transactions = transactions.copy()
-    products = products.copy()
-
     customers["customer_id"] = customers["customer_id"].astype(str)
-    transactions["customer_id"] = transactions["customer_id"].astype(str)
-    transactions["product_id"] = transactions["product_id"].astype(str)
-    products["product_id"] = products["product_id"].astype(str)
 
-    transactions["transaction_date"] = pd.to_datetime(transactions["transaction_date"], errors="coerce")
+    avg_monthly = monthly.groupby(monthly["customer_id"].astype(str))["monthly_spend"].mean()
+    avg = customers["customer_id"].map(avg_monthly).fillna(0).to_numpy(dtype="float64")
 
-    # Merge unit_price into transactions
-    tx = transactions.merge(products[["product_id", "unit_price"]], on="product_id", how="left")
+    # Rank position 0 = highest spender (stable on ties)
+    n = len(customers)
+    order = np.argsort(-avg, kind="stable")
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
 
-    tx["quantity"] = pd.to_numeric(tx["quantity"], errors="coerce").fillna(0)
-    tx["discount_pct"] = pd.to_numeric(tx["discount_pct"], errors="coerce").fillna(0)
-    tx["unit_price"] = pd.to_numeric(tx["unit_price"], errors="coerce").fillna(0)
+    bounds = np.array([int(n * 0.25), int(n * 0.50), int(n * 0.75)])
+    quarter = np.searchsorted(bounds, rank, side="right")
+    customers["loyalty_tier"] = np.array(TIERS_BY_QUARTER, dtype=object)[quarter]
 
-    # Spend
-    tx["spend"] = tx["quantity"] * tx["unit_price"] * (1 - tx["discount_pct"])
+    return customers
 
-    # Month bucket
-    tx["year_month"] = tx["transaction_date"].dt.to_period("M").astype(str)
 
-    # Monthly spend
-    monthly = (
-        tx.groupby(["customer_id", "year_month"])["spend"]
-        .sum()
-        .reset_index()
-        .rename(columns={"spend": "monthly_spend"})
-    )
+def tier_changes(customers_before: pd.DataFrame, customers_after: pd.DataFrame) -> pd.DataFrame:
+    """customer_id, old_tier, new_tier for customers whose tier moved."""
+    old = customers_before.set_index(customers_before["customer_id"].astype(str))["loyalty_tier"].astype(str)
+    new = customers_after.set_index(customers_after["customer_id"].astype(str))["loyalty_tier"].astype(str)
+    old = old.reindex(new.index)
 
-    # Avg monthly spend
-    avg_monthly = (
-        monthly.groupby("customer_id")["monthly_spend"]
-        .mean()
-        .reset_index()
-        .rename(columns={"monthly_spend": "avg_monthly_spend"})
-    )
+    moved = old != new
+    return pd.DataFrame({
+        "customer_id": new.index[moved],
+        "old_tier": old[moved].values,
+        "new_tier": new[moved].values,
+    })
 
-    customers = customers.merge(avg_monthly, on="customer_id", how="left")
-    customers["avg_monthly_spend"] = customers["avg_monthly_spend"].fillna(0)
 
-    customers = customers.sort_values("avg_monthly_spend", ascending=False).reset_index(drop=True)
+def update_loyalty_tiers(customers: pd.DataFrame,
+                         transactions: pd.DataFrame,
+                         products: pd.DataFrame) -> pd.DataFrame:
+    """
+    Full recompute from all transactions. Ingest paths use
+    refresh_loyalty_tiers, which reads the maintained spend cube instead.
+    """
+    return assign_tiers(customers, monthly_spend(transactions, products))
 
-    n = len(customers)
-    q1 = int(n * 0.25)
-    q2 = int(n * 0.50)
-    q3 = int(n * 0.75)
 
-    def tier_from_rank(i):
-        if i < q1:
-            return "Platinum"
-        elif i < q2:
-            return "Gold"
-        elif i < q3:
-            return "Silver"
-        else:
-            return "Bronze"
+def refresh_loyalty_tiers(customers: pd.DataFrame):
+    """
+    Recompute tiers from the persisted spend cube (updated by
+    io_utils.append_table). Returns (customers, changes).
+    """
+    updated = assign_tiers(customers, cube_monthly_spend(load_derived("spend_cube")))
+    return updated, tier_changes(customers, updated)
 
-    customers["loyalty_tier"] = [tier_from_rank(i) for i in range(n)]
 
-    customers.drop(columns=["avg_monthly_spend"], inplace=True)
+def apply_loyalty_after_ingest(customers, stores, products, transactions_new=None):
+    """
+    Run after accepted transactions were appended: refresh tiers, save
+    customers only if a tier moved, then update merged_transactions
+    (append transactions_new if given, record the changed customers'
+    attributes; see io_utils.refresh_merged_customers). Returns
+    (customers, info).
+    """
+    customers_updated, changes = refresh_loyalty_tiers(customers)
+    if len(changes):
+        write_table("customers", customers_updated)
 
-    return customers
+    info = {"tier_changes": len(changes)}
+
+    if not table_exists("merged_transactions"):
+        merged = rebuild_merged(customers_updated, stores, products, read_table("transactions"))
+        info["merged_rebuilt"] = len(merged)
+        return customers_updated, info
+
+    if transactions_new is not None:
+        info["merged_appended"] = len(append_merged(customers_updated, stores, products, transactions_new))
+    info["merged_refreshed"] = refresh_merged_customers(customers_updated, changes["customer_id"])
+    return customers_updated, info
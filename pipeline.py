@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import time
+
+import pandas as pd
+
+from io_utils import (
+    DATA_DIR,
+    INDEXED_KEYS,
+    DERIVED_TABLES,
+    table_path,
+    load_table,
+    write_table,
+    load_key_index,
+    key_index_path,
+    load_derived,
+    table_signature,
+    rebuild_merged,
+    replace_atomically,
+    data_lock,
+)
+from key_index import source_signature
+from dq_engine import run_rules
+from spend_agg import daily_spend_features
+from loyalty_update import refresh_loyalty_tiers
+
+MANIFEST_PATH = os.path.join(DATA_DIR, ".pipeline.json")
+DQ_REPORT_CSV = os.path.join(DATA_DIR, "dq_report.csv")
+
+SOURCE_TABLES = ["customers", "stores", "products", "transactions"]
+
+
+# =========================
+# Run context
+# =========================
+class RunContext:
+    """Tables read at most once per run; stages hand their outputs on here."""
+
+    def __init__(self, force=False):
+        self.force = force
+        self.tables = {}
+
+    def table(self, name):
+        if name not in self.tables:
+            self.tables[name] = load_derived(name) if name in DERIVED_TABLES else load_table(name)
+        return self.tables[name]
+
+    def put(self, name, df):
+        self.tables[name] = df
+
+
+# =========================
+# Stages
+# =========================
+def _stage_load(ctx):
+    # Read the source tables and bring their key indexes up to date
+    for name in SOURCE_TABLES:
+        ctx.table(name)
+        for col in INDEXED_KEYS.get(name, []):
+            load_key_index(name, col)
+    return {name: len(ctx.table(name)) for name in SOURCE_TABLES}
+
+
+def _stage_validate(ctx):
+    # Re-check stored rows against the declared rules (e.g. after a product
+    # edit); nothing is removed, hits per rule go to dq_report.csv
+    refs = {
+        "customers": load_key_index("customers", "customer_id"),
+        "stores": ctx.table("stores"),
+        "products": load_key_index("products", "product_id"),
+    }
+    report = []
+    for name in SOURCE_TABLES:
+        stats = []
+        run_rules(name, ctx.table(name), refs, stats=stats)
+        report.extend({"table": name, **s} for s in stats if s["rule"] != "convert")
+
+    df = pd.DataFrame(report, columns=["table", "rule", "hits", "ms"])
+    replace_atomically(DQ_REPORT_CSV, lambda tmp: df.to_csv(tmp, index=False))
+    return {"violations": int(df["hits"].sum())}
+
+
+def _stage_spend(ctx):
+    df = load_derived("spend_cube", rebuild=ctx.force)
+    ctx.put("spend_cube", df)
+    return {"rows": len(df)}
+
+
+def _stage_loyalty(ctx):
+    customers, changes = refresh_loyalty_tiers(ctx.table("customers"))
+    if len(changes):
+        write_table("customers", customers)
+    ctx.put("customers", customers)
+    return {"tier_changes": len(changes)}
+
+
+def _stage_merge(ctx):
+    merged = rebuild_merged(ctx.table("customers"), ctx.table("stores"), ctx.table("products"), ctx.table("transactions"))
+    ctx.put("merged_transactions", merged)
+    return {"rows": len(merged)}
+
+
+def _stage_features(ctx):
+    df = daily_spend_features(ctx.table("merged_transactions"))
+    write_table("spend_features", df)
+    return {"rows": len(df)}
+
+
+# inputs: tables whose files key the cache; outputs: files the stage writes
+STAGES = [
+    {
+        "name": "load",
+        "inputs": SOURCE_TABLES,
+        "outputs": [key_index_path(t, c) for t in SOURCE_TABLES for c in INDEXED_KEYS.get(t, [])],
+        "run": _stage_load,
+    },
+    {
+        "name": "validate",
+        "inputs": SOURCE_TABLES,
+        "outputs": [DQ_REPORT_CSV],
+        "run": _stage_validate,
+    },
+    {
+        "name": "spend",
+        "inputs": ["transactions", "products"],
+        "outputs": [table_path("spend_cube")],
+        "run": _stage_spend,
+    },
+    {
+        "name": "loyalty",
+        "inputs": ["customers", "spend_cube"],
+        "outputs": [],
+        "run": _stage_loyalty,
+    },
+    {
+        "name": "merge",
+        "inputs": ["customers", "stores", "products", "transactions"],
+        "outputs": [table_path("merged_transactions")],
+        "run": _stage_merge,
+    },
+    {
+        "name": "features",
+        "inputs": ["merged_transactions"],
+        "outputs": [table_path("spend_features")],
+        "run": _stage_features,
+    },
+]
+
+STAGE_NAMES = [s["name"] for s in STAGES]
+
+
+# =========================
+# Cache
+# =========================
+# A stage is skipped when the fingerprint of its input files matches the one
+# recorded after its last run and its outputs were not touched since.
+def _load_manifest():
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(manifest, f, indent=2)
+    replace_atomically(MANIFEST_PATH, write)
+
+
+def _signatures(stage):
+    inputs = {name: table_signature(name) for name in stage["inputs"]}
+    outputs = {path: source_signature(path) for path in stage["outputs"]}
+    return inputs, outputs
+
+
+def _fingerprint(stage, inputs):
+    key = json.dumps({"stage": stage["name"], "inputs": inputs}, sort_keys=True)
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def _is_cached(entry, stage, inputs, outputs):
+    return (
+        entry is not None
+        and entry["fingerprint"] == _fingerprint(stage, inputs)
+        and entry["outputs"] == outputs
+        and all(sig is not None for sig in outputs.values())
+    )
+
+
+# =========================
+# Runner
+# =========================
+def run_pipeline(start=None, stop=None, force=False, on_progress=None):
+    """
+    Run the stages from start to stop (names from STAGE_NAMES, default: all).
+    Stages whose inputs are unchanged since their last run are skipped unless
+    force is set. Returns one {"stage", "status", "seconds", "info"} per stage.
+    """
+    names = STAGE_NAMES[STAGE_NAMES.index(start or STAGE_NAMES[0]):STAGE_NAMES.index(stop or STAGE_NAMES[-1]) + 1]
+    ctx = RunContext(force)
+    report = []
+
+    # Fingerprints are taken after each stage, so nothing may write in between
+    with data_lock():
+        manifest = _load_manifest()
+
+        for stage in STAGES:
+            if stage["name"] not in names:
+                continue
+
+            entry = manifest.get(stage["name"])
+            inputs, outputs = _signatures(stage)
+            t0 = time.perf_counter()
+
+            if not force and _is_cached(entry, stage, inputs, outputs):
+                status, info = "cached", {}
+            else:
+                status, info = "ran", stage["run"](ctx)
+
+                inputs, outputs = _signatures(stage)
+                manifest[stage["name"]] = {
+                    "fingerprint": _fingerprint(stage, inputs),
+                    "inputs": inputs,
+                    "outputs": outputs,
+                }
+                _save_manifest(manifest)
+
+            row = {"stage": stage["name"], "status": status, "seconds": time.perf_counter() - t0, "info": info}
+            report.append(row)
+            if on_progress is not None:
+                on_progress(row)
+
+    return report
+
+
+def print_stage(row):
+    info = ", ".join(f"{k}={v}" for k, v in row["info"].items())
+    print(f"{row['stage']:<9} {row['status']:<6} {row['seconds']:7.2f}s  {info}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Rebuild derived data; unchanged stages are skipped")
+    parser.add_argument("--from", dest="start", choices=STAGE_NAMES, default=None, help="first stage to run")
+    parser.add_argument("--to", dest="stop", choices=STAGE_NAMES, default=None, help="last stage to run")
+    parser.add_argument("--force", action="store_true", help="run the selected stages even if cached")
+    args = parser.parse_args()
+
+    run_pipeline(args.start, args.stop, args.force, on_progress=print_stage)
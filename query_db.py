@@ -0,0 +1,315 @@
+import json
+import os
+import threading
+
+import duckdb
+
+from io_utils import (
+    DATA_DIR,
+    TABLE_CSV,
+    DERIVED_TABLES,
+    PARTITIONED_TABLES,
+    PARTITION_COL,
+    STORAGE_FORMAT,
+    table_path,
+    table_exists,
+    derived_is_fresh,
+    delta_files,
+    load_derived,
+    merged_overrides_path,
+    CUSTOMER_MERGED_COLS,
+    data_lock,
+    column_types,
+)
+
+# Persistent DuckDB copy of the retail tables for the SQL tool. Each table
+# remembers the signature of the source it was loaded from; refresh() only
+# touches tables whose source changed, and reads just the new rows when the
+# change was an append (CSV grown in place, new Parquet partition files).
+# Derived tables are reloaded with their pending delta files summed in;
+# merged_transactions gets the pending customer attributes applied.
+DB_PATH = os.path.join(DATA_DIR, f"retail.{STORAGE_FORMAT}.duckdb")
+
+DUCKDB_TYPES = {"string": "VARCHAR", "int": "INTEGER", "float": "DOUBLE", "date": "DATE"}
+
+FULL, APPENDED, UPDATED, UNCHANGED, MISSING = "full", "appended", "updated", "unchanged", "missing"
+
+# Statement types read_query() lets through (SELECT covers FROM / DESCRIBE / SHOW / SUMMARIZE)
+READ_STATEMENTS = {duckdb.StatementType.SELECT, duckdb.StatementType.EXPLAIN}
+
+
+# =========================
+# Source signatures
+# =========================
+def _file_signature(path):
+    st = os.stat(path)
+    return [os.path.basename(path), st.st_size, st.st_mtime_ns]
+
+
+def _csv_signature(path):
+    st = os.stat(path)
+    # Same inode: appended in place; rewrites are swapped in as a new file
+    return {"ino": st.st_ino, "size": st.st_size, "mtime": st.st_mtime_ns}
+
+
+def _parquet_files(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(
+        os.path.join(root, f) for root, _, files in os.walk(path) for f in files if f.endswith(".parquet")
+    )
+
+
+def _parquet_signature(path):
+    files = {}
+    for f in _parquet_files(path):
+        st = os.stat(f)
+        files[os.path.relpath(f, path)] = [st.st_size, st.st_mtime_ns]
+    return {"files": files}
+
+
+def source_signature(name):
+    path = table_path(name)
+    if name in DERIVED_TABLES:
+        return {"derived": [_file_signature(f) for f in [path] + delta_files(name)]}
+    sig = _parquet_signature(path) if STORAGE_FORMAT == "parquet" else _csv_signature(path)
+    if name == "merged_transactions":
+        overrides = merged_overrides_path()
+        sig["customers"] = _file_signature(overrides) if os.path.exists(overrides) else None
+    return sig
+
+
+def _same_source(old, new):
+    """Only the customer attribute overrides changed."""
+    return old is not None and {**old, "customers": None} == {**new, "customers": None}
+
+
+def _appended_part(old, new):
+    """What was added since `old` if the source only grew, else None."""
+    if old is None or "derived" in new:
+        return None
+    if "files" in new:
+        if any(new["files"].get(f) != sig for f, sig in old["files"].items()):
+            return None
+        added = sorted(set(new["files"]) - set(old["files"]))
+        return {"files": added} if added else None
+    if new["ino"] == old["ino"] and new["size"] > old["size"]:
+        return {"offset": old["size"]}
+    return None
+
+
+# =========================
+# Readers
+# =========================
+def _sql_str(s):
+    return "'" + str(s).replace("'", "''") + "'"
+
+
+def _csv_reader(name, paths, header):
+    types = column_types(name)
+    cols = ", ".join(
+        f"{_sql_str(c)}: {_sql_str(DUCKDB_TYPES[types[c]])}" for c in header if c in types
+    )
+    files = ", ".join(_sql_str(p) for p in ([paths] if isinstance(paths, str) else paths))
+    # Not strict: files shipped with CRLF get LF rows appended by pandas
+    return f"read_csv([{files}], header = true, strict_mode = false, union_by_name = true, types = {{{cols}}})"
+
+
+def _parquet_reader(name, files):
+    hive = ""
+    if name in PARTITIONED_TABLES:
+        hive = f", hive_partitioning = true, hive_types = {{{_sql_str(PARTITION_COL)}: 'VARCHAR'}}"
+    return f"read_parquet([{', '.join(_sql_str(f) for f in files)}]{hive}, union_by_name = true)"
+
+
+def _typed_select(con, name, src):
+    # Parquet carries pandas' types (int64, timestamps); cast to the schema's
+    types = column_types(name)
+    present = [r[0] for r in con.execute(f"DESCRIBE SELECT * FROM {src}").fetchall()]
+    casts = ", ".join(f'CAST("{c}" AS {DUCKDB_TYPES[types[c]]}) AS "{c}"' for c in present if c in types)
+    return f"SELECT * REPLACE ({casts}) FROM {src}" if casts else f"SELECT * FROM {src}"
+
+
+def _derived_select(name, select):
+    # Compacted table + deltas: rows with equal keys are summed
+    meta = DERIVED_TABLES[name]
+    types = column_types(name)
+    keys = ", ".join(f'"{c}"' for c in meta["keys"])
+    sums = ", ".join(f'CAST(SUM("{c}") AS {DUCKDB_TYPES[types[c]]}) AS "{c}"' for c in meta["measures"])
+    return f"SELECT {keys}, {sums} FROM ({select}) GROUP BY ALL"
+
+
+def _csv_header(path):
+    with open(path, "rb") as f:
+        return f.readline().decode("utf-8").strip().split(",")
+
+
+class QueryDB:
+    """
+    One DuckDB database file for all sessions of the SQL tool. Queries run on
+    cursors of a single connection; refresh() is serialized.
+    """
+
+    def __init__(self, path=DB_PATH, read_only=False):
+        self.path = path
+        self.con = duckdb.connect(path, read_only=read_only)
+        self._lock = threading.Lock()
+        if not read_only:
+            self.con.execute("CREATE TABLE IF NOT EXISTS _sources (name VARCHAR PRIMARY KEY, signature VARCHAR)")
+
+    def close(self):
+        self.con.close()
+
+    def _signature(self, con, name):
+        row = con.execute("SELECT signature FROM _sources WHERE name = ?", [name]).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _load_full(self, con, name):
+        path = table_path(name)
+        deltas = delta_files(name) if name in DERIVED_TABLES else []
+        if STORAGE_FORMAT == "parquet":
+            select = _typed_select(con, name, _parquet_reader(name, _parquet_files(path) + deltas))
+        else:
+            select = f"SELECT * FROM {_csv_reader(name, [path] + deltas, _csv_header(path))}"
+        if deltas:
+            select = _derived_select(name, select)
+        con.execute(f'CREATE OR REPLACE TABLE "{name}" AS {select}')
+
+    def _load_appended(self, con, name, part):
+        path = table_path(name)
+        if "files" in part:
+            src = _parquet_reader(name, [os.path.join(path, f) for f in part["files"]])
+            con.execute(f'INSERT INTO "{name}" BY NAME SELECT * FROM {src}')
+            return
+
+        # New CSV rows only: header + the bytes past the old end of file
+        tmp = f"{self.path}.append-{os.getpid()}.csv"
+        with open(path, "rb") as f:
+            header = f.readline()
+            f.seek(part["offset"])
+            rows = f.read().lstrip(b"\r\n")
+        try:
+            with open(tmp, "wb") as f:
+                f.write(header + rows)
+            src = _csv_reader(name, tmp, header.decode("utf-8").strip().split(","))
+            con.execute(f'INSERT INTO "{name}" BY NAME SELECT * FROM {src}')
+        finally:
+            os.remove(tmp)
+
+    def _apply_overrides(self, con):
+        path = merged_overrides_path()
+        if not os.path.exists(path):
+            return
+        src = _csv_reader("customers", path, _csv_header(path))
+        sets = ", ".join(f'"{c}" = o."{c}"' for c in CUSTOMER_MERGED_COLS)
+        con.execute(
+            f'UPDATE "merged_transactions" SET {sets} FROM {src} AS o '
+            f'WHERE "merged_transactions".customer_id = o.customer_id'
+        )
+
+    def refresh(self, names=None):
+        """Bring the tables up to date with their sources; returns {table: what was done}."""
+        names = names or list(TABLE_CSV)
+        done = {}
+        with self._lock:
+            # Derived tables are rebuilt from their source first when stale
+            for name in names:
+                if name in DERIVED_TABLES and table_exists(DERIVED_TABLES[name]["sources"][0]) \
+                        and not derived_is_fresh(name):
+                    load_derived(name)
+
+            con = self.con.cursor()
+            with data_lock(shared=True):
+                for name in names:
+                    old = self._signature(con, name)
+                    if not table_exists(name):
+                        if old is not None:
+                            con.execute(f'DROP TABLE IF EXISTS "{name}"')
+                            con.execute("DELETE FROM _sources WHERE name = ?", [name])
+                        done[name] = MISSING
+                        continue
+
+                    new = source_signature(name)
+                    if old == new:
+                        done[name] = UNCHANGED
+                        continue
+
+                    part = _appended_part(old, new)
+                    con.execute("BEGIN TRANSACTION")
+                    try:
+                        if part is not None:
+                            self._load_appended(con, name, part)
+                            done[name] = APPENDED
+                        elif _same_source(old, new):
+                            done[name] = UPDATED
+                        else:
+                            self._load_full(con, name)
+                            done[name] = FULL
+                        if name == "merged_transactions":
+                            self._apply_overrides(con)
+                        con.execute("INSERT OR REPLACE INTO _sources VALUES (?, ?)", [name, json.dumps(new)])
+                        con.execute("COMMIT")
+                    except Exception:
+                        con.execute("ROLLBACK")
+                        raise
+            con.close()
+        return done
+
+    def tables(self):
+        """Loaded tables (in TABLE_CSV order)."""
+        loaded = set(self.query("SELECT name FROM _sources")["name"])
+        return [name for name in TABLE_CSV if name in loaded]
+
+    def columns(self, name):
+        return self.query(f'DESCRIBE "{name}"')["column_name"].tolist()
+
+    def row_count(self, name):
+        return int(self.query(f'SELECT COUNT(*) AS n FROM "{name}"')["n"].iloc[0])
+
+    def query(self, sql, params=None):
+        """Run SQL on a cursor of the shared connection; returns a DataFrame."""
+        cur = self.con.cursor()
+        try:
+            return cur.execute(sql, params).df()
+        finally:
+            cur.close()
+
+    def read_query(self, sql):
+        """
+        Run SQL typed by a user. The connection is shared and writable, so
+        only a single SELECT (or EXPLAIN) is accepted, and it runs in a
+        transaction that is always rolled back.
+        """
+        statements = duckdb.extract_statements(sql)
+        if len(statements) != 1:
+            raise ValueError("Run one statement at a time.")
+        if statements[0].type not in READ_STATEMENTS:
+            raise ValueError("Only SELECT queries can be run here; the tables are refreshed from the source files.")
+
+        cur = self.con.cursor()
+        try:
+            cur.execute("BEGIN TRANSACTION")
+            try:
+                return cur.execute(statements[0].query).df()
+            finally:
+                cur.execute("ROLLBACK")
+        finally:
+            cur.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build / refresh the DuckDB copy of the retail tables")
+    parser.add_argument("sql", nargs="?", help="query to run after the refresh")
+    parser.add_argument("--rebuild", action="store_true", help="delete the database file and load everything")
+    args = parser.parse_args()
+
+    if args.rebuild and os.path.exists(DB_PATH):
+        os.remove(DB_PATH)
+
+    db = QueryDB()
+    for name, what in db.refresh().items():
+        print(f"{name}: {what}")
+    if args.sql:
+        print(db.read_query(args.sql).to_string(index=False))
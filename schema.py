@@ -0,0 +1,167 @@
+# =========================
+# Hardcoded schema rules
+# =========================
+
+SCHEMA = {
+    "customers.csv": {
+        "pk": ["customer_id"],
+        "columns": {
+            "customer_id": "string",
+            "gender": "string",
+            "age": "int",
+            "join_date": "date",
+            "loyalty_tier": "string",
+            "region": "string",
+            "city": "string",
+            "preferred_channel": "string",
+        }
+    },
+    "stores.csv": {
+        "pk": ["store_id"],
+        "columns": {
+            "store_id": "string",
+            "store_type": "string",
+            "region": "string",
+            "city": "string",
+            "opening_date": "date",
+        }
+    },
+    "products.csv": {
+        "pk": ["product_id"],
+        "columns": {
+            "product_id": "string",
+            "category": "string",
+            "subcategory": "string",
+            "brand": "string",
+            "unit_price": "float",
+            "unit_cost": "float",
+            "is_discountable": "int",
+        }
+    },
+    "transactions.csv": {
+        "pk": ["transaction_id"],
+        "fk": {
+            "customer_id": ("customers.csv", "customer_id"),
+            "store_id": ("stores.csv", "store_id"),
+            "product_id": ("products.csv", "product_id"),
+        },
+        "columns": {
+            "transaction_id": "string",
+            "customer_id": "string",
+            "store_id": "string",
+            "product_id": "string",
+            "transaction_date": "date",
+            "channel": "string",
+            "quantity": "int",
+            "discount_pct": "float",
+            "year_month": "string",
+        }
+    }
+}
+
+
+# Low-cardinality string columns, loaded as pandas categoricals
+CATEGORICAL_COLUMNS = {
+    "gender", "loyalty_tier", "region", "city", "preferred_channel",
+    "store_type", "category", "subcategory", "brand",
+    "channel", "year_month",
+}
+
+
+# =========================
+# Allowed values (DQ rules + UI widgets)
+# =========================
+DOMAINS = {
+    "gender": ["F", "M", "O"],
+    "loyalty_tier": ["Bronze", "Silver", "Gold", "Platinum"],
+    "channel": ["InStore", "Online", "Mobile"],
+    "region": ["North", "South", "East", "West", "Central"],
+    "store_type": ["Mall", "Street", "Outlet", "OnlineHub"],
+    "category": ["Grocery", "Electronics", "Clothing", "Home", "Beauty", "Sports"],
+    "is_discountable": [0, 1],
+}
+
+
+# =========================
+# Declarative DQ rules
+# =========================
+# Evaluated in order by dq_engine. A rule's position is its bit in
+# rejection_code (stored in rejected_*.csv), so only ever append new rules.
+#
+# kinds:
+#   required     columns must not be null
+#   range        numeric, not null, within [min, max] (min_inclusive=False -> > min)
+#   not_future   date parses and is not after today
+#   unique       not in the existing table and not repeated within the batch
+#   in_set       value is one of values
+#   fk           value exists in ref table's key
+#   not_before   column >= ref_column of the ref row joined on key
+DQ_RULES = {
+    "customers": [
+        {"name": "missing_required", "kind": "required", "message": "Missing required field(s)",
+         "columns": ["customer_id", "gender", "age", "join_date",
+                     "loyalty_tier", "region", "city", "preferred_channel"]},
+        {"name": "bad_age", "kind": "range", "column": "age", "min": 16, "max": 90,
+         "message": "Age out of range (16–90)"},
+        {"name": "bad_join_date", "kind": "not_future", "column": "join_date",
+         "message": "join_date is invalid or in the future"},
+        {"name": "duplicate_customer_id", "kind": "unique", "column": "customer_id",
+         "message": "customer_id not unique"},
+        {"name": "bad_gender", "kind": "in_set", "column": "gender", "values": DOMAINS["gender"],
+         "message": "Invalid gender"},
+        {"name": "bad_loyalty_tier", "kind": "in_set", "column": "loyalty_tier", "values": DOMAINS["loyalty_tier"],
+         "message": "Invalid loyalty_tier"},
+        {"name": "bad_preferred_channel", "kind": "in_set", "column": "preferred_channel", "values": DOMAINS["channel"],
+         "message": "Invalid preferred_channel"},
+        {"name": "bad_region", "kind": "in_set", "column": "region", "values": DOMAINS["region"],
+         "message": "Invalid region"},
+    ],
+    "stores": [
+        {"name": "missing_required", "kind": "required", "message": "Missing required field(s)",
+         "columns": ["store_id", "store_type", "region", "city", "opening_date"]},
+        {"name": "duplicate_store_id", "kind": "unique", "column": "store_id",
+         "message": "store_id not unique"},
+        {"name": "bad_opening_date", "kind": "not_future", "column": "opening_date",
+         "message": "opening_date is invalid or in the future"},
+        {"name": "bad_store_type", "kind": "in_set", "column": "store_type", "values": DOMAINS["store_type"],
+         "message": "Invalid store_type"},
+        {"name": "bad_region", "kind": "in_set", "column": "region", "values": DOMAINS["region"],
+         "message": "Invalid region"},
+    ],
+    "products": [
+        {"name": "missing_required", "kind": "required", "message": "Missing required field(s)",
+         "columns": ["product_id", "category", "unit_price", "is_discountable"]},
+        {"name": "bad_unit_price", "kind": "range", "column": "unit_price",
+         "min": 0, "min_inclusive": False, "max": 5000,
+         "message": "Invalid unit_price"},
+        {"name": "duplicate_product_id", "kind": "unique", "column": "product_id",
+         "message": "product_id not unique"},
+        {"name": "bad_category", "kind": "in_set", "column": "category", "values": DOMAINS["category"],
+         "message": "Invalid category"},
+        {"name": "bad_is_discountable", "kind": "in_set", "column": "is_discountable",
+         "values": DOMAINS["is_discountable"],
+         "message": "Invalid is_discountable (must be 0/1)"},
+    ],
+    "transactions": [
+        {"name": "missing_required", "kind": "required", "message": "Missing required field(s)",
+         "columns": ["transaction_id", "customer_id", "store_id", "product_id",
+                     "transaction_date", "channel", "quantity", "discount_pct"]},
+        {"name": "duplicate_transaction_id", "kind": "unique", "column": "transaction_id",
+         "message": "transaction_id not unique"},
+        {"name": "bad_quantity", "kind": "range", "column": "quantity", "min": 1, "max": 50,
+         "message": "Invalid quantity (1–50)"},
+        {"name": "bad_discount_pct", "kind": "range", "column": "discount_pct", "min": 0, "max": 0.80,
+         "message": "Invalid discount_pct (0–0.80)"},
+        {"name": "bad_channel", "kind": "in_set", "column": "channel", "values": DOMAINS["channel"],
+         "message": "Invalid channel"},
+        {"name": "unknown_customer_id", "kind": "fk", "column": "customer_id", "ref": "customers",
+         "message": "customer_id does not exist"},
+        {"name": "unknown_store_id", "kind": "fk", "column": "store_id", "ref": "stores",
+         "message": "store_id does not exist"},
+        {"name": "unknown_product_id", "kind": "fk", "column": "product_id", "ref": "products",
+         "message": "product_id does not exist"},
+        {"name": "before_store_opening", "kind": "not_before", "column": "transaction_date",
+         "ref": "stores", "key": "store_id", "ref_column": "opening_date",
+         "message": "transaction_date is before store opening_date"},
+    ],
+}
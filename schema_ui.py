@@ -2,67 +2,7 @@ import pandas as pd
 import streamlit as st
 from graphviz import Digraph
 
-
-# =========================
-# Hardcoded schema rules
-# =========================
-
-SCHEMA = {
-    "customers.csv": {
-        "pk": ["customer_id"],
-        "columns": {
-            "customer_id": "string",
-            "gender": "string",
-            "age": "int",
-            "join_date": "date",
-            "loyalty_tier": "string",
-            "region": "string",
-            "city": "string",
-            "preferred_channel": "string",
-        }
-    },
-    "stores.csv": {
-        "pk": ["store_id"],
-        "columns": {
-            "store_id": "string",
-            "store_type": "string",
-            "region": "string",
-            "city": "string",
-            "opening_date": "date",
-        }
-    },
-    "products.csv": {
-        "pk": ["product_id"],
-        "columns": {
-            "product_id": "string",
-            "category": "string",
-            "subcategory": "string",
-            "brand": "string",
-            "unit_price": "float",
-            "unit_cost": "float",
-            "is_discountable": "int",
-        }
-    },
-    "transactions.csv": {
-        "pk": ["transaction_id"],
-        "fk": {
-            "customer_id": ("customers.csv", "customer_id"),
-            "store_id": ("stores.csv", "store_id"),
-            "product_id": ("products.csv", "product_id"),
-        },
-        "columns": {
-            "transaction_id": "string",
-            "customer_id": "string",
-            "store_id": "string",
-            "product_id": "string",
-            "transaction_date": "date",
-            "channel": "string",
-            "quantity": "int",
-            "discount_pct": "float",
-            "year_month": "string",
-        }
-    }
-}
+from schema import SCHEMA
 
 
 # =========================
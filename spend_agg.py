@@ -0,0 +1,141 @@
+import pandas as pd
+
+
+# =========================
+# Customer x category x store x month spend cube
+# =========================
+# spend = quantity * unit_price * (1 - discount_pct). The cube is kept next
+# to the tables and updated with every appended batch, so loyalty tiers and
+# the spend dashboards read a few thousand cube rows instead of every
+# transaction.
+CUBE_KEYS = ["customer_id", "category", "store_id", "year_month"]
+CUBE_MEASURES = ["spend", "quantity", "tx_count", "discount_sum"]
+CUBE_COLUMNS = CUBE_KEYS + CUBE_MEASURES
+
+SPEND_COLUMNS = ["customer_id", "year_month", "monthly_spend"]
+
+
+def _by_product(products: pd.DataFrame, column):
+    values = pd.Series(products[column].values, index=products["product_id"].astype(str))
+    return values[~values.index.duplicated()]
+
+
+def transaction_spend(transactions: pd.DataFrame, products: pd.DataFrame) -> pd.Series:
+    price = pd.to_numeric(_by_product(products, "unit_price"), errors="coerce")
+
+    unit_price = transactions["product_id"].astype(str).map(price).fillna(0)
+    quantity = pd.to_numeric(transactions["quantity"], errors="coerce").fillna(0)
+    discount = pd.to_numeric(transactions["discount_pct"], errors="coerce").fillna(0)
+    return quantity * unit_price * (1 - discount)
+
+
+def spend_cube(transactions: pd.DataFrame, products: pd.DataFrame) -> pd.DataFrame:
+    if len(transactions) == 0:
+        return pd.DataFrame(columns=CUBE_COLUMNS)
+
+    dates = pd.to_datetime(transactions["transaction_date"], errors="coerce")
+    product_ids = transactions["product_id"].astype(str)
+    tx = pd.DataFrame({
+        "customer_id": transactions["customer_id"].astype(str).values,
+        "category": product_ids.map(_by_product(products, "category").astype(str)).values,
+        "store_id": transactions["store_id"].astype(str).values,
+        "year_month": dates.dt.to_period("M").astype(str).values,
+        "spend": transaction_spend(transactions, products).values,
+        "quantity": pd.to_numeric(transactions["quantity"], errors="coerce").fillna(0).values,
+        "discount_sum": pd.to_numeric(transactions["discount_pct"], errors="coerce").fillna(0).values,
+    })
+    return (
+        tx.groupby(CUBE_KEYS, dropna=False)
+          .agg(
+              spend=("spend", "sum"),
+              quantity=("quantity", "sum"),
+              tx_count=("spend", "size"),
+              discount_sum=("discount_sum", "sum"),
+          )
+          .reset_index()
+    )
+
+
+def add_to_cube(cube: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+    """Fold the cube of a new batch into the running one (only touched cells change)."""
+    if len(delta) == 0:
+        return cube
+    if len(cube) == 0:
+        return delta[CUBE_COLUMNS].reset_index(drop=True)
+
+    both = pd.concat([cube[CUBE_COLUMNS], delta[CUBE_COLUMNS]], ignore_index=True)
+    for c in CUBE_KEYS:
+        # Categorical / string dtypes read back from disk vs plain objects
+        both[c] = both[c].astype("object")
+    return both.groupby(CUBE_KEYS, dropna=False, as_index=False)[CUBE_MEASURES].sum()
+
+
+def cube_monthly_spend(cube: pd.DataFrame) -> pd.DataFrame:
+    """customer_id, year_month, monthly_spend rolled up from the cube."""
+    if len(cube) == 0:
+        return pd.DataFrame(columns=SPEND_COLUMNS)
+    keys = [cube["customer_id"].astype(str), cube["year_month"].astype(str)]
+    monthly = cube.groupby(keys)["spend"].sum()
+    return monthly.rename("monthly_spend").rename_axis(["customer_id", "year_month"]).reset_index()
+
+
+def monthly_spend(transactions: pd.DataFrame, products: pd.DataFrame) -> pd.DataFrame:
+    return cube_monthly_spend(spend_cube(transactions, products))
+
+
+# =========================
+# Short-term spend features (Xgboost/short_term_spend_model_data.csv)
+# =========================
+FEATURE_COLUMNS = [
+    "customer_id", "transaction_date", "daily_spend", "total_qty", "avg_price",
+    "transactions", "avg_discount", "next_30d_spend",
+    "region", "city", "gender", "age", "store_type",
+]
+
+STATIC_FEATURE_COLUMNS = ["region", "city", "gender", "age", "store_type"]
+
+
+def daily_spend_features(merged: pd.DataFrame) -> pd.DataFrame:
+    """
+    One row per customer and day with the next-30-rows spend target, as built
+    in Xgboost/Data Preparation.ipynb (same formulas, so the saved model's
+    inputs can be regenerated).
+    """
+    df = merged.copy()
+    df["transaction_date"] = pd.to_datetime(df["transaction_date"], errors="coerce")
+    df["unit_price"] = pd.to_numeric(df["unit_price"], errors="coerce")
+    df["quantity"] = pd.to_numeric(df["quantity"], errors="coerce")
+    df["discount_pct"] = pd.to_numeric(df["discount_pct"], errors="coerce")
+    # The notebook divides by 100; kept so features match the trained model
+    df["spend"] = df["unit_price"] * df["quantity"] * (1 - df["discount_pct"] / 100)
+
+    daily = (
+        df.groupby(["customer_id", "transaction_date"], observed=True)
+          .agg(
+              daily_spend=("spend", "sum"),
+              total_qty=("quantity", "sum"),
+              avg_price=("unit_price", "mean"),
+              transactions=("spend", "count"),
+              avg_discount=("discount_pct", "mean"),
+          )
+          .reset_index()
+          .sort_values(["customer_id", "transaction_date"])
+          .reset_index(drop=True)
+    )
+
+    by_customer = daily["customer_id"]
+    following = daily.groupby(by_customer, observed=True)["daily_spend"].shift(-1)
+    daily["next_30d_spend"] = (
+        following.groupby(by_customer, observed=True)
+                 .rolling(window=30).sum()
+                 .reset_index(level=0, drop=True)
+    )
+    daily = daily.dropna(subset=["next_30d_spend"])
+
+    static = (
+        df.sort_values("transaction_date", kind="stable")
+          .groupby("customer_id", observed=True)[STATIC_FEATURE_COLUMNS]
+          .last()
+          .reset_index()
+    )
+    return daily.merge(static, on="customer_id", how="left")[FEATURE_COLUMNS].reset_index(drop=True)
@@ -0,0 +1,99 @@
+import os
+
+import pandas as pd
+
+from io_utils import (
+    REJ_TRANSACTIONS_CSV,
+    load_table,
+    load_key_index,
+    append_table,
+    append_rejections,
+    append_merged,
+    table_exists,
+    data_lock,
+)
+from key_index import PendingKeys
+from dq_transactions import dq_transactions
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+def _source_size(source):
+    size = getattr(source, "size", None)
+    if size is None:
+        try:
+            size = os.fstat(source.fileno()).st_size
+        except (AttributeError, OSError):
+            size = None
+    return size
+
+
+def stream_validate_transactions(source, chunksize=DEFAULT_CHUNKSIZE, on_progress=None,
+                                 update_merged=True, sample_rejected=50):
+    """
+    Validate and append a transactions file chunk by chunk.
+
+    Only one chunk is in memory at a time. The accepted transaction_ids of
+    each chunk are added to the saved key index as it is appended (one new
+    sorted segment, read back memory-mapped), and only the ids of rejected
+    rows are held in memory, so duplicates across chunk boundaries are
+    still rejected. on_progress(fraction, stats) is called after every
+    chunk.
+    """
+    if isinstance(source, str):
+        with open(source, "rb") as f:
+            return stream_validate_transactions(f, chunksize, on_progress, update_merged, sample_rejected)
+
+    # Keys are checked against the indexes loaded here, so no other writer
+    # may append until the whole upload is in
+    with data_lock():
+        return _stream_validate(source, chunksize, on_progress, update_merged, sample_rejected)
+
+
+def _stream_validate(source, chunksize, on_progress, update_merged, sample_rejected):
+    tx_keys = PendingKeys(load_key_index("transactions", "transaction_id"))
+    customer_keys = load_key_index("customers", "customer_id")
+    product_keys = load_key_index("products", "product_id")
+    stores = load_table("stores")
+
+    customers = products = None
+    if update_merged and table_exists("merged_transactions"):
+        customers = load_table("customers")
+        products = load_table("products")
+    else:
+        update_merged = False
+
+    total_size = _source_size(source)
+    stats = {"chunks": 0, "rows": 0, "accepted": 0, "rejected": 0}
+    rejected_sample = []
+
+    for chunk in pd.read_csv(source, chunksize=chunksize):
+        accepted, rejected = dq_transactions(chunk, tx_keys, customer_keys, stores, product_keys)
+
+        # Later chunks must see every id read so far, accepted or not:
+        # accepted ones through the index, rejected ones in memory
+        append_table("transactions", accepted)
+        if len(accepted):
+            tx_keys.index = load_key_index("transactions", "transaction_id")
+        tx_keys.add(rejected["transaction_id"] if "transaction_id" in rejected.columns else [])
+
+        append_rejections(REJ_TRANSACTIONS_CSV, rejected)
+        if update_merged:
+            append_merged(customers, stores, products, accepted)
+
+        if sum(len(r) for r in rejected_sample) < sample_rejected:
+            rejected_sample.append(rejected.head(sample_rejected))
+
+        stats["chunks"] += 1
+        stats["rows"] += len(chunk)
+        stats["accepted"] += len(accepted)
+        stats["rejected"] += len(rejected)
+
+        if on_progress is not None:
+            fraction = None
+            if total_size and hasattr(source, "tell"):
+                fraction = min(source.tell() / total_size, 1.0)
+            on_progress(fraction, stats)
+
+    rejected_head = pd.concat(rejected_sample, ignore_index=True) if rejected_sample else pd.DataFrame()
+    return stats, rejected_head.head(sample_rejected)
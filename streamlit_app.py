@@ -5,22 +5,34 @@ import pandas as pd
 import streamlit as st
 
 from io_utils import (
-    CUSTOMERS_CSV, STORES_CSV, PRODUCTS_CSV, TRANSACTIONS_CSV,
-    MERGED_CSV,
     REJ_CUSTOMERS_CSV, REJ_STORES_CSV, REJ_PRODUCTS_CSV, REJ_TRANSACTIONS_CSV,
     ensure_dir,
-    load_or_empty,
-    append_rows,
+    table_exists,
+    table_row_count,
+    read_tail,
     append_rejections,
-    rebuild_merged
+    TableCache,
+    memory_report,
+    data_lock,
+    load_key_index,
 )
 
 from dq_customers import dq_customers
 from dq_stores import dq_stores
 from dq_products import dq_products
-from loyalty_update import update_loyalty_tiers
+from loyalty_update import apply_loyalty_after_ingest
 
 from dq_transactions import dq_transactions
+from schema import DOMAINS
+from dq_engine import stats_frame
+from dq_codes import RULES, REJECTIONS_CSV, with_reason_text, load_rejections
+from bulk_ingest import collect_sources
+from stream_ingest import DEFAULT_CHUNKSIZE
+from pipeline import run_pipeline
+from ingest_jobs import IngestWorker, submit_job, list_jobs, rejected_sample, QUEUED, RUNNING, DONE
+
+# Uploads above this size default to chunked streaming validation
+STREAM_THRESHOLD_BYTES = 50 * 1024 ** 2
 
 
 # =========================
@@ -36,24 +48,38 @@ st.caption("Upload CSVs or add rows manually. Data Quality rules validate and ap
 # =========================
 # Load existing tables
 # =========================
-customers_existing = load_or_empty(CUSTOMERS_CSV, [
-    "customer_id", "gender", "age", "join_date", "loyalty_tier",
-    "region", "city", "preferred_channel"
-])
+# One cache for all sessions; a table is re-read only when its file changed
+@st.cache_resource
+def table_cache():
+    return TableCache()
+
+
+tables = table_cache()
+
+
+# Uploads run as queued jobs on one background thread per process
+@st.cache_resource
+def ingest_worker():
+    return IngestWorker(table_cache()).start()
+
+
+worker = ingest_worker()
+
 
-stores_existing = load_or_empty(STORES_CSV, [
-    "store_id", "store_type", "region", "city", "opening_date"
-])
+def queue_upload(table, up, options=None):
+    job_id = submit_job("append", [(up.name, up.getvalue())], table=table, options=options)
+    worker.wake()
+    st.success(f"Queued job {job_id}. Progress and results are in the Jobs tab.")
 
-products_existing = load_or_empty(PRODUCTS_CSV, [
-    "product_id", "category", "subcategory", "brand",
-    "unit_price", "unit_cost", "is_discountable"
-])
 
-transactions_existing = load_or_empty(TRANSACTIONS_CSV, [
-    "transaction_id", "customer_id", "store_id", "product_id",
-    "transaction_date", "channel", "quantity", "discount_pct", "year_month"
-])
+def update_loyalty(transactions_new=None):
+    # Tiers / merged after a transactions append; updated customers go to the cache
+    with data_lock():
+        customers, info = apply_loyalty_after_ingest(
+            tables.get("customers"), tables.get("stores"), tables.get("products"), transactions_new
+        )
+        tables.put("customers", customers)
+    return info
 
 
 # =========================
@@ -61,16 +87,38 @@ transactions_existing = load_or_empty(TRANSACTIONS_CSV, [
 # =========================
 with st.sidebar:
     st.subheader("Current dataset sizes")
-    st.write("Customers:", len(customers_existing))
-    st.write("Stores:", len(stores_existing))
-    st.write("Products:", len(products_existing))
-    st.write("Transactions:", len(transactions_existing))
+    # Saved row counts: no table is loaded to draw the sidebar
+    st.write("Customers:", table_row_count("customers"))
+    st.write("Stores:", table_row_count("stores"))
+    st.write("Products:", table_row_count("products"))
+    st.write("Transactions:", table_row_count("transactions"))
+
+    with st.expander("Memory usage"):
+        # Loads the tables (once per process, via the cache)
+        if st.button("Measure memory"):
+            names = ["customers", "stores", "products", "transactions"]
+            st.dataframe(memory_report({name: tables.get(name, stale_ok=True) for name in names}),
+                         hide_index=True, use_container_width=True)
+
+    st.divider()
+
+    with st.expander("Rejected rows by rule"):
+        rej_table = st.selectbox("Table", list(RULES), key="rej_table")
+        rule_names = [name for name, _ in RULES[rej_table]]
+        rej_rule = st.selectbox("Rule", ["(any)"] + rule_names, key="rej_rule")
+
+        if os.path.exists(REJECTIONS_CSV[rej_table]):
+            rej_df = load_rejections(rej_table, None if rej_rule == "(any)" else rej_rule)
+            st.write("Rows:", len(rej_df))
+            st.dataframe(rej_df.tail(50), use_container_width=True)
+        else:
+            st.caption("No rejections logged yet.")
 
     st.divider()
 
     if st.button("Rebuild merged_transactions.csv"):
-        merged = rebuild_merged(customers_existing, stores_existing, products_existing, transactions_existing)
-        st.success(f"Merged rebuilt. Rows: {len(merged)}")
+        report = run_pipeline(start="merge", stop="merge", force=True)
+        st.success(f"Merged rebuilt. Rows: {report[0]['info']['rows']}")
 
 
 st.divider()
@@ -79,8 +127,8 @@ st.divider()
 # =========================
 # Tabs
 # =========================
-tab_customers, tab_stores, tab_products, tab_transactions = st.tabs(
-    ["Customers", "Stores", "Products", "Transactions"]
+tab_customers, tab_stores, tab_products, tab_transactions, tab_bulk, tab_jobs = st.tabs(
+    ["Customers", "Stores", "Products", "Transactions", "Bulk ingest", "Jobs"]
 )
 
 
@@ -104,19 +152,12 @@ with tab_customers:
         up = st.file_uploader("Upload customers CSV", type=["csv"], key="cust_upload")
 
         if up is not None:
-            df_new = pd.read_csv(up)
             st.write("Preview:")
-            st.dataframe(df_new.head(20), use_container_width=True)
+            st.dataframe(pd.read_csv(up, nrows=20), use_container_width=True)
+            up.seek(0)
 
             if st.button("Validate & Append Customers"):
-                accepted, rejected = dq_customers(df_new, customers_existing)
-
-                append_rows(CUSTOMERS_CSV, accepted)
-                append_rejections(REJ_CUSTOMERS_CSV, rejected)
-
-                st.success(f"Accepted: {len(accepted)} | Rejected: {len(rejected)}")
-                if len(rejected):
-                    st.dataframe(rejected.head(50), use_container_width=True)
+                queue_upload("customers", up)
 
     else:
         with st.form("cust_form"):
@@ -124,13 +165,13 @@ with tab_customers:
 
             with c1:
                 customer_id = st.text_input("customer_id", value="C00999")
-                gender = st.selectbox("gender", ["F", "M", "O"])
+                gender = st.selectbox("gender", DOMAINS["gender"])
                 age = st.number_input("age", min_value=16, max_value=90, value=30)
 
             with c2:
-                loyalty_tier = st.selectbox("loyalty_tier", ["Bronze", "Silver", "Gold", "Platinum"])
-                preferred_channel = st.selectbox("preferred_channel", ["InStore", "Online", "Mobile"])
-                region = st.selectbox("region", ["North", "South", "East", "West", "Central"])
+                loyalty_tier = st.selectbox("loyalty_tier", DOMAINS["loyalty_tier"])
+                preferred_channel = st.selectbox("preferred_channel", DOMAINS["channel"])
+                region = st.selectbox("region", DOMAINS["region"])
 
             with c3:
                 city = st.text_input("city", value="Midtown")
@@ -150,16 +191,17 @@ with tab_customers:
                 "preferred_channel": preferred_channel,
             }])
 
-            accepted, rejected = dq_customers(df_new, customers_existing)
+            with data_lock():
+                accepted, rejected = dq_customers(df_new, load_key_index("customers", "customer_id"))
 
-            append_rows(CUSTOMERS_CSV, accepted)
-            append_rejections(REJ_CUSTOMERS_CSV, rejected)
+                tables.append_table("customers", accepted)
+                append_rejections(REJ_CUSTOMERS_CSV, rejected)
 
             if len(accepted):
                 st.success("Customer accepted and appended.")
             else:
                 st.error("Customer rejected.")
-                st.dataframe(rejected, use_container_width=True)
+                st.dataframe(with_reason_text(rejected, "customers"), use_container_width=True)
 
 
 # ==========================================================
@@ -181,19 +223,12 @@ with tab_stores:
         up = st.file_uploader("Upload stores CSV", type=["csv"], key="store_upload")
 
         if up is not None:
-            df_new = pd.read_csv(up)
             st.write("Preview:")
-            st.dataframe(df_new.head(20), use_container_width=True)
+            st.dataframe(pd.read_csv(up, nrows=20), use_container_width=True)
+            up.seek(0)
 
             if st.button("Validate & Append Stores"):
-                accepted, rejected = dq_stores(df_new, stores_existing)
-
-                append_rows(STORES_CSV, accepted)
-                append_rejections(REJ_STORES_CSV, rejected)
-
-                st.success(f"Accepted: {len(accepted)} | Rejected: {len(rejected)}")
-                if len(rejected):
-                    st.dataframe(rejected.head(50), use_container_width=True)
+                queue_upload("stores", up)
 
     else:
         with st.form("store_form"):
@@ -201,10 +236,10 @@ with tab_stores:
 
             with c1:
                 store_id = st.text_input("store_id", value="S999")
-                store_type = st.selectbox("store_type", ["Mall", "Street", "Outlet", "OnlineHub"])
+                store_type = st.selectbox("store_type", DOMAINS["store_type"])
 
             with c2:
-                region = st.selectbox("region", ["North", "South", "East", "West", "Central"], key="store_region")
+                region = st.selectbox("region", DOMAINS["region"], key="store_region")
                 city = st.text_input("city", value="Centrum")
 
             with c3:
@@ -221,16 +256,17 @@ with tab_stores:
                 "opening_date": str(opening_date),
             }])
 
-            accepted, rejected = dq_stores(df_new, stores_existing)
+            with data_lock():
+                accepted, rejected = dq_stores(df_new, load_key_index("stores", "store_id"))
 
-            append_rows(STORES_CSV, accepted)
-            append_rejections(REJ_STORES_CSV, rejected)
+                tables.append_table("stores", accepted)
+                append_rejections(REJ_STORES_CSV, rejected)
 
             if len(accepted):
                 st.success("Store accepted and appended.")
             else:
                 st.error("Store rejected.")
-                st.dataframe(rejected, use_container_width=True)
+                st.dataframe(with_reason_text(rejected, "stores"), use_container_width=True)
 
 
 # ==========================================================
@@ -253,19 +289,12 @@ with tab_products:
         up = st.file_uploader("Upload products CSV", type=["csv"], key="prod_upload")
 
         if up is not None:
-            df_new = pd.read_csv(up)
             st.write("Preview:")
-            st.dataframe(df_new.head(20), use_container_width=True)
+            st.dataframe(pd.read_csv(up, nrows=20), use_container_width=True)
+            up.seek(0)
 
             if st.button("Validate & Append Products"):
-                accepted, rejected = dq_products(df_new, products_existing)
-
-                append_rows(PRODUCTS_CSV, accepted)
-                append_rejections(REJ_PRODUCTS_CSV, rejected)
-
-                st.success(f"Accepted: {len(accepted)} | Rejected: {len(rejected)}")
-                if len(rejected):
-                    st.dataframe(rejected.head(50), use_container_width=True)
+                queue_upload("products", up)
 
     else:
         with st.form("prod_form"):
@@ -273,7 +302,7 @@ with tab_products:
 
             with c1:
                 product_id = st.text_input("product_id", value="P9999")
-                category = st.selectbox("category", ["Grocery", "Electronics", "Clothing", "Home", "Beauty", "Sports"])
+                category = st.selectbox("category", DOMAINS["category"])
                 unit_price = st.number_input("unit_price", min_value=0.5, max_value=5000.0, value=25.0)
 
             with c2:
@@ -281,7 +310,7 @@ with tab_products:
                 brand = st.text_input("brand", value="Nova")
 
             with c3:
-                is_discountable = st.selectbox("is_discountable", [0, 1])
+                is_discountable = st.selectbox("is_discountable", DOMAINS["is_discountable"])
                 unit_cost = st.number_input("unit_cost", min_value=0.0, max_value=5000.0, value=12.0)
 
             submitted = st.form_submit_button("Validate & Append")
@@ -297,16 +326,17 @@ with tab_products:
                 "is_discountable": is_discountable,
             }])
 
-            accepted, rejected = dq_products(df_new, products_existing)
+            with data_lock():
+                accepted, rejected = dq_products(df_new, load_key_index("products", "product_id"))
 
-            append_rows(PRODUCTS_CSV, accepted)
-            append_rejections(REJ_PRODUCTS_CSV, rejected)
+                tables.append_table("products", accepted)
+                append_rejections(REJ_PRODUCTS_CSV, rejected)
 
             if len(accepted):
                 st.success("Product accepted and appended.")
             else:
                 st.error("Product rejected.")
-                st.dataframe(rejected, use_container_width=True)
+                st.dataframe(with_reason_text(rejected, "products"), use_container_width=True)
 
 
 # ==========================================================
@@ -331,41 +361,20 @@ with tab_transactions:
         up = st.file_uploader("Upload transactions CSV", type=["csv"], key="tx_upload")
 
         if up is not None:
-            df_new = pd.read_csv(up)
-            st.write("Preview:")
-            st.dataframe(df_new.head(20), use_container_width=True)
-
-            if st.button("Validate & Append Transactions"):
-                accepted, rejected = dq_transactions(
-                    df_new,
-                    transactions_existing,
-                    customers_existing,
-                    stores_existing,
-                    products_existing,
-                )
-
-                append_rows(TRANSACTIONS_CSV, accepted)
-                append_rejections(REJ_TRANSACTIONS_CSV, rejected)
+            stream = st.checkbox("Stream in chunks (large files)",
+                                 value=up.size > STREAM_THRESHOLD_BYTES, key="tx_stream")
 
-                st.success(f"Accepted: {len(accepted)} | Rejected: {len(rejected)}")
-                if len(rejected):
-                    st.dataframe(rejected.head(50), use_container_width=True)
-
-                # Reload + rebuild merged
-                customers_existing = pd.read_csv(CUSTOMERS_CSV)
-                stores_existing = pd.read_csv(STORES_CSV)
-                products_existing = pd.read_csv(PRODUCTS_CSV)
-                transactions_existing = pd.read_csv(TRANSACTIONS_CSV)
-
-                customers_updated = update_loyalty_tiers(customers_existing, transactions_existing, products_existing)
-                customers_updated.to_csv(CUSTOMERS_CSV, index=False)
-
-                customers_existing = pd.read_csv(CUSTOMERS_CSV)
+            st.write("Preview:")
+            st.dataframe(pd.read_csv(up, nrows=20), use_container_width=True)
+            up.seek(0)
 
-                merged = rebuild_merged(customers_existing, stores_existing, products_existing, transactions_existing)
+            if stream:
+                chunksize = st.number_input("Rows per chunk", min_value=1_000, value=DEFAULT_CHUNKSIZE,
+                                            step=10_000, key="tx_chunksize")
 
-                st.success("merged_transactions.csv updated + loyalty tiers recalculated ")
-                st.info(f"Merged rows: {len(merged)}")
+            if st.button("Validate & Append Transactions"):
+                options = {"stream": True, "chunksize": int(chunksize)} if stream else {}
+                queue_upload("transactions", up, options)
 
 
     else:
@@ -379,7 +388,7 @@ with tab_transactions:
 
             with c2:
                 product_id = st.text_input("product_id", value="P0001")
-                channel = st.selectbox("channel", ["InStore", "Online", "Mobile"])
+                channel = st.selectbox("channel", DOMAINS["channel"])
                 transaction_date = st.date_input("transaction_date", value=datetime(2025, 12, 1))
 
             with c3:
@@ -400,32 +409,107 @@ with tab_transactions:
                 "discount_pct": discount_pct,
             }])
 
-            accepted, rejected = dq_transactions(
-                df_new,
-                transactions_existing,
-                customers_existing,
-                stores_existing,
-                products_existing,
-            )
+            with data_lock():
+                accepted, rejected = dq_transactions(
+                    df_new,
+                    load_key_index("transactions", "transaction_id"),
+                    load_key_index("customers", "customer_id"),
+                    tables.get("stores"),
+                    load_key_index("products", "product_id"),
+                )
 
-            append_rows(TRANSACTIONS_CSV, accepted)
-            append_rejections(REJ_TRANSACTIONS_CSV, rejected)
+                tables.append_table("transactions", accepted)
+                append_rejections(REJ_TRANSACTIONS_CSV, rejected)
 
             if len(accepted):
                 st.success("Transaction accepted and appended.")
 
-                # Reload + rebuild merged
-                customers_existing = pd.read_csv(CUSTOMERS_CSV)
-                stores_existing = pd.read_csv(STORES_CSV)
-                products_existing = pd.read_csv(PRODUCTS_CSV)
-                transactions_existing = pd.read_csv(TRANSACTIONS_CSV)
-
-                merged = rebuild_merged(customers_existing, stores_existing, products_existing, transactions_existing)
-                st.info(f"merged_transactions.csv updated. Rows: {len(merged)}")
+                # Join only the new row into merged; tiers come from the spend aggregate
+                info = update_loyalty(accepted)
+                if "merged_rebuilt" in info:
+                    st.info(f"merged_transactions.csv rebuilt. Rows: {info['merged_rebuilt']}")
+                else:
+                    st.info(f"merged_transactions.csv updated. Rows appended: {info['merged_appended']} | Tier changes: {info['tier_changes']}")
 
             else:
                 st.error("Transaction rejected.")
-                st.dataframe(rejected, use_container_width=True)
+                st.dataframe(with_reason_text(rejected, "transactions"), use_container_width=True)
+
+
+# ==========================================================
+# BULK INGEST TAB
+# ==========================================================
+with tab_bulk:
+    st.subheader("Bulk Ingest (all tables in one pass)")
+    st.markdown("""
+- Upload any mix of customers / stores / products / transactions CSVs, or a zip of them  
+- The table is taken from each file name (e.g. `customers_2025-12.csv`)  
+- Dimension tables are validated in parallel; transactions are checked against existing + newly accepted keys  
+- Nothing is written until every file has been validated  
+    """)
+
+    ups = st.file_uploader("Upload CSV / zip files", type=["csv", "zip"],
+                           accept_multiple_files=True, key="bulk_upload")
+
+    if ups:
+        files = [(u.name, u.getvalue()) for u in ups]
+        sources = collect_sources(files)
+        st.write({t: [name for name, _ in srcs] for t, srcs in sources.items()})
+
+        if st.button("Validate & Append All"):
+            job_id = submit_job("bulk", files)
+            worker.wake()
+            st.success(f"Queued job {job_id}. Progress and results are in the Jobs tab.")
+
+
+# ==========================================================
+# JOBS TAB
+# ==========================================================
+def show_jobs():
+    jobs = list_jobs(limit=20)
+    active = sum(j["status"] in (QUEUED, RUNNING) for j in jobs)
+    st.write(f"Queued / running: {active}" + ("" if worker.is_alive() else " (worker not running)"))
+
+    if not jobs:
+        st.caption("No jobs yet. Uploads are queued here.")
+
+    for job in jobs:
+        target = job["table"] or job["kind"]
+        with st.expander(f"{job['submitted_at']} | {target} | {', '.join(job['files'])} | {job['status']}",
+                         expanded=job["status"] == RUNNING):
+            for stage in job["stages"]:
+                info = ", ".join(f"{k}: {v}" for k, v in stage["info"].items())
+                st.progress(min(float(stage["progress"]), 1.0), text=f"{stage['name']} ({stage['status']}) {info}")
+
+            if job["error"]:
+                st.error(job["error"])
+
+            if job["status"] == DONE:
+                result = job["result"]
+                st.write({k: v for k, v in result.items() if k not in ("rule_stats", "log")})
+
+                rejected = rejected_sample(job["id"])
+                if len(rejected) and "table" in rejected.columns:
+                    for t, rej in rejected.groupby("table"):
+                        st.markdown(f"**Rejected {t}**")
+                        st.dataframe(with_reason_text(rej.drop(columns="table").dropna(axis=1, how="all"), t),
+                                     use_container_width=True)
+                elif len(rejected):
+                    st.dataframe(with_reason_text(rejected, job["table"]), use_container_width=True)
+
+                if result.get("rule_stats"):
+                    st.dataframe(stats_frame(result["rule_stats"]), hide_index=True, use_container_width=True)
+
+
+# Re-polls the job files every 2s without rerunning the whole page
+if hasattr(st, "fragment"):
+    show_jobs = st.fragment(run_every=2)(show_jobs)
+
+with tab_jobs:
+    st.subheader("Ingestion jobs")
+    show_jobs()
+    if not hasattr(st, "fragment"):
+        st.button("Refresh")
 
 
 # =========================
@@ -433,9 +517,13 @@ with tab_transactions:
 # =========================
 st.divider()
 
-if os.path.exists(MERGED_CSV):
+if table_exists("merged_transactions"):
     st.subheader("Merged Transactions Preview")
-    merged_now = pd.read_csv(MERGED_CSV)
-    st.dataframe(merged_now.tail(30), use_container_width=True)
+    try:
+        # A running job may be rewriting merged; don't wait for it
+        with data_lock(shared=True, blocking=False):
+            st.dataframe(read_tail("merged_transactions", 30), use_container_width=True)
+    except BlockingIOError:
+        st.caption("merged_transactions is being updated by an ingestion job; the preview shows on the next refresh.")
 else:
     st.info("merged_transactions.csv not found yet. Click rebuild in sidebar.")
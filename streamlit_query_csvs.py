@@ -1,38 +1,26 @@
 import streamlit as st
-import pandas as pd
-import duckdb
-import os
 
-DATA_DIR = "synthetic_retail"
-
-CSV_FILES = {
-    "customers": os.path.join(DATA_DIR, "customers.csv"),
-    "stores": os.path.join(DATA_DIR, "stores.csv"),
-    "products": os.path.join(DATA_DIR, "products.csv"),
-    "transactions": os.path.join(DATA_DIR, "transactions.csv"),
-    "merged_transactions": os.path.join(DATA_DIR, "merged_transactions.csv"),
-}
+from query_db import QueryDB, MISSING
 
 st.set_page_config(page_title="CSV Viewer + SQL Query", layout="wide")
 
 st.title(" Retail CSV Viewer + SQL Query Tool")
-st.write("View tables and run SQL queries across customers, stores, products, transactions, merged_transactions.")
+st.write("View tables and run SQL queries across customers, stores, products, transactions, merged_transactions, spend_cube.")
 
 # ---------------------------
 # Load CSVs
 # ---------------------------
-@st.cache_data
-def load_csv(path):
-    return pd.read_csv(path)
-
-tables = {}
-missing = []
-
-for name, path in CSV_FILES.items():
-    if os.path.exists(path):
-        tables[name] = load_csv(path)
-    else:
-        missing.append(name)
+# One DuckDB database file (synthetic_retail/retail.<format>.duckdb) and one
+# connection for all sessions. Each rerun only checks the source files;
+# changed tables are reloaded (appends read just the new rows) and derived
+# tables (spend_cube) are rebuilt if stale. Nothing is loaded into pandas.
+@st.cache_resource
+def query_db():
+    return QueryDB()
+
+db = query_db()
+refreshed = db.refresh()
+missing = [name for name, what in refreshed.items() if what == MISSING]
 
 if missing:
     st.warning(f"Missing files: {', '.join(missing)}")
@@ -42,19 +30,21 @@ if missing:
 # ---------------------------
 st.sidebar.header("View Table")
 
-table_name = st.sidebar.selectbox("Choose a CSV table", list(tables.keys()))
+table_name = st.sidebar.selectbox("Choose a CSV table", db.tables())
 
-df = tables[table_name]
+columns = db.columns(table_name)
 
 st.subheader(f"Viewing: {table_name}.csv")
-st.write("Shape:", df.shape)
+st.write("Shape:", (db.row_count(table_name), len(columns)))
 
 # Basic filters
 with st.expander(" Filter options"):
-    cols = st.multiselect("Select columns to display", df.columns.tolist(), default=df.columns.tolist())
+    cols = st.multiselect("Select columns to display", columns, default=columns)
     limit = st.slider("Rows to show", 5, 200, 25)
 
-st.dataframe(df[cols].head(limit), use_container_width=True)
+if cols:
+    col_list = ", ".join(f'"{c}"' for c in cols)
+    st.dataframe(db.query(f'SELECT {col_list} FROM "{table_name}" LIMIT {int(limit)}'), use_container_width=True)
 
 # ---------------------------
 # SQL Query Section
@@ -79,13 +69,7 @@ run = st.button("▶ Run Query")
 
 if run:
     try:
-        con = duckdb.connect(database=":memory:")
-
-        # Register all loaded tables into duckdb
-        for name, d in tables.items():
-            con.register(name, d)
-
-        result = con.execute(query).df()
+        result = db.read_query(query)
 
         st.success(f"Query executed successfully. Rows returned: {len(result)}")
         st.dataframe(result, use_container_width=True)
@@ -113,49 +97,31 @@ col1, col2, col3 = st.columns(3)
 
 with col1:
     if st.button("Top 10 Customers by Spend"):
-        con = duckdb.connect(database=":memory:")
-        for name, d in tables.items():
-            con.register(name, d)
-
         q = """
-        SELECT
-          t.customer_id,
-          SUM(t.quantity * p.unit_price * (1 - t.discount_pct)) AS total_spend
-        FROM transactions t
-        JOIN products p ON t.product_id = p.product_id
-        GROUP BY t.customer_id
+        SELECT customer_id, SUM(spend) AS total_spend
+        FROM spend_cube
+        GROUP BY customer_id
         ORDER BY total_spend DESC
         LIMIT 10;
         """
-        st.dataframe(con.execute(q).df(), use_container_width=True)
+        st.dataframe(db.query(q), use_container_width=True)
 
 with col2:
     if st.button("Transactions per Store"):
-        con = duckdb.connect(database=":memory:")
-        for name, d in tables.items():
-            con.register(name, d)
-
         q = """
-        SELECT store_id, COUNT(*) AS tx_count
-        FROM transactions
+        SELECT store_id, SUM(tx_count) AS tx_count
+        FROM spend_cube
         GROUP BY store_id
         ORDER BY tx_count DESC;
         """
-        st.dataframe(con.execute(q).df(), use_container_width=True)
+        st.dataframe(db.query(q), use_container_width=True)
 
 with col3:
     if st.button("Sales by Category"):
-        con = duckdb.connect(database=":memory:")
-        for name, d in tables.items():
-            con.register(name, d)
-
         q = """
-        SELECT
-          p.category,
-          SUM(t.quantity * p.unit_price * (1 - t.discount_pct)) AS sales
-        FROM transactions t
-        JOIN products p ON t.product_id = p.product_id
-        GROUP BY p.category
+        SELECT category, SUM(spend) AS sales
+        FROM spend_cube
+        GROUP BY category
         ORDER BY sales DESC;
         """
-        st.dataframe(con.execute(q).df(), use_container_width=True)
+        st.dataframe(db.query(q), use_container_width=True)
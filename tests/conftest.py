@@ -0,0 +1,21 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+TABLES = ["customers", "stores", "products", "transactions"]
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    # A copy of the demo tables; io_utils paths are relative to the working
+    # directory
+    os.makedirs(tmp_path / "synthetic_retail")
+    for name in TABLES:
+        shutil.copy(os.path.join(REPO_ROOT, "synthetic_retail", f"{name}.csv"), tmp_path / "synthetic_retail")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import data_generator
+
+
+def _transactions(out_dir, fmt):
+    if fmt == "parquet":
+        df = pd.read_parquet(os.path.join(out_dir, "transactions.parquet"))
+        return df.astype(str).sort_values("transaction_id").reset_index(drop=True)
+    with open(os.path.join(out_dir, "transactions.csv"), "rb") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("fmt", ["csv", "parquet"])
+def test_output_does_not_depend_on_chunksize(tmp_path, monkeypatch, fmt):
+    # Small blocks so chunks of either size cut across block boundaries
+    monkeypatch.setattr(data_generator, "BLOCK_ROWS", 4_000)
+
+    out = {}
+    for chunksize in (1_000, 7_000):
+        out_dir = str(tmp_path / f"chunk-{chunksize}")
+        data_generator.generate(50, 40, 10, 30_000, out_dir=out_dir, fmt=fmt,
+                                chunksize=chunksize, seed=7, shards=2, workers=1)
+        out[chunksize] = _transactions(out_dir, fmt)
+
+    if fmt == "parquet":
+        pd.testing.assert_frame_equal(out[1_000], out[7_000])
+    else:
+        assert out[1_000] == out[7_000]
+
+
+def _dimensions():
+    np.random.seed(3)
+    return (data_generator.generate_customers(200), data_generator.generate_stores(20),
+            data_generator.generate_products(120))
+
+
+def test_category_without_products_is_an_error():
+    customers, stores, products = _dimensions()
+    with pytest.raises(ValueError, match="Beauty"):
+        data_generator.build_sampler(customers, stores, products[products["category"] != "Beauty"])
+
+
+def test_region_without_stores_uses_any_store():
+    customers, stores, products = _dimensions()
+    region = customers["region"].iloc[0]
+    stores = stores[stores["region"] != region].reset_index(drop=True)
+
+    sampler = data_generator.build_sampler(customers, stores, products)
+    tx = data_generator.transactions_for_days(sampler, np.sort(np.random.randint(0, 30, size=5_000)))
+    assert tx["store_id"].astype(str).isin(stores["store_id"]).all()
+    assert (tx["customer_id"].astype(str).map(customers.set_index("customer_id")["region"]) == region).any()
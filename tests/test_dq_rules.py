@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from dq_codes import rule_bit
+from dq_customers import dq_customers
+from dq_products import dq_products
+from dq_stores import dq_stores
+from dq_transactions import dq_transactions
+from fault_injection import NOISE, fault_names, inject_faults, row_codes
+from io_utils import load_table
+from schema import DQ_RULES
+
+DQ_FUNCS = {
+    "customers": dq_customers,
+    "stores": dq_stores,
+    "products": dq_products,
+    "transactions": dq_transactions,
+}
+
+
+def _validate(table, df, existing=None):
+    # A new batch of `table` against the stored dimension tables
+    if table == "transactions":
+        refs = [existing] + [load_table(n) for n in ["customers", "stores", "products"]]
+    else:
+        refs = [existing]
+    return DQ_FUNCS[table](df, *refs)
+
+
+@pytest.mark.parametrize("table", list(DQ_FUNCS))
+def test_demo_tables_pass(data_dir, table):
+    df = load_table(table)
+    accepted, rejected = _validate(table, df)
+    assert len(accepted) == len(df)
+    assert rejected.empty
+
+
+@pytest.mark.parametrize("table", list(DQ_FUNCS))
+def test_injected_faults_are_flagged(data_dir, table):
+    df = load_table(table)
+    if table == "transactions":
+        df = df.head(5_000)
+    # Every rule and in-range noise on half of the rows, several seeds
+    names = fault_names(table)
+    rates = {name: 0.5 / len(names) for name in names}
+
+    for seed in range(3):
+        corrupted, fault_code = inject_faults(df, table, rates, seed=seed)
+        accepted, rejected = _validate(table, corrupted)
+        codes = row_codes(corrupted, rejected)
+
+        assert len(accepted) + len(rejected) == len(corrupted)
+        assert set(accepted.index).isdisjoint(rejected.index)
+
+        # Each faulty row trips (at least) its rule; clean and noise rows pass
+        faulty = fault_code != 0
+        assert ((codes[faulty] & fault_code[faulty]) == fault_code[faulty]).all()
+        assert (codes[~faulty] == 0).all()
+        assert set(accepted.index) == set(np.flatnonzero(~faulty))
+
+        for name in names:
+            if name != NOISE:
+                assert (fault_code == rule_bit(table, name)).any(), name
+
+
+@pytest.mark.parametrize("table", list(DQ_FUNCS))
+def test_stored_keys_are_duplicates(data_dir, table):
+    # Re-sending stored rows trips the primary key rule on every row
+    df = load_table(table).head(200)
+    unique_bit = rule_bit(table, next(rule["name"] for rule in DQ_RULES[table] if rule["kind"] == "unique"))
+    accepted, rejected = _validate(table, df, existing=df)
+    assert accepted.empty
+    assert (rejected["rejection_code"].to_numpy() & unique_bit).all()
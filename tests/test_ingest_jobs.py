@@ -0,0 +1,65 @@
+import os
+import threading
+import time
+
+import ingest_jobs
+from ingest_jobs import DONE, QUEUED, RUNNING, claim_next_job, load_job, recover_jobs, run_job, submit_job
+
+
+def _submit():
+    return submit_job("bulk", [("customers.csv", b"customer_id\n")])
+
+
+def _claim_in_thread():
+    # Claimed by a thread that is gone once this returns
+    out = {}
+    t = threading.Thread(target=lambda: out.update(job=claim_next_job()), name="short-lived-worker")
+    t.start()
+    t.join()
+    return out["job"]
+
+
+def test_job_of_a_finished_thread_is_requeued(data_dir):
+    job_id = _submit()
+    job = _claim_in_thread()
+    assert job["id"] == job_id and job["worker"] == "short-lived-worker"
+    assert load_job(job_id)["status"] == RUNNING
+
+    recover_jobs()
+    assert load_job(job_id)["status"] == QUEUED
+    assert claim_next_job()["id"] == job_id
+
+
+def test_job_with_a_stale_heartbeat_is_requeued(data_dir):
+    job_id = _submit()
+    # Claimed by this (live) thread
+    assert claim_next_job()["id"] == job_id
+
+    recover_jobs()
+    assert load_job(job_id)["status"] == RUNNING
+
+    old = time.time() - ingest_jobs.HEARTBEAT_TIMEOUT - 1
+    os.utime(ingest_jobs._heartbeat_path(job_id), (old, old))
+    recover_jobs()
+    assert load_job(job_id)["status"] == QUEUED
+
+
+def test_running_job_keeps_beating(data_dir, monkeypatch):
+    monkeypatch.setattr(ingest_jobs, "HEARTBEAT_EVERY", 0.05)
+    monkeypatch.setattr(ingest_jobs, "HEARTBEAT_TIMEOUT", 0.5)
+    seen = []
+
+    def slow_bulk_ingest(paths, on_progress=None):
+        # Longer than HEARTBEAT_TIMEOUT; the heartbeat keeps the job claimed
+        for _ in range(10):
+            time.sleep(0.1)
+            recover_jobs()
+            seen.append(load_job(job_id)["status"])
+        return {"frames": {}}
+
+    monkeypatch.setattr(ingest_jobs, "bulk_ingest", slow_bulk_ingest)
+    job_id = _submit()
+    job = run_job(claim_next_job())
+
+    assert job["status"] == DONE
+    assert set(seen) == {RUNNING}
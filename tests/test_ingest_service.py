@@ -0,0 +1,124 @@
+import http.client
+import json
+import os
+import socket
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from io_utils import data_lock
+from ingest_service import IngestService, serve
+
+
+@pytest.fixture
+def server(data_dir):
+    # A long batch window so requests sent together share one batch
+    service, server = serve(port=0, max_wait_ms=500, loyalty_every=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    service.stop()
+
+
+@pytest.fixture
+def service(data_dir):
+    service = IngestService(max_wait_ms=20, loyalty_every=0).start()
+    yield service
+    service.stop()
+
+
+def _new_transactions(suffix, n=10):
+    tx = pd.read_csv(os.path.join("synthetic_retail", "transactions.csv"))
+    df = tx.head(n).copy()
+    df["transaction_id"] += suffix
+    return df
+
+
+def _post(port, df, results, key):
+    con = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    try:
+        con.request("POST", "/ingest/transactions", df.to_csv(index=False), {"Content-Type": "text/csv"})
+        resp = con.getresponse()
+        results[key] = (resp.status, json.loads(resp.read()))
+    finally:
+        con.close()
+
+
+def test_bad_request_does_not_fail_its_batch(server):
+    tx = pd.read_csv(os.path.join("synthetic_retail", "transactions.csv"))
+    good = tx.head(10).copy()
+    good["transaction_id"] += "_good"
+    # tz-aware dates make the store-opening comparison raise
+    bad = tx.tail(10).copy()
+    bad["transaction_id"] += "_bad"
+    bad["transaction_date"] = "2024-01-05T10:00:00+02:00"
+
+    port = server.server_address[1]
+    results = {}
+    threads = []
+    for key, df in [("bad", bad), ("good", good)]:
+        t = threading.Thread(target=_post, args=(port, df, results, key))
+        t.start()
+        threads.append(t)
+        time.sleep(0.05)
+    for t in threads:
+        t.join()
+
+    status, body = results["bad"]
+    assert status == 400
+    assert "TypeError" in body["error"]
+
+    status, body = results["good"]
+    assert status == 200
+    assert body["accepted"] == len(good)
+
+    ids = set(pd.read_csv(os.path.join("synthetic_retail", "transactions.csv"))["transaction_id"])
+    assert set(good["transaction_id"]) <= ids
+    assert not set(bad["transaction_id"]) & ids
+
+
+def test_unparsable_body_is_400(server):
+    port = server.server_address[1]
+    con = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+    con.request("POST", "/ingest/transactions", b"{not json", {"Content-Type": "application/x-ndjson"})
+    resp = con.getresponse()
+    assert resp.status == 400
+    assert "error" in json.loads(resp.read())
+    con.close()
+
+
+def test_early_reply_closes_connection(server):
+    # The unread body of a rejected request must not be parsed as a second request
+    smuggled = b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n"
+    with socket.create_connection(server.server_address, timeout=10) as sock:
+        sock.sendall(
+            b"POST /nowhere HTTP/1.1\r\nHost: x\r\n"
+            + f"Content-Length: {len(smuggled)}\r\n\r\n".encode()
+            + smuggled
+        )
+        reply = b""
+        while chunk := sock.recv(65536):
+            reply += chunk
+
+    assert reply.startswith(b"HTTP/1.1 404")
+    assert b"Connection: close" in reply
+    assert reply.count(b"HTTP/1.1 ") == 1
+
+
+def test_timed_out_request_is_not_written(service):
+    late = _new_transactions("_late")
+    # Holding the data lock keeps the batcher from starting the batch
+    with data_lock():
+        with pytest.raises(TimeoutError):
+            service.submit("transactions", late, timeout=0.2)
+
+    # Same queue, so the cancelled request has been dropped once this returns
+    good = _new_transactions("_good")
+    assert not service.submit("transactions", good).any()
+
+    ids = set(pd.read_csv(os.path.join("synthetic_retail", "transactions.csv"))["transaction_id"])
+    assert set(good["transaction_id"]) <= ids
+    assert not set(late["transaction_id"]) & ids
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+import key_index
+from io_utils import append_table, key_index_path, load_key_index, load_table, table_path
+from key_index import KeyIndex, PendingKeys
+
+
+def _new_customers(prefix, n):
+    df = load_table("customers").head(n).copy()
+    df["customer_id"] = [f"{prefix}{i:05d}" for i in range(n)]
+    return df
+
+
+def test_missing_values_never_match():
+    # "nan" / "None" are what astype(str) makes of missing values on pandas 2
+    index = KeyIndex.from_values(["nan", "None", "C00001"])
+    assert index.contains([np.nan, None, pd.NA]).tolist() == [False, False, False]
+    assert index.contains(["nan", "None", "C00001", "C00002"]).tolist() == [True, True, True, False]
+
+    pending = PendingKeys(index)
+    pending.add(["C00002", None])
+    assert pending.contains(["C00002", None, np.nan]).tolist() == [True, False, False]
+
+
+def test_lookup_after_append(data_dir):
+    stored = load_table("customers")["customer_id"]
+    load_key_index("customers", "customer_id")
+
+    new = _new_customers("NEW", 10)
+    append_table("customers", new)
+
+    index = load_key_index("customers", "customer_id")
+    # A small append lands in a delta segment beside the main array
+    assert len(index.segments) == 1
+    assert len(index) == len(stored) + len(new)
+    assert index.contains(stored).all()
+    assert index.contains(new["customer_id"]).all()
+    assert not index.contains(["NEW99999", "C99999"]).any()
+
+
+def test_lookup_after_segment_merges(data_dir, monkeypatch):
+    # No compaction, so segments only merge with each other
+    monkeypatch.setattr(key_index, "COMPACT_RATIO", 100)
+    stored = load_table("customers")["customer_id"]
+    load_key_index("customers", "customer_id")
+
+    batches = [_new_customers(f"B{b}-", n) for b, n in enumerate([16, 4, 1, 1])]
+    for batch in batches:
+        append_table("customers", batch)
+
+    index = load_key_index("customers", "customer_id")
+    # [16, 4, 1] then the last 1 merges up to [16, 6]
+    assert [len(seg) for _, seg in index.segments] == [16, 6]
+    assert index.contains(stored).all()
+    for batch in batches:
+        assert index.contains(batch["customer_id"]).all()
+
+    # Only the live segments are left on disk
+    index_path = key_index_path("customers", "customer_id")
+    on_disk = {f for f in os.listdir("synthetic_retail") if ".seg-" in f}
+    assert on_disk == {os.path.basename(key_index._segment_path(index_path, seg_id)) for seg_id, _ in index.segments}
+
+
+def test_lookup_after_compaction(data_dir):
+    stored = load_table("customers")["customer_id"]
+    load_key_index("customers", "customer_id")
+
+    # Over COMPACT_RATIO of the main array: folded into one array
+    new = _new_customers("NEW", len(stored))
+    append_table("customers", new)
+
+    index = load_key_index("customers", "customer_id")
+    assert index.segments == []
+    assert len(index) == 2 * len(stored)
+    assert index.contains(stored).all() and index.contains(new["customer_id"]).all()
+    assert not [f for f in os.listdir("synthetic_retail") if ".seg-" in f]
+
+
+def test_rebuilt_when_table_changed_outside(data_dir):
+    load_key_index("customers", "customer_id")
+    append_table("customers", _new_customers("NEW", 10))
+
+    # Rewritten without io_utils: the size + mtime signature no longer matches
+    df = pd.read_csv(table_path("customers"))
+    dropped = df["customer_id"].iloc[:5]
+    df.iloc[5:].to_csv(table_path("customers"), index=False)
+
+    assert key_index.load_index(key_index_path("customers", "customer_id"), table_path("customers")) is None
+    index = load_key_index("customers", "customer_id")
+    assert index.segments == []
+    assert len(index) == len(df) - 5
+    assert not index.contains(dropped).any()
+    assert index.contains(df["customer_id"].iloc[5:]).all()